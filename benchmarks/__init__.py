@@ -0,0 +1,2 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
@@ -0,0 +1,65 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+"""Run the client benchmarks against an in-process fake Fossology server
+
+Run the suite and store the results:
+
+    python -m benchmarks run --output results.json
+
+Compare the results with reference results, the command fails if a benchmark is more
+than 10% slower or uses more than 10% more memory:
+
+    python -m benchmarks compare baseline.json results.json
+
+Only results of runs with the same dataset and environment (Python version and
+implementation, machine, JSON codec) can be compared. The reference results of the
+repository, benchmarks/baseline.json, were recorded with CPython 3.11 and orjson:
+record the baseline in the environment of the comparison, e.g. by running the suite
+on the base commit first.
+"""
+
+import sys
+import argparse
+
+from benchmarks.suite import BENCHMARKS, compare, load, run_suite, save
+
+
+def positive(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is lower than 1")
+    return number
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    # add_subparsers() only accepts required= since Python 3.7
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("--output", default="results.json", help="results file")
+    run.add_argument("--scale", type=float, default=1, help="dataset size factor")
+    run.add_argument("--repeat", type=positive, default=3, help="runs per benchmark")
+    run.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks")
+    diff = commands.add_parser("compare", help="compare two results files")
+    diff.add_argument("baseline", help="reference results file")
+    diff.add_argument("results", help="new results file")
+    diff.add_argument("--threshold", type=float, default=0.1, help="max slowdown")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        save(run_suite(args.scale, args.repeat, args.only), args.output)
+        return 0
+    try:
+        regressions = compare(load(args.baseline), load(args.results), args.threshold)
+    except ValueError as error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import gc
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from fossology import Fossology
+from fossology.fake import FakeFossology
+from fossology.obj import ReportFormat
+
+RESULTS_FORMAT = 1
+
+# Size of the synthetic datasets at scale 1
+DATASET = {
+    "users": 2000,
+    "folders": 2000,
+    "uploads": 100000,
+    "license_files": 1000000,
+    "files": 100000,
+    "jobs": 2000,
+    "new_uploads": 50,
+    "upload_size": 1024 * 1024,
+    "report_size": 50 * 1024 * 1024,
+}
+
+
+class Case:
+
+    """A benchmarked operation
+
+    :param run: the operation
+    :param items: the number of items processed by one run
+    :param unit: the name of the items, e.g. "uploads"
+    :param prepare: a function called before each run, not measured (default: None)
+    :type run: function
+    :type items: int
+    :type unit: string
+    :type prepare: function
+    """
+
+    def __init__(self, run: Callable, items: int, unit: str, prepare: Callable = None):
+        self.run = run
+        self.items = items
+        self.unit = unit
+        self.prepare = prepare
+
+
+def startup(server: FakeFossology, foss: Fossology, sizes: Dict, workdir: Path):
+    def run():
+        Fossology(server.url, server.token, "fossy", transport=server)
+
+    return Case(run, 1, "clients")
+
+
+def pagination(server: FakeFossology, foss: Fossology, sizes: Dict, workdir: Path):
+    def run():
+        assert sum(1 for _ in foss.iter_uploads(page_size=100)) == sizes["uploads"]
+
+    return Case(run, sizes["uploads"], "uploads")
+
+
+def upload_file(server: FakeFossology, foss: Fossology, sizes: Dict, workdir: Path):
+    package = workdir / "package.tar.gz"
+    package.write_bytes(b"\x1f\x8b" * (sizes["upload_size"] // 2))
+    folder = foss.detail_folder(server.add_folder("benchmark-uploads")["id"])
+
+    def run():
+        for _ in range(sizes["new_uploads"]):
+            foss.upload_file(folder, file=str(package))
+
+    return Case(run, sizes["new_uploads"], "uploads")
+
+
+def upload_licenses(server: FakeFossology, foss: Fossology, sizes: Dict, workdir: Path):
+    upload_json = server.add_upload("large.tar.gz", files=sizes["license_files"])
+    server.licenses_payload(upload_json["id"])
+    upload = foss.detail_upload(upload_json["id"])
+
+    def run():
+        licenses = foss.upload_licenses(upload)
+        assert sum(len(item.findings.scanner) for item in licenses) >= len(licenses)
+
+    return Case(run, sizes["license_files"], "files")
+
+
+def filesearch(server: FakeFossology, foss: Fossology, sizes: Dict, workdir: Path):
+    known = server.add_files(sizes["files"] // 2)
+    unknown = [f"{i:040X}" for i in range(sizes["files"] - len(known))]
+    filelist = [{"sha1": sha1} for pair in zip(known, unknown) for sha1 in pair]
+
+    def run():
+        results = dict(foss.filesearch_bulk(filelist, batch_size=1000))
+        assert len(results) == len(filelist)
+
+    return Case(run, len(filelist), "hashes")
+
+
+def report(server: FakeFossology, foss: Fossology, sizes: Dict, workdir: Path):
+    upload = foss.detail_upload(server.add_upload("report.tar.gz")["id"])
+
+    def prepare():
+        server.report_size = sizes["report_size"]
+
+    def run():
+        name, size, _ = foss.fetch_report(upload, ReportFormat.SPDX2, workdir)
+        assert size == sizes["report_size"]
+
+    return Case(run, sizes["report_size"], "bytes", prepare)
+
+
+def job_waiting(server: FakeFossology, foss: Fossology, sizes: Dict, workdir: Path):
+    upload = server.add_upload("jobs.tar.gz")
+    jobs = list()
+
+    def prepare():
+        jobs[:] = [server.add_job(upload["id"], polls=1) for _ in range(sizes["jobs"])]
+
+    def run():
+        for job in jobs:
+            job = foss.detail_job(job["id"], wait=True, timeout=0)
+            assert job.status == "Completed"
+
+    return Case(run, sizes["jobs"], "jobs", prepare)
+
+
+BENCHMARKS = {
+    "startup": startup,
+    "pagination": pagination,
+    "upload_file": upload_file,
+    "upload_licenses": upload_licenses,
+    "filesearch": filesearch,
+    "report": report,
+    "job_waiting": job_waiting,
+}
+
+
+def _round(value: float) -> float:
+    return float(f"{value:.4g}")
+
+
+def measure(case: Case, server: FakeFossology, repeat: int) -> Dict:
+    """Measure the duration and the peak memory of a benchmarked operation
+
+    The operation is run ``repeat`` times to measure its duration, then once more with
+    tracemalloc to measure the peak of the memory allocated during the operation.
+
+    :return: the result of the benchmark
+    :rtype: dict
+    :raises ValueError: if ``repeat`` is lower than 1
+    """
+    if repeat < 1:
+        raise ValueError(f"A benchmark must run at least once, not {repeat} times")
+    durations = list()
+    for _ in range(repeat):
+        if case.prepare:
+            case.prepare()
+        gc.collect()
+        requests = server.requests
+        start = time.perf_counter()
+        case.run()
+        durations.append(time.perf_counter() - start)
+        requests = server.requests - requests
+
+    if case.prepare:
+        case.prepare()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(durations)
+    return {
+        "unit": case.unit,
+        "items": case.items,
+        "requests": requests,
+        "repeat": repeat,
+        "seconds": {
+            "min": _round(min(durations)),
+            "median": _round(median),
+            "max": _round(max(durations)),
+        },
+        "throughput": _round(case.items / median),
+        "request_latency": _round(median / max(requests, 1)),
+        "peak_memory": peak_memory,
+    }
+
+
+def run_suite(scale: float = 1, repeat: int = 3, names: List[str] = None) -> Dict:
+    """Run the benchmarks against a fake server filled with synthetic data
+
+    :param scale: the factor applied to the size of the datasets (default: 1)
+    :param repeat: the number of measured runs of each benchmark (default: 3)
+    :param names: the benchmarks to run (default: all)
+    :type scale: float
+    :type repeat: int
+    :type names: list of string
+    :return: the results, with the environment of the run
+    :rtype: dict
+    :raises ValueError: if ``repeat`` is lower than 1
+    """
+    if repeat < 1:
+        raise ValueError(f"A benchmark must run at least once, not {repeat} times")
+    sizes = {key: max(1, int(size * scale)) for key, size in DATASET.items()}
+    server = FakeFossology()
+    server.add_users(sizes["users"])
+    server.add_folders(sizes["folders"])
+    server.add_uploads(sizes["uploads"])
+    foss = Fossology(server.url, server.token, "fossy", transport=server)
+
+    results = {
+        "format": RESULTS_FORMAT,
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "codec": foss.codec.name,
+            "scale": scale,
+        },
+        "dataset": sizes,
+        "benchmarks": dict(),
+    }
+    workdir = Path(tempfile.mkdtemp(prefix="fossology-benchmarks-"))
+    try:
+        for name, benchmark in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            case = benchmark(server, foss, sizes, workdir)
+            results["benchmarks"][name] = measure(case, server, repeat)
+            print(
+                f"{name}: {results['benchmarks'][name]['seconds']['median']}s",
+                file=sys.stderr,
+            )
+    finally:
+        shutil.rmtree(workdir)
+    return results
+
+
+def comparable_environment(results: Dict) -> Dict:
+    """Get the parts of the environment of a run which must match to compare results
+
+    The patch level of the Python version is ignored.
+
+    :rtype: dict
+    """
+    environment = dict(results.get("environment", {}))
+    environment["python"] = ".".join(environment.get("python", "").split(".")[:2])
+    return environment
+
+
+def compare(baseline: Dict, results: Dict, threshold: float = 0.1) -> List[str]:
+    """Compare the results of two runs
+
+    The runs must use the same dataset and environment (Python version and
+    implementation, machine, JSON codec), the durations of runs in different
+    environments can't be compared.
+
+    :param baseline: the results of the reference run
+    :param results: the results of the new run
+    :param threshold: the relative increase of the duration or of the peak memory
+        reported as a regression (default: 0.1)
+    :type baseline: dict
+    :type results: dict
+    :type threshold: float
+    :return: the regressions found
+    :rtype: list of string
+    :raises ValueError: if the datasets or the environments of the runs differ
+    """
+    if baseline.get("dataset") != results.get("dataset"):
+        raise ValueError("The datasets of the runs differ")
+    reference, environment = map(comparable_environment, (baseline, results))
+    if reference != environment:
+        differences = ", ".join(
+            f"{key} {reference.get(key)} != {environment.get(key)}"
+            for key in sorted(set(reference) | set(environment))
+            if reference.get(key) != environment.get(key)
+        )
+        raise ValueError(f"The environments of the runs differ: {differences}")
+    regressions = list()
+    print(f"{'benchmark':<16} {'median (s)':>22} {'change':>8} {'memory':>8}")
+    for name, result in results["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None:
+            continue
+        time_ratio = result["seconds"]["median"] / reference["seconds"]["median"]
+        memory_ratio = result["peak_memory"] / max(reference["peak_memory"], 1)
+        print(
+            f"{name:<16} {reference['seconds']['median']:>10} -> "
+            f"{result['seconds']['median']:<8} {time_ratio - 1:>+8.1%} "
+            f"{memory_ratio - 1:>+8.1%}"
+        )
+        if time_ratio > 1 + threshold:
+            regressions.append(f"{name} is {time_ratio - 1:.1%} slower")
+        if memory_ratio > 1 + threshold:
+            regressions.append(f"{name} uses {memory_ratio - 1:.1%} more memory")
+    return regressions
+
+
+def save(results: Dict, path):
+    """Write results as sorted, indented JSON which can be diffed in a review"""
+    Path(path).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+def load(path) -> Dict:
+    results = json.loads(Path(path).read_text())
+    if results.get("format") != RESULTS_FORMAT:
+        raise ValueError(f"Unsupported results format in {path}")
+    return results
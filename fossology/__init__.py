@@ -4,22 +4,45 @@
 import re
 import logging
 import requests
+import threading
 from datetime import date, timedelta
+from itertools import islice
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 from fossology.obj import (
     Agents,
     Upload,
     User,
     File,
+    SearchResult,
     TokenScope,
     SearchTypes,
+    get_hash,
     get_options,
 )
-from fossology.folders import Folders
+from fossology.folders import Folders, FolderTree
 from fossology.uploads import Uploads
 from fossology.jobs import Jobs
 from fossology.report import Report
+from fossology.limits import ClientLimiter, RateLimiter
+from fossology.metrics import Metrics
+from fossology.httpcache import HttpCache
+from fossology.codec import JsonCodec, default_codec
+from fossology.users import UserDirectory
+from fossology.transport import (
+    CircuitBreaker,
+    Dispatcher,
+    RetryPolicy,
+    SessionTransport,
+    Transport,
+    operation,
+)
 from fossology.exceptions import (
     AuthenticationError,
     AuthorizationError,
@@ -49,9 +72,9 @@ def search_headers(
     if tag:
         headers["tag"] = tag
     if filesizemin:
-        headers["filesizemin"] = filesizemin
+        headers["filesizemin"] = str(filesizemin)
     if filesizemax:
-        headers["filesizemax"] = filesizemax
+        headers["filesizemax"] = str(filesizemax)
     if license:
         headers["license"] = license
     if copyright:
@@ -118,7 +141,21 @@ def fossology_token(
         exit(f"Server {url} does not seem to be running or is unreachable: {error}")
 
 
-class Fossology(Folders, Uploads, Jobs, Report):
+def users_from_json(users_json: List[Dict]) -> List[User]:
+    """Build the users of a GET /users response, except the default user"""
+    users = list()
+    for user in users_json:
+        if user.get("name") == "Default User":
+            continue
+        foss_user = User.from_json(user)
+        agents = user.get("agents")
+        if agents:
+            foss_user.agents = Agents.from_json(agents)
+        users.append(foss_user)
+    return users
+
+
+class Fossology(Folders, Uploads, Jobs, Report, Dispatcher):
 
     """Main Fossology API class
 
@@ -137,27 +174,80 @@ class Fossology(Folders, Uploads, Jobs, Report):
     :param url: URL of the Fossology instance
     :param token: The API token generated using the Fossology UI
     :param name: The name of the token owner
+    :param folder_cache_ttl: the number of seconds the folders are cached (default: 0, no cache)
+    :param folders: the folder index shared with another client (default: None)
+    :param user_cache_ttl: the number of seconds the users are cached (default: 0, no cache)
+    :param transport: the transport sending the requests (default: a requests.Session)
+    :param retry_policy: the retry policy of all requests (default: no retry)
+    :param circuit_breaker: the circuit breaker of all endpoints (default: None)
+    :param limiter: the rate and concurrency limits of all requests (default: None)
+    :param metrics: the metrics recording all requests (default: None)
+    :param http_cache: the cache of the responses of read endpoints (default: None)
+    :param codec: the JSON codec of the requests and responses (default: the fastest
+        codec installed, see :func:`fossology.codec.default_codec`)
     :type url: str
     :type token: str
     :type name: str
+    :type folder_cache_ttl: float
+    :type folders: FolderTree
+    :type user_cache_ttl: float
+    :type transport: Transport
+    :type retry_policy: RetryPolicy
+    :type circuit_breaker: CircuitBreaker
+    :type limiter: ClientLimiter
+    :type metrics: Metrics
+    :type http_cache: HttpCache
+    :type codec: JsonCodec
     :raises AuthenticationError: if the user couldn't be found
     """
 
-    def __init__(self, url, token, name):
+    def __init__(
+        self,
+        url,
+        token,
+        name,
+        folder_cache_ttl: float = 0,
+        folders: FolderTree = None,
+        user_cache_ttl: float = 0,
+        transport: Transport = None,
+        retry_policy: RetryPolicy = None,
+        circuit_breaker: CircuitBreaker = None,
+        limiter: ClientLimiter = None,
+        metrics: Metrics = None,
+        http_cache: HttpCache = None,
+        codec: JsonCodec = None,
+    ):
         self.host = url
         self.token = token
         self.name = name
         self.users = list()
-        self.folders = list()
+        self.user_directory = UserDirectory()
+        self.user_cache_ttl = user_cache_ttl
+        self.folders = folders if folders is not None else FolderTree()
+        self.folder_cache_ttl = folder_cache_ttl
+        self.folder_cache_stats = {"hits": 0, "misses": 0}
+        self.folder_cache_lock = threading.Lock()
 
         self.api = f"{self.host}/api/v1"
         self.session = requests.Session()
-        self.session.headers.update({"Authorization": f"Bearer {self.token}"})
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+        self.session.headers.update(self.headers)
+        if transport is None:
+            transport = SessionTransport(self.session)
+        self.transport = transport
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+        self.limiter = limiter
+        self.metrics = metrics
+        self.http_cache = http_cache
+        self.codec = codec or default_codec()
+        self.hooks = dict()
+        self.hook_local = threading.local()
 
         self.user = self._auth()
         self.version = self.get_version()
         self.rootFolder = self.detail_folder(self.user.rootFolderId)
-        self.folders = self.list_folders()
+        self.list_folders()
 
         logger.info(
             f"Authenticated as {self.user.name} against {self.host} using API version {self.version}"
@@ -179,8 +269,10 @@ class Fossology(Folders, Uploads, Jobs, Report):
         raise AuthenticationError(description)
 
     def close(self):
+        self.transport.close()
         self.session.close()
 
+    @operation
     def get_version(self):
         """Get API version from the server
 
@@ -190,13 +282,14 @@ class Fossology(Folders, Uploads, Jobs, Report):
         :rtype: string
         :raises FossologyApiError: if the REST call failed
         """
-        response = self.session.get(f"{self.api}/version")
+        response = self._request("GET", "/version")
         if response.status_code == 200:
-            return response.json()["version"]
+            return self._decode(response, lambda r: self._json(r)["version"])
         else:
             description = "Error while getting API version"
             raise FossologyApiError(description, response)
 
+    @operation
     def detail_user(self, user_id):
         """Get details of Fossology user.
 
@@ -208,45 +301,51 @@ class Fossology(Folders, Uploads, Jobs, Report):
         :rtype: User
         :raises FossologyApiError: if the REST call failed
         """
-        response = self.session.get(f"{self.api}/users/{user_id}")
+        response = self._request("GET", "/users/{id}", user_id)
         if response.status_code == 200:
             user_agents = None
-            user_details = response.json()
+            user_details = self._json(response)
             if user_details.get("agents"):
                 user_agents = Agents.from_json(user_details["agents"])
             user = User.from_json(user_details)
             user.agents = user_agents
+            self.user_directory.add(user)
             return user
         else:
             description = f"Error while getting details for user {user_id}"
             raise FossologyApiError(description, response)
 
-    def list_users(self):
+    @operation
+    def list_users(self, max_age=None):
         """ List all users from the Fossology instance
 
         API Endpoint: GET /users
 
-        :return: the list of users
+        All users are added to the user directory ``self.user_directory``, the cached
+        list is returned without any request if it was received less than ``max_age``
+        seconds ago, ``max_age=0`` forces a refresh.
+
+        :param max_age: the maximum age of the cached list in seconds (default: self.user_cache_ttl)
+        :type max_age: float
+        :return: the list of users with an email address
         :rtype: list of User
         :raises FossologyApiError: if the REST call failed
         """
-        response = self.session.get(f"{self.api}/users")
+        if max_age is None:
+            max_age = self.user_cache_ttl
+        if self.user_directory.is_fresh(max_age):
+            return [user for user in self.user_directory if user.email]
+
+        response = self._request("GET", "/users")
         if response.status_code == 200:
-            users_list = list()
-            for user in response.json():
-                if user.get("name") == "Default User":
-                    continue
-                if user.get("email"):
-                    foss_user = User.from_json(user)
-                    agents = user.get("agents")
-                    if agents:
-                        foss_user.agents = Agents.from_json(agents)
-                    users_list.append(foss_user)
-            return users_list
+            all_users = self._decode(response, lambda r: users_from_json(self._json(r)))
+            self.user_directory.replace(all_users)
+            return [user for user in all_users if user.email]
         else:
             description = f"Unable to get a list of users from {self.host}"
             raise FossologyApiError(description, response)
 
+    @operation
     def delete_user(self, user):
         """Delete a Fossology user.
 
@@ -256,14 +355,59 @@ class Fossology(Folders, Uploads, Jobs, Report):
         :type user: User
         :raises FossologyApiError: if the REST call failed
         """
-        response = self.session.delete(f"{self.api}/users/{user.id}")
+        response = self._request("DELETE", "/users/{id}", user.id)
 
         if response.status_code == 202:
+            self.user_directory.remove(user.id)
             return
         else:
             description = f"Error while deleting user {user.name} ({user.id})"
             raise FossologyApiError(description, response)
 
+    @operation
+    def resolve_users(self, user_ids: Iterable[int], max_age=None) -> Dict[int, User]:
+        """Get several users by id with at most one request
+
+        Use it to join users to jobs or uploads:
+
+        >>> jobs = foss.list_jobs(page_size=100)
+        >>> users = foss.resolve_users(job.userId for job in jobs)
+        >>> for job in jobs:
+        >>>     print(job.name, users[job.userId].name if users[job.userId] else "-")
+
+        :param user_ids: the ids of the users
+        :param max_age: the maximum age of the cached users in seconds (default: self.user_cache_ttl)
+        :type user_ids: iterable of int
+        :type max_age: float
+        :return: the user by id - or None for unknown users
+        :rtype: dict
+        :raises FossologyApiError: if the REST call failed
+        """
+        self.list_users(max_age)
+        return {user_id: self.user_directory.get(user_id) for user_id in user_ids}
+
+    @operation
+    def find_user(self, name: str = None, email: str = None, max_age=None) -> User:
+        """Get a user by name or by email
+
+        :param name: the name of the user (default: None)
+        :param email: the email of the user, case insensitive (default: None)
+        :param max_age: the maximum age of the cached users in seconds (default: self.user_cache_ttl)
+        :type name: string
+        :type email: string
+        :type max_age: float
+        :return: the user - or None
+        :rtype: User
+        :raises FossologyApiError: if the REST call failed
+        """
+        self.list_users(max_age)
+        if name is not None:
+            return self.user_directory.find(name)
+        if email is not None:
+            return self.user_directory.find_email(email)
+        return None
+
+    @operation
     def search(
         self,
         searchType: SearchTypes = SearchTypes.ALLFILES,
@@ -314,19 +458,233 @@ class Fossology(Folders, Uploads, Jobs, Report):
             copyright,
             group,
         )
-        response = self.session.get(f"{self.api}/search", headers=headers)
+        return self._json(self._search(headers))
+
+    @operation
+    def iter_search(
+        self,
+        searchType: SearchTypes = SearchTypes.ALLFILES,
+        upload: Upload = None,
+        filename: str = None,
+        tag: str = None,
+        filesizemin: int = None,
+        filesizemax: int = None,
+        license: str = None,
+        copyright: str = None,
+        group: str = None,
+        page_size: int = 100,
+        max_results: int = None,
+    ) -> Iterator[SearchResult]:
+        """Search for a specific file, page by page
+
+        API Endpoint: GET /search
+
+        The search results are requested page by page and yielded as
+        :class:`~fossology.obj.SearchResult` objects. The next page is only requested
+        once all results of the current page have been consumed, stopping the iteration
+        (or reaching ``max_results``) stops fetching results from the server.
+
+        Servers which don't paginate the search (no ``X-Total-Pages`` header) send all
+        the results at once: the iteration stops after the first page which isn't
+        exactly ``page_size`` long, or which repeats the previous page.
+
+        :Example:
+
+        >>> for result in foss.iter_search(filename="%openssl%", max_results=10):
+        >>>     print(result.filename, result.upload.uploadname)
+
+        The search parameters are the same as for :func:`search`.
+
+        :param page_size: the number of results per page (default: 100)
+        :param max_results: the maximum number of results (default: None, all results)
+        :type page_size: int
+        :type max_results: int
+        :return: the items corresponding to the search criteria
+        :rtype: iterator of SearchResult
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
+        """
+        headers = search_headers(
+            searchType,
+            upload,
+            filename,
+            tag,
+            filesizemin,
+            filesizemax,
+            license,
+            copyright,
+            group,
+        )
+        headers["limit"] = str(page_size)
+        count = 0
+        page = 1
+        previous = None
+        while max_results is None or count < max_results:
+            headers["page"] = str(page)
+            response = self._search(headers)
+            results = self._json(response)
+            total_pages = response.headers.get("X-Total-Pages")
+            if not total_pages:
+                # Servers without pagination send all the results for every page
+                if results == previous:
+                    return
+                previous = results
+            for result in results:
+                yield SearchResult.from_json(result)
+                count += 1
+                if max_results is not None and count >= max_results:
+                    return
+            if total_pages:
+                last_page = page >= int(total_pages)
+            else:
+                last_page = len(results) != page_size
+            if len(results) < page_size or last_page:
+                return
+            page += 1
+
+    @operation
+    def search_uploads(
+        self,
+        uploads: Iterable[Upload],
+        searchType: SearchTypes = SearchTypes.ALLFILES,
+        filename: str = None,
+        tag: str = None,
+        filesizemin: int = None,
+        filesizemax: int = None,
+        license: str = None,
+        copyright: str = None,
+        group: str = None,
+        workers: int = 8,
+        rate_limiter: RateLimiter = None,
+        stop: Callable[[int, SearchResult], bool] = None,
+        errors: Dict = None,
+    ) -> Iterator[Tuple[int, SearchResult]]:
+        """Search for a specific file in several uploads concurrently
+
+        API Endpoint: GET /search
+
+        One search request per upload is sent by a pool of ``workers`` threads, all
+        requests go through the optional ``rate_limiter`` which can be shared with
+        other calls. The results are yielded together with the id of their upload as
+        soon as the search in an upload is finished.
+
+        If ``stop`` is given, it is called for every result and the search is cancelled
+        as soon as it returns True: the pending requests are not sent anymore.
+
+        The search in an upload may fail without stopping the whole search: if an
+        ``errors`` dictionary is given, the error raised for each failed upload is
+        stored in it, otherwise the first error is raised.
+
+        :Example:
+
+        >>> errors = {}
+        >>> for upload_id, result in foss.search_uploads(
+                uploads, filename="%openssl%", errors=errors
+            ):
+        >>>     print(upload_id, result.filename)
+
+        The search parameters are the same as for :func:`search`.
+
+        :param uploads: the uploads to search in
+        :param workers: the maximum number of concurrent requests (default: 8)
+        :param rate_limiter: limit the rate of requests sent to the server (default: None)
+        :param stop: cancel the search when this function returns True (default: None)
+        :param errors: a dictionary to be filled with the errors by upload id (default: None)
+        :type uploads: iterable of Upload
+        :type workers: int
+        :type rate_limiter: RateLimiter
+        :type stop: function taking the upload id and a SearchResult
+        :type errors: dict
+        :return: the upload id and the items corresponding to the search criteria
+        :rtype: iterator of Tuple[int, SearchResult]
+        :raises FossologyApiError: if the REST call failed and no errors dictionary is given
+        :raises AuthorizationError: if the user can't access the group and no errors dictionary is given
+        """
+        cancelled = threading.Event()
+        criteria = (filename, tag, filesizemin, filesizemax, license, copyright, group)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                self._submit(
+                    executor,
+                    self._search_upload,
+                    searchType,
+                    upload,
+                    criteria,
+                    rate_limiter,
+                    cancelled,
+                ): upload.id
+                for upload in uploads
+            }
+            try:
+                for future in as_completed(futures):
+                    upload_id = futures[future]
+                    try:
+                        results = future.result()
+                    except (AuthorizationError, FossologyApiError) as error:
+                        if errors is None:
+                            raise
+                        errors[upload_id] = error
+                        continue
+                    for result in results:
+                        yield upload_id, result
+                        if stop and stop(upload_id, result):
+                            return
+            finally:
+                cancelled.set()
+                for future in futures:
+                    future.cancel()
+
+    def _search_upload(
+        self, searchType, upload, criteria, rate_limiter, cancelled
+    ) -> List[SearchResult]:
+        """Search in one upload
+
+        Internal function meant to be called by search_uploads()
+
+        :return: the items corresponding to the search criteria
+        :rtype: list of SearchResult
+        """
+        if cancelled.is_set():
+            return []
+        if rate_limiter:
+            rate_limiter.acquire(self._wait)
+        headers = search_headers(searchType, upload, *criteria)
+        return self._decode(
+            self._search(headers),
+            lambda r: [SearchResult.from_json(result) for result in self._json(r)],
+        )
+
+    def _search(self, headers: Dict):
+        """Send a search request
+
+        Internal function meant to be called by the search functions
+
+        API Endpoint: GET /search
+
+        :param headers: the search criteria
+        :type headers: dict
+        :return: the response of the server
+        :rtype: requests.Response
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
+        """
+        response = self._request("GET", "/search", headers=headers)
 
         if response.status_code == 200:
-            return response.json()
+            return response
 
         elif response.status_code == 403:
-            description = f"Searching {get_options(group)}not authorized"
+            description = (
+                f"Searching {get_options(headers.get('groupName'))}not authorized"
+            )
             raise AuthorizationError(description, response)
 
         else:
             description = "Unable to get a result with the given search criteria"
             raise FossologyApiError(description, response)
 
+    @operation
     def filesearch(
         self, filelist: List = [], group: str = None,
     ):
@@ -345,22 +703,163 @@ class Fossology(Folders, Uploads, Jobs, Report):
         :raises FossologyApiError: if the REST call failed
         :raises AuthorizationError: if the user can't access the group
         """
+        all_files = []
+        for hash_file in self._filesearch(filelist, group):
+            if hash_file.get("findings"):
+                all_files.append(File.from_json(hash_file))
+            else:
+                return "Unable to get a result with the given filesearch criteria"
+        return all_files
+
+    @operation
+    def filesearch_bulk(
+        self,
+        filelist: Iterable[Dict],
+        group: str = None,
+        batch_size: int = 500,
+        workers: int = 4,
+        cache=None,
+        errors: Dict = None,
+    ) -> Iterator[Tuple[str, File]]:
+        """Search for a large number of files from hash sum
+
+        API Endpoint: POST /filesearch
+
+        The list of hashes is split into batches of ``batch_size`` items which are sent
+        concurrently by ``workers`` threads. Unlike :func:`filesearch`, a hash without
+        findings doesn't stop the search: every hash of the list is part of the results,
+        mapped to ``None`` if it is unknown to the server. The results are yielded as
+        soon as a batch is finished, in no particular order.
+
+        If a :class:`~fossology.cache.FindingsCache` is given, only the hashes which
+        are not in the cache are sent to the server and the results are added to the
+        cache.
+
+        If an ``errors`` dictionary is given, a batch which fails doesn't stop the
+        search: the error is recorded for each hash of the batch, which is not part of
+        the results, and the other batches are searched.
+
+        :Example:
+
+        >>> filelist = [{"sha1": sha1} for sha1 in dependency_hashes]
+        >>> results = dict(foss.filesearch_bulk(filelist, batch_size=1000))
+        >>> missing = [sha1 for sha1, file in results.items() if file is None]
+
+        :param filelist: the hashes of the files to search for
+        :param group: the group name to choose while performing search (default: None)
+        :param batch_size: the number of hashes sent per request (default: 500)
+        :param workers: the maximum number of concurrent requests (default: 4)
+        :param cache: the local cache of the search results (default: None)
+        :param errors: a dictionary filled with the errors by hash (default: None)
+        :type filelist: iterable of dict, e.g. [{"sha1": "..."}, {"md5": "..."}]
+        :type group: string
+        :type batch_size: int
+        :type workers: int
+        :type cache: FindingsCache
+        :type errors: dict
+        :return: the hash of each item of the list (the first one of sha1, md5 and sha256) and the file found or None
+        :rtype: iterator of Tuple[str, File]
+        :raises FossologyApiError: if the REST call failed and no errors dictionary is given
+        :raises AuthorizationError: if the user can't access the group and no errors dictionary is given
+        """
+        filelist = iter(filelist)
+        batches = iter(lambda: list(islice(filelist, batch_size)), [])
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = dict()
+            for batch in batches:
+                if cache:
+                    hits, batch = cache.lookup(batch, self.host, group)
+                    for key, result in hits:
+                        yield key, File.from_json(result) if result else None
+                    if not batch:
+                        continue
+                future = self._submit(executor, self._filesearch_batch, batch, group)
+                pending[future] = batch
+                if len(pending) < 2 * workers:
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = pending.pop(future)
+                    yield from self._filesearch_results(
+                        future, batch, cache, group, errors
+                    )
+            for future in as_completed(pending):
+                yield from self._filesearch_results(
+                    future, pending[future], cache, group, errors
+                )
+
+    def _filesearch_results(
+        self, future, batch: List, cache=None, group: str = None, errors: Dict = None
+    ) -> Iterator[Tuple[str, File]]:
+        """Store the results of a filesearch batch in the cache and convert them
+
+        :return: the requested hash and the file found or None for each item
+        :rtype: iterator of Tuple[str, File]
+        :raises FossologyApiError: if the REST call failed and no errors dictionary is given
+        :raises AuthorizationError: if the user can't access the group and no errors dictionary is given
+        """
+        try:
+            results = future.result()
+        except (AuthorizationError, FossologyApiError) as error:
+            if errors is None:
+                raise
+            for item in batch:
+                errors[get_hash(item)[1]] = error
+            return
+        if cache:
+            cache.store(
+                [(item, result) for _, item, result in results], self.host, group
+            )
+        for key, _, result in results:
+            yield key, File.from_json(result) if result else None
+
+    def _filesearch_batch(self, filelist: List, group: str = None) -> List:
+        """Search for a batch of files and map each requested item to its result
+
+        Internal function meant to be called by filesearch_bulk()
+
+        :return: the requested hash, the requested item and the plain JSON result (or None) for each item
+        :rtype: list of Tuple[str, dict, dict]
+        """
+        keys = [get_hash(item)[1] for item in filelist]
+        results = self._filesearch(filelist, group)
+        if len(results) != len(keys):
+            # Match the results by hash value if the order isn't preserved
+            by_hash = dict()
+            for result in results:
+                for value in (result.get("hash") or {}).values():
+                    if isinstance(value, str):
+                        by_hash[value.lower()] = result
+            results = [by_hash.get(str(key).lower(), {}) for key in keys]
+
+        return [
+            (key, item, result if result.get("findings") else None)
+            for key, item, result in zip(keys, filelist, results)
+        ]
+
+    def _filesearch(self, filelist: List, group: str = None) -> List:
+        """Send a filesearch request
+
+        Internal function meant to be called by the filesearch functions
+
+        API Endpoint: POST /filesearch
+
+        :return: the plain JSON results
+        :rtype: list of dict
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
+        """
         headers = {}
         if group:
             headers["groupName"] = group
 
-        response = self.session.post(
-            f"{self.api}/filesearch", headers=headers, json=filelist
+        headers["Content-Type"] = "application/json"
+        response = self._request(
+            "POST", "/filesearch", headers=headers, data=self.codec.dumps(filelist)
         )
 
         if response.status_code == 200:
-            all_files = []
-            for hash_file in response.json():
-                if hash_file.get("findings"):
-                    all_files.append(File.from_json(hash_file))
-                else:
-                    return "Unable to get a result with the given filesearch criteria"
-            return all_files
+            return self._json(response)
 
         elif response.status_code == 403:
             description = f"Searching {get_options(group)}not authorized"
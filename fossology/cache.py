@@ -0,0 +1,438 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from fossology.obj import ReportFormat, Summary, Upload, get_hash
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+def file_mode() -> int:
+    """Get the mode of a new file created with open() by the current process
+
+    Temporary files are created with mode 0600, they get this mode before being
+    renamed so that the written files keep the permissions derived from the umask.
+
+    :return: the permission bits of a new file
+    :rtype: int
+    """
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("Umask:"):
+                    return 0o666 & ~int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    # os.umask() can only be read by setting it, keep a safe mask meanwhile
+    umask = os.umask(0o077)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def atomic_write(path: Path, data: bytes):
+    """Write data to a file which is either complete or not visible at all
+
+    :param path: the path of the file
+    :param data: the content of the file
+    :type path: Path
+    :type data: bytes
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.chmod(tmp_path, file_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ReportCache:
+
+    """Local cache for downloaded reports
+
+    Reports are stored by content (the SHA256 of the report) and referenced by a key
+    made of the upload id, the report format, the group and a fingerprint of the
+    clearing state of the upload. As long as the clearing state of an upload doesn't
+    change, the cached report is returned instead of generating a new one.
+
+    All files are written atomically, the cache directory can be shared by concurrent
+    processes. When the total size of the reports exceeds ``max_size``, the least
+    recently used entries are evicted.
+
+    :Example:
+
+    >>> from fossology.cache import ReportCache
+    >>> cache = ReportCache("~/.cache/fossology/reports")
+    >>> report_name, size, sha256 = cache.fetch_report(
+            foss, upload, ReportFormat.SPDX2, "reports/"
+        )
+
+    :param directory: the directory of the cache
+    :param max_size: the maximum size of the cached reports in bytes (default: 1GB)
+    :type directory: string or Path
+    :type max_size: int
+    """
+
+    def __init__(self, directory, max_size: int = 1024 ** 3):
+        self.directory = Path(directory).expanduser()
+        self.max_size = max_size
+        self.objects = self.directory / "objects"
+        self.keys = self.directory / "keys"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.keys.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(upload: Upload, summary: Summary) -> str:
+        """Get a fingerprint of the clearing state of an upload
+
+        :param upload: the upload
+        :param summary: the summary of the upload
+        :type upload: Upload
+        :type summary: Summary
+        :return: the fingerprint
+        :rtype: string
+        """
+        state = [
+            upload.hash.sha1,
+            summary.mainLicense,
+            summary.uniqueLicenses,
+            summary.totalLicenses,
+            summary.uniqueConcludedLicenses,
+            summary.totalConcludedLicenses,
+            summary.filesToBeCleared,
+            summary.filesCleared,
+            summary.clearingStatus,
+            summary.copyrightCount,
+        ]
+        return hashlib.sha256(json.dumps(state).encode()).hexdigest()
+
+    @staticmethod
+    def key(
+        upload: Upload, report_format: ReportFormat, group: str, fingerprint: str
+    ) -> str:
+        """Get the cache key of a report
+
+        :return: the cache key
+        :rtype: string
+        """
+        key = f"{upload.id}:{report_format.value}:{group or ''}:{fingerprint}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Tuple[Path, Dict]:
+        """Get a cached report
+
+        :param key: the cache key of the report
+        :type key: string
+        :return: the path of the cached report and its metadata - or None
+        :rtype: Tuple[Path, dict]
+        """
+        key_path = self.keys / f"{key}.json"
+        try:
+            entry = json.loads(key_path.read_text())
+            report_path = self.objects / entry["sha256"]
+            if not report_path.is_file():
+                return None
+            os.utime(key_path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return report_path, entry
+
+    def put(self, key: str, report_path: Path, report_name: str, sha256: str) -> Path:
+        """Add a report to the cache
+
+        The report file is moved into the cache directory, it must be located on the
+        same file system.
+
+        :param key: the cache key of the report
+        :param report_path: the path of the report file
+        :param report_name: the name of the report
+        :param sha256: the SHA256 of the report content
+        :type key: string
+        :type report_path: Path
+        :type report_name: string
+        :type sha256: string
+        :return: the path of the cached report
+        :rtype: Path
+        """
+        cached_path = self.objects / sha256
+        size = os.stat(report_path).st_size
+        os.replace(report_path, cached_path)
+        entry = {"report_name": report_name, "sha256": sha256, "size": size}
+        atomic_write(self.keys / f"{key}.json", json.dumps(entry).encode())
+        self.evict(keep=key)
+        return cached_path
+
+    def _entries(self):
+        """List the cache entries
+
+        :return: the last access time, the key path and the report SHA256 of each entry
+        :rtype: list of tuple
+        """
+        entries = list()
+        for key_path in self.keys.glob("*.json"):
+            try:
+                entry = json.loads(key_path.read_text())
+                entries.append((key_path.stat().st_mtime, key_path, entry["sha256"]))
+            except (FileNotFoundError, ValueError):
+                continue
+        return entries
+
+    def _sizes(self):
+        """Get the size of the cached reports
+
+        :return: the size of each cached report by SHA256
+        :rtype: dict
+        """
+        sizes = dict()
+        for report_path in self.objects.iterdir():
+            if report_path.name.startswith("."):
+                continue
+            try:
+                sizes[report_path.name] = report_path.stat().st_size
+            except FileNotFoundError:
+                continue
+        return sizes
+
+    def evict(self, keep: str = None):
+        """Remove the least recently used reports until the cache fits in max_size
+
+        :param keep: the cache key of a report which shall not be evicted (default: None)
+        :type keep: string
+        """
+        entries = self._entries()
+        references = dict()
+        for _, _, sha256 in entries:
+            references[sha256] = references.get(sha256, 0) + 1
+        sizes = self._sizes()
+        total_size = sum(sizes.values())
+
+        for _, key_path, sha256 in sorted(entries, key=lambda entry: entry[0]):
+            if total_size <= self.max_size:
+                break
+            if key_path.stem == keep:
+                continue
+            try:
+                key_path.unlink()
+            except FileNotFoundError:
+                continue
+            references[sha256] -= 1
+            if not references[sha256] and sha256 in sizes:
+                try:
+                    (self.objects / sha256).unlink()
+                except FileNotFoundError:
+                    pass
+                total_size -= sizes.pop(sha256)
+                logger.debug("Report %s evicted from the cache", sha256)
+
+    def fetch_report(
+        self,
+        foss,
+        upload: Upload,
+        report_format: ReportFormat = None,
+        report_file=".",
+        group: str = None,
+    ) -> Tuple[str, int, str]:
+        """Get a report from the cache or generate and download it
+
+        API Endpoints: GET /uploads/{id}/summary, GET /report, GET /report/{id}
+
+        :param foss: the Fossology instance used to generate reports
+        :param upload: the upload which report will be generated
+        :param report_format: the report format (default: ReportFormat.READMEOSS)
+        :param report_file: the path, the directory or the binary file object to write the report to (default: ".")
+        :param group: the group name to choose while generating the report (default: None)
+        :type foss: Fossology
+        :type upload: Upload
+        :type report_format: ReportFormat
+        :type report_file: string, Path or file object opened in binary mode
+        :type group: string
+        :return: the report name, the size of the report and its SHA256
+        :rtype: Tuple[str, int, str]
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
+        """
+        if not report_format:
+            report_format = ReportFormat.READMEOSS
+        summary = foss.upload_summary(upload, group=group)
+        key = self.key(upload, report_format, group, self.fingerprint(upload, summary))
+
+        cached = self.get(key)
+        if cached:
+            cached_path, entry = cached
+            logger.debug("Report for upload %s found in the cache", upload.id)
+        else:
+            fd, tmp_path = tempfile.mkstemp(prefix=".report.", dir=self.objects)
+            try:
+                with os.fdopen(fd, "wb") as fp:
+                    report_name, size, sha256 = foss.fetch_report(
+                        upload, report_format, fp, group=group
+                    )
+                os.chmod(tmp_path, file_mode())
+                cached_path = self.put(key, tmp_path, report_name, sha256)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            entry = {"report_name": report_name, "sha256": sha256, "size": size}
+
+        if hasattr(report_file, "write"):
+            with open(cached_path, "rb") as fp:
+                shutil.copyfileobj(fp, report_file)
+        else:
+            report_path = Path(report_file)
+            if report_path.is_dir():
+                report_path = report_path / entry["report_name"]
+            shutil.copyfile(cached_path, report_path)
+        return entry["report_name"], entry["size"], entry["sha256"]
+
+
+class FindingsCache:
+
+    """Persistent cache of the file search results
+
+    The results of :func:`~fossology.Fossology.filesearch_bulk` are stored in a SQLite
+    database by server, group and hash (sha1, md5 and sha256): the license findings
+    and conclusions depend on the Fossology instance and on the group of the user.
+    Files found on the server are kept for ``ttl`` seconds, unknown hashes for
+    ``negative_ttl`` seconds. The database can be shared by several processes on the
+    same host.
+
+    :Example:
+
+    >>> from fossology.cache import FindingsCache
+    >>> cache = FindingsCache("~/.cache/fossology/findings.db")
+    >>> results = dict(foss.filesearch_bulk(filelist, cache=cache))
+
+    :param path: the path of the SQLite database
+    :param ttl: the lifetime of the files found in seconds (default: 7 days)
+    :param negative_ttl: the lifetime of the unknown hashes in seconds (default: 1 day)
+    :type path: string or Path
+    :type ttl: int
+    :type negative_ttl: int
+    """
+
+    def __init__(self, path, ttl: int = 7 * 86400, negative_ttl: int = 86400):
+        self.path = Path(path).expanduser()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS filesearch ("
+                "server TEXT NOT NULL, groupname TEXT NOT NULL, "
+                "algorithm TEXT NOT NULL, hash TEXT NOT NULL, result TEXT, "
+                "expires REAL NOT NULL, "
+                "PRIMARY KEY (server, groupname, algorithm, hash))"
+            )
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Open a database connection, commit the changes and close it"""
+        connection = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def lookup(
+        self, filelist: List[Dict], server: str, group: str = None
+    ) -> Tuple[List, List]:
+        """Get the cached results of a list of files
+
+        :param filelist: the hashes of the files to search for
+        :param server: the URL of the Fossology server
+        :param group: the group name used for the search (default: None)
+        :type filelist: list of dict
+        :type server: string
+        :type group: string
+        :return: the requested hash and the plain JSON result (or None for unknown files) of the cached files, and the files which are not cached
+        :rtype: Tuple[list of Tuple[str, dict], list of dict]
+        """
+        keys = [get_hash(item) for item in filelist]
+        cached = dict()
+        with self._connection() as connection:
+            for algorithm in {algorithm for algorithm, _ in keys if algorithm}:
+                values = [value.lower() for key, value in keys if key == algorithm]
+                for start in range(0, len(values), 500):
+                    chunk = values[start : start + 500]
+                    rows = connection.execute(
+                        "SELECT hash, result FROM filesearch WHERE server = ? "
+                        "AND groupname = ? AND algorithm = ? AND expires > ? "
+                        f"AND hash IN ({','.join('?' * len(chunk))})",
+                        [server, group or "", algorithm, time.time()] + chunk,
+                    )
+                    for value, result in rows:
+                        cached[(algorithm, value)] = result
+
+        hits = list()
+        misses = list()
+        for item, (algorithm, value) in zip(filelist, keys):
+            key = (algorithm, value.lower() if value else value)
+            if key in cached:
+                result = cached[key]
+                hits.append((value, json.loads(result) if result else None))
+            else:
+                misses.append(item)
+        return hits, misses
+
+    def store(self, results: List[Tuple[Dict, Dict]], server: str, group: str = None):
+        """Add file search results to the cache
+
+        A file found on the server is cached for all the hashes returned by the server.
+
+        :param results: the requested item and the plain JSON result (or None) for each file
+        :param server: the URL of the Fossology server
+        :param group: the group name used for the search (default: None)
+        :type results: list of Tuple[dict, dict]
+        :type server: string
+        :type group: string
+        """
+        now = time.time()
+        rows = list()
+        for item, result in results:
+            if result:
+                hashes = {**item, **(result.get("hash") or {})}
+                expires = now + self.ttl
+                result = json.dumps(result)
+            else:
+                hashes = item
+                expires = now + self.negative_ttl
+            for algorithm in ("sha1", "md5", "sha256"):
+                if hashes.get(algorithm):
+                    rows.append(
+                        (
+                            server,
+                            group or "",
+                            algorithm,
+                            hashes[algorithm].lower(),
+                            result,
+                            expires,
+                        )
+                    )
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO filesearch VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def purge(self):
+        """Remove the expired entries from the cache"""
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM filesearch WHERE expires <= ?", (time.time(),)
+            )
@@ -0,0 +1,83 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import json
+import logging
+from typing import Any, Union
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonCodec:
+
+    """Decoder and encoder of the JSON bodies exchanged with the server
+
+    The default codec uses the json module of the standard library. Decoding errors
+    raise a ValueError, whatever the codec.
+
+    :Example:
+
+    >>> from fossology.codec import JsonCodec
+    >>> foss = Fossology(FOSS_URL, FOSS_TOKEN, username, codec=JsonCodec())
+    """
+
+    name = "json"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Decode a JSON document
+
+        :param data: the JSON document
+        :type data: bytes or string
+        :return: the decoded object
+        :raises ValueError: if the document isn't valid JSON
+        """
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> Union[bytes, str]:
+        """Encode an object as a JSON document
+
+        :param obj: the object
+        :return: the JSON document
+        :rtype: bytes or string
+        """
+        return json.dumps(obj)
+
+
+class OrjsonCodec(JsonCodec):
+
+    """JSON codec using the orjson package
+
+    orjson only encodes dictionaries with string keys, objects it rejects (e.g. a
+    dictionary with integer keys) are encoded by the json module like the default
+    codec does.
+    """
+
+    name = "orjson"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            return json.dumps(obj).encode()
+
+
+def default_codec() -> JsonCodec:
+    """Get the fastest JSON codec installed
+
+    orjson is used if installed (``pip install fossology[fast-json]``), else the json
+    module of the standard library.
+
+    :rtype: JsonCodec
+    """
+    if orjson is not None:
+        return OrjsonCodec()
+    return JsonCodec()
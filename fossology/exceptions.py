@@ -39,8 +39,24 @@ class FossologyApiError(Error):
     """Error during a Fossology GET request"""
 
     def __init__(self, description, response=None):
+        if response is None:
+            self.message = description
+            return
         try:
             message = response.json().get("message")
         except JSONDecodeError:
             message = response.text
         self.message = f"{description}: {message} ({response.status_code})"
+
+
+class ServerUnavailableError(FossologyApiError):
+    """The server is unavailable: the request failed after all the attempts allowed
+    by the retry policy, or it was not sent because the circuit of the endpoint is
+    open (``response`` is None)"""
+
+    def __init__(self, description, response=None):
+        self.response = response
+        if response is None:
+            self.message = description
+        else:
+            super().__init__(description, response)
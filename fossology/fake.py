@@ -0,0 +1,992 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import io
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from itertools import count
+from posixpath import basename, dirname
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from fossology.transport import Transport
+
+FAKE_URL = "http://fossology.fake/repo"
+FAKE_VERSION = "1.2.0"
+FAKE_LICENSES = (
+    "MIT",
+    "Apache-2.0",
+    "BSD-3-Clause",
+    "GPL-2.0-only",
+    "GPL-2.0-or-later",
+    "LGPL-2.1-only",
+    "MPL-2.0",
+    "ISC",
+)
+FAKE_AGENTS = ("nomos", "monk", "ninka", "ojo", "reportImport", "scancode")
+TREE_IDS = 10 ** 7
+
+
+def _response(status: int, body: bytes, headers: Dict, url: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response.headers["Content-Length"] = str(len(body))
+    response.raw = io.BytesIO(body)
+    response.encoding = "utf-8"
+    response.url = url
+    return response
+
+
+def _hash(data: bytes) -> Dict:
+    return {
+        "sha1": hashlib.sha1(data).hexdigest().upper(),
+        "md5": hashlib.md5(data).hexdigest().upper(),
+        "sha256": hashlib.sha256(data).hexdigest().upper(),
+        "size": len(data),
+    }
+
+
+def _message(status: int, message) -> Dict:
+    return {
+        "code": status,
+        "message": message,
+        "type": "INFO" if status < 400 else "ERROR",
+    }
+
+
+def _page(items: List, headers: Dict) -> tuple:
+    limit = int(headers.get("limit", 100))
+    page = int(headers.get("page", 1))
+    total_pages = max(1, -(-len(items) // limit))
+    return items[(page - 1) * limit : page * limit], {"X-Total-Pages": total_pages}
+
+
+def _multipart_file(request) -> Tuple[str, bytes]:
+    """Get the name and the content of the file posted in a multipart body"""
+    boundary = request.headers["Content-Type"].split("boundary=")[-1].encode()
+    part = request.body.split(b"--" + boundary)[1]
+    headers, content = part.split(b"\r\n\r\n", 1)
+    name = re.search(rb'filename="([^"]*)"', headers)
+    return name.group(1).decode() if name else "upload", content[:-2]
+
+
+def _like(pattern: str) -> Callable:
+    """Get a function matching a string against an SQL LIKE pattern"""
+    regex = "".join(
+        ".*" if char == "%" else "." if char == "_" else re.escape(char)
+        for char in pattern
+    )
+    return re.compile(f"{regex}$", re.IGNORECASE | re.DOTALL).match
+
+
+class VirtualClock:
+
+    """Clock of a fake server, advanced by the waits instead of the time
+
+    A virtual clock makes the unpacking of uploads, the jobs and the reports progress
+    as fast as the client waits, without actually waiting.
+
+    :Example:
+
+    >>> clock = VirtualClock()
+    >>> server = FakeFossology(clock=clock)
+    >>> monkeypatch.setattr(time, "sleep", clock.sleep)
+
+    :param start: the initial time in seconds (default: 0)
+    :type start: float
+    """
+
+    def __init__(self, start: float = 0):
+        self.now = start
+        self.lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        with self.lock:
+            self.now += seconds
+
+
+class FakeFossology(Transport):
+
+    """Stateful in-process stand-in for the Fossology REST API
+
+    The fake is a transport answering the requests of a client like a Fossology server
+    would, without any network or server. The requests are prepared as by a
+    requests.Session, the fake reads the headers, query parameters and bodies which
+    would be sent over the wire.
+
+    The server keeps the users, tokens, folders, uploads, jobs and reports created by
+    the clients, and simulates the behaviour of a real instance:
+
+    - a new upload is unpacked during ``unpack_time`` seconds, the requests for the
+      upload, its summary, licenses and reports are answered with "503 Service
+      Unavailable" and a ``Retry-After`` header meanwhile
+    - a scheduled job is "Queued" during ``job_queue_time`` seconds, then "Processing"
+      during ``job_time`` seconds, then "Completed"
+    - a report can be downloaded ``report_time`` seconds after its generation was
+      requested, "503 Service Unavailable" is answered before
+    - each request is delayed by ``latency`` seconds, a number or a (minimum, maximum)
+      range
+    - a share ``failure_rate`` of the requests fails with the status
+      ``failure_status``, or with a connection error if the status is None, and
+      :meth:`fail` makes the next requests fail
+
+    The file content, license findings and search results are synthetic, generated from
+    the ``seed``. Large datasets can be generated with :meth:`add_uploads`,
+    :meth:`add_files`, etc. The requests received are counted in ``calls``, e.g.
+    ``server.calls["GET /uploads/{id}"]``, the highest number of requests handled
+    simultaneously is ``max_in_flight``.
+
+    :Example:
+
+    >>> from fossology import Fossology
+    >>> from fossology.fake import FakeFossology
+    >>> server = FakeFossology()
+    >>> server.add_uploads(100000)
+    >>> server.unpack_time = 30
+    >>> foss = Fossology(server.url, server.token, "fossy", transport=server)
+    >>> uploads = list(foss.iter_uploads())
+
+    .. note::
+
+        :func:`fossology.fossology_token` doesn't use a transport, tokens are
+        generated with ``server.send("POST", f"{server.api}/tokens", data=...)``
+
+    :param url: the URL of the fake server (default: FAKE_URL)
+    :param username: the name of the default user (default: "fossy")
+    :param password: the password of the default user (default: "fossy")
+    :param seed: the seed of the synthetic data (default: 0)
+    :param clock: the clock of the server (default: time.monotonic)
+    :type url: string
+    :type username: string
+    :type password: string
+    :type seed: int
+    :type clock: function returning the time in seconds, e.g. VirtualClock
+    """
+
+    def __init__(
+        self,
+        url: str = FAKE_URL,
+        username: str = "fossy",
+        password: str = "fossy",
+        seed: int = 0,
+        clock: Callable = None,
+    ):
+        self.url = url
+        self.api = f"{url}/api/v1"
+        self.api_path = urlsplit(self.api).path
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.clock = clock or time.monotonic
+        self.sleep = getattr(clock, "sleep", time.sleep)
+        self.lock = threading.RLock()
+        self.ids = count(1)
+
+        self.unpack_time = 0
+        self.job_queue_time = 0
+        self.job_time = 0
+        self.report_time = 0
+        self.report_size = 1024
+        self.latency = 0
+        self.failure_rate = 0
+        self.failure_status = 503
+        self.failures = list()
+
+        self.requests = 0
+        self.calls = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self.users = dict()
+        self.passwords = dict()
+        self.tokens = dict()
+        self.groups = set()
+        self.folders = dict()
+        self.uploads = dict()
+        self.upload_folders = dict()
+        self.upload_files = dict()
+        self.upload_ready = dict()
+        self.trees = dict()
+        self.license_payloads = dict()
+        self.files = dict()
+        self.jobs = dict()
+        self.job_schedules = dict()
+        self.reports = dict()
+
+        root = self.add_folder("Software Repository", parent=None)
+        self.user = self.add_user(username, password, root["id"])
+        self.token = self.add_token(username)
+        self.routes = self._routes()
+
+    def _routes(self) -> List[Tuple]:
+        routes = [
+            ("GET", "/version", self.get_version),
+            ("POST", "/tokens", self.post_token),
+            ("GET", "/users", self.get_users),
+            ("GET", "/users/{id}", self.get_user),
+            ("DELETE", "/users/{id}", self.delete_user),
+            ("GET", "/folders", self.get_folders),
+            ("POST", "/folders", self.post_folder),
+            ("GET", "/folders/{id}", self.get_folder),
+            ("PATCH", "/folders/{id}", self.patch_folder),
+            ("PUT", "/folders/{id}", self.put_folder),
+            ("DELETE", "/folders/{id}", self.delete_folder),
+            ("GET", "/uploads", self.get_uploads),
+            ("POST", "/uploads", self.post_upload),
+            ("GET", "/uploads/{id}", self.get_upload),
+            ("PATCH", "/uploads/{id}", self.patch_upload),
+            ("PUT", "/uploads/{id}", self.put_upload),
+            ("DELETE", "/uploads/{id}", self.delete_upload),
+            ("GET", "/uploads/{id}/summary", self.get_summary),
+            ("GET", "/uploads/{id}/licenses", self.get_licenses),
+            ("GET", "/search", self.get_search),
+            ("POST", "/filesearch", self.post_filesearch),
+            ("GET", "/report", self.get_report),
+            ("GET", "/report/{id}", self.get_report_file),
+            ("GET", "/jobs", self.get_jobs),
+            ("POST", "/jobs", self.post_job),
+            ("GET", "/jobs/{id}", self.get_job),
+        ]
+        return [
+            (method, endpoint, re.compile(endpoint.replace("{id}", r"(\d+)") + "$"), h)
+            for method, endpoint, h in routes
+        ]
+
+    # Transport
+
+    def send(self, method: str, url: str, **kwargs) -> requests.Response:
+        request = requests.Request(
+            method,
+            url,
+            headers=kwargs.get("headers"),
+            files=kwargs.get("files"),
+            data=kwargs.get("data"),
+            json=kwargs.get("json"),
+            params=kwargs.get("params"),
+        ).prepare()
+        split_url = urlsplit(request.url)
+        path = split_url.path[len(self.api_path) :]
+        query = dict(parse_qsl(split_url.query))
+
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            self._delay()
+            status, body, headers = self._handle(request, method, path, query)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+            headers = dict(headers, **{"Content-Type": "application/json"})
+        response = _response(status, body, headers, request.url)
+        response.request = request
+        if not kwargs.get("stream"):
+            # Read the body as a requests.Session does
+            response.content
+        return response
+
+    def _delay(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            with self.lock:
+                latency = self.random.uniform(*latency)
+        if latency:
+            self.sleep(latency)
+
+    def _handle(self, request, method: str, path: str, query: Dict) -> Tuple:
+        with self.lock:
+            route = self._route(method, path)
+            if route is None:
+                return 404, _message(404, f"Resource {path} not found"), {}
+            endpoint, handler, args = route
+            call = f"{method} {endpoint}"
+            self.calls[call] += 1
+            answer = self._failure(call) or self._authorize(request, endpoint)
+            if answer:
+                return answer
+            return handler(request, query, *args)
+
+    def _route(self, method: str, path: str) -> Tuple:
+        for route_method, endpoint, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                return endpoint, handler, match.groups()
+        return None
+
+    def _failure(self, call: str) -> Tuple:
+        for failure in self.failures:
+            if failure["endpoint"] in (None, call):
+                failure["times"] -= 1
+                if not failure["times"]:
+                    self.failures.remove(failure)
+                return self._fail(failure["status"], failure["retry_after"])
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            return self._fail(self.failure_status)
+        return None
+
+    def _fail(self, status: int, retry_after: int = None) -> Tuple:
+        if status is None:
+            raise requests.exceptions.ConnectionError("Injected connection failure")
+        headers = {"Retry-After": str(retry_after)} if retry_after else {}
+        return status, _message(status, "Injected failure"), headers
+
+    def _authorize(self, request, endpoint: str) -> Tuple:
+        if endpoint == "/tokens":
+            return None
+        token = request.headers.get("Authorization", "").replace("Bearer ", "")
+        if token not in self.tokens:
+            return 403, _message(403, "Invalid token"), {}
+        group = request.headers.get("groupName")
+        if group and group not in self.groups:
+            return 403, _message(403, f"Provided group:{group} does not exist"), {}
+        return None
+
+    def fail(
+        self,
+        times: int = 1,
+        status: int = 503,
+        endpoint: str = None,
+        retry_after: int = None,
+    ):
+        """Make the next requests fail
+
+        :param times: the number of failed requests (default: 1)
+        :param status: the status of the failed requests, None for a connection error
+            (default: 503)
+        :param endpoint: only fail the requests of an endpoint, e.g. "GET /uploads/{id}"
+            (default: all endpoints)
+        :param retry_after: the value of the Retry-After header (default: None)
+        :type times: int
+        :type status: int
+        :type endpoint: string
+        :type retry_after: int
+        :raises ValueError: if ``times`` is lower than 1
+        """
+        if times < 1:
+            raise ValueError(f"Unable to fail {times} requests")
+        with self.lock:
+            self.failures.append(
+                {
+                    "times": times,
+                    "status": status,
+                    "endpoint": endpoint,
+                    "retry_after": retry_after,
+                }
+            )
+
+    # Synthetic data
+
+    def _findings(self, rng: random.Random) -> Dict:
+        scanner = rng.sample(FAKE_LICENSES, rng.randint(1, 2))
+        conclusion = scanner[:1] if rng.random() < 0.5 else []
+        return {"scanner": scanner, "conclusion": conclusion}
+
+    def add_user(
+        self,
+        name: str,
+        password: str = None,
+        root_folder: int = None,
+        email: str = None,
+    ) -> Dict:
+        """Add a user to the server, with a group of the same name
+
+        :return: the JSON representation of the user
+        :rtype: dict
+        """
+        with self.lock:
+            user = {
+                "id": next(self.ids),
+                "name": name,
+                "description": f"User {name}",
+                "email": email or f"{name}@example.com",
+                "accessLevel": "admin",
+                "rootFolderId": root_folder or 1,
+                "emailNotification": True,
+                "agents": {
+                    agent: True
+                    for agent in (
+                        "bucket",
+                        "copyright_email_author",
+                        "ecc",
+                        "keyword",
+                        "mimetype",
+                        "monk",
+                        "nomos",
+                        "ojo",
+                        "package",
+                    )
+                },
+            }
+            self.users[user["id"]] = user
+            self.passwords[name] = password
+            self.groups.add(name)
+        return user
+
+    def add_users(self, number: int) -> List[Dict]:
+        """Add ``number`` synthetic users"""
+        return [self.add_user(f"user-{i}") for i in range(number)]
+
+    def add_token(self, username: str) -> str:
+        """Add an API token of a user
+
+        :return: the token
+        :rtype: string
+        """
+        with self.lock:
+            token = f"fake-token-{next(self.ids)}"
+            self.tokens[token] = username
+        return token
+
+    def add_folder(self, name: str, parent: int = 1, description: str = "") -> Dict:
+        """Add a folder to the server
+
+        :return: the JSON representation of the folder
+        :rtype: dict
+        """
+        with self.lock:
+            folder = {
+                "id": next(self.ids),
+                "name": name,
+                "description": description,
+                "parent": parent,
+            }
+            self.folders[folder["id"]] = folder
+        return folder
+
+    def add_folders(self, number: int, parent: int = 1) -> List[Dict]:
+        """Add ``number`` synthetic folders under the folder ``parent``"""
+        return [self.add_folder(f"folder-{i}", parent) for i in range(number)]
+
+    def add_upload(
+        self,
+        name: str,
+        folder: int = 1,
+        files: int = 10,
+        content: bytes = None,
+        unpack_time: float = 0,
+    ) -> Dict:
+        """Add an upload to the server
+
+        :param name: the name of the upload
+        :param folder: the id of the folder of the upload (default: 1)
+        :param files: the number of files with license findings (default: 10)
+        :param content: the content of the uploaded file (default: the name)
+        :param unpack_time: the time in seconds before the upload is unpacked
+            (default: 0)
+        :return: the JSON representation of the upload
+        :rtype: dict
+        """
+        with self.lock:
+            upload = {
+                "folderid": folder,
+                "foldername": self.folders[folder]["name"],
+                "id": next(self.ids),
+                "description": "",
+                "uploadname": name,
+                "uploaddate": "2021-01-01 00:00:00.000000+00",
+                "hash": _hash(name.encode() if content is None else content),
+            }
+            self.uploads[upload["id"]] = upload
+            self.upload_folders[upload["id"]] = {folder}
+            self.upload_files[upload["id"]] = files
+            if unpack_time:
+                self.upload_ready[upload["id"]] = self.clock() + unpack_time
+        return upload
+
+    def add_uploads(self, number: int, folder: int = 1, files: int = 10) -> List[Dict]:
+        """Add ``number`` synthetic uploads to the folder ``folder``"""
+        return [
+            self.add_upload(f"upload-{i}.tar.gz", folder, files) for i in range(number)
+        ]
+
+    def add_files(self, number: int) -> List[str]:
+        """Add ``number`` files known to the file search
+
+        :return: the SHA1 of the files
+        :rtype: list of string
+        """
+        sha1s = list()
+        with self.lock:
+            for _ in range(number):
+                file_hash = _hash(f"file-{len(self.files)}".encode())
+                self.files[file_hash["sha1"]] = {
+                    "hash": file_hash,
+                    "findings": self._findings(self.random),
+                }
+                sha1s.append(file_hash["sha1"])
+        return sha1s
+
+    def add_job(
+        self, upload: int, polls: int = 0, queue_time: float = 0, duration: float = 0
+    ) -> Dict:
+        """Add a job running on an upload
+
+        :param upload: the id of the upload
+        :param polls: the number of requests answering "Processing" before the job
+            progresses with the clock (default: 0)
+        :param queue_time: the time in seconds the job is queued (default: 0)
+        :param duration: the time in seconds the job is processing (default: 0)
+        :return: the JSON representation of the job
+        :rtype: dict
+        """
+        with self.lock:
+            job = {
+                "id": next(self.ids),
+                "name": self.uploads[upload]["uploadname"],
+                "queueDate": "2021-01-01 00:00:00.000000+00",
+                "uploadId": upload,
+                "userId": self.user["id"],
+                "groupId": self.user["id"],
+                "eta": 0,
+                "status": "Queued",
+            }
+            self.jobs[job["id"]] = job
+            self.job_schedules[job["id"]] = {
+                "polls": polls,
+                "queued": self.clock() + queue_time,
+                "completed": self.clock() + queue_time + duration,
+            }
+            return self._job_status(job["id"])
+
+    def _job_status(self, job_id: int, poll: bool = False) -> Dict:
+        job = self.jobs[job_id]
+        schedule = self.job_schedules[job_id]
+        remaining = math.ceil(schedule["completed"] - self.clock())
+        if schedule["polls"]:
+            if poll:
+                schedule["polls"] -= 1
+            job.update(status="Processing", eta=max(remaining, 1))
+        elif self.clock() < schedule["queued"]:
+            job.update(status="Queued", eta=remaining)
+        elif remaining > 0:
+            job.update(status="Processing", eta=remaining)
+        else:
+            job.update(status="Completed", eta=0)
+        return dict(job)
+
+    def tree(self, upload_id: int) -> List[Dict]:
+        """Get the files of an upload, generated once from the seed
+
+        :return: the files with their tree id, path, size and license findings
+        :rtype: list of dict
+        """
+        with self.lock:
+            tree = self.trees.get(upload_id)
+            if tree is None:
+                rng = random.Random(f"{self.seed}:{upload_id}")
+                prefix = self.uploads[upload_id]["uploadname"]
+                tree = [
+                    {
+                        "uploadTreeId": upload_id * TREE_IDS + i + 1,
+                        "filePath": f"{prefix}/src/dir-{i // 100}/file-{i}.c",
+                        "size": rng.randint(1, 100000),
+                        "findings": self._findings(rng),
+                    }
+                    for i in range(self.upload_files[upload_id])
+                ]
+                self.trees[upload_id] = tree
+        return tree
+
+    def licenses_payload(self, upload_id: int) -> bytes:
+        """Get the license findings of an upload, encoded once"""
+        with self.lock:
+            payload = self.license_payloads.get(upload_id)
+            if payload is None:
+                payload = json.dumps(
+                    [
+                        {"filePath": item["filePath"], "findings": item["findings"]}
+                        for item in self.tree(upload_id)
+                    ]
+                ).encode()
+                self.license_payloads[upload_id] = payload
+        return payload
+
+    def _subfolders(self, folder_id: int) -> List[int]:
+        """Get the ids of a folder and of all its subfolders"""
+        children = dict()
+        for folder in self.folders.values():
+            children.setdefault(folder["parent"], list()).append(folder["id"])
+        subtree = [folder_id]
+        for current in subtree:
+            subtree.extend(children.get(current, ()))
+        return subtree
+
+    def _unpacking(self, upload_id: int) -> Tuple:
+        """Get the 503 answer of an upload being unpacked - or None if it's ready"""
+        remaining = self.upload_ready.get(upload_id, 0) - self.clock()
+        if remaining <= 0:
+            return None
+        message = (
+            "Ununpack job not started. Please check job status at "
+            f"/api/v1/jobs?upload={upload_id}"
+        )
+        headers = {"Retry-After": str(max(1, math.ceil(remaining)))}
+        return 503, _message(503, message), headers
+
+    def _not_found(self, kind: str, item_id) -> Tuple:
+        return 404, _message(404, f"{kind} {item_id} not found"), {}
+
+    # Version, tokens and users
+
+    def get_version(self, request, query):
+        return 200, {"version": FAKE_VERSION}, {}
+
+    def post_token(self, request, query):
+        form = dict(parse_qsl(request.body or ""))
+        username = form.get("username")
+        if username not in self.passwords:
+            return 404, _message(404, "Username or password is incorrect"), {}
+        if self.passwords[username] != form.get("password"):
+            return 404, _message(404, "Username or password is incorrect"), {}
+        return 201, {"Authorization": f"Bearer {self.add_token(username)}"}, {}
+
+    def get_users(self, request, query):
+        return 200, list(self.users.values()), {}
+
+    def get_user(self, request, query, user_id):
+        user = self.users.get(int(user_id))
+        if user is None:
+            return self._not_found("User", user_id)
+        return 200, user, {}
+
+    def delete_user(self, request, query, user_id):
+        user = self.users.pop(int(user_id), None)
+        if user is None:
+            return self._not_found("User", user_id)
+        self.passwords.pop(user["name"], None)
+        self.groups.discard(user["name"])
+        for token, username in list(self.tokens.items()):
+            if username == user["name"]:
+                del self.tokens[token]
+        return 202, _message(202, f"User {user_id} will be deleted"), {}
+
+    # Folders
+
+    def get_folders(self, request, query):
+        return 200, list(self.folders.values()), {}
+
+    def get_folder(self, request, query, folder_id):
+        folder = self.folders.get(int(folder_id))
+        if folder is None:
+            return self._not_found("Folder", folder_id)
+        return 200, folder, {}
+
+    def post_folder(self, request, query):
+        parent = int(request.headers["parentFolder"])
+        name = request.headers["folderName"]
+        if parent not in self.folders:
+            return self._not_found("Folder", parent)
+        for folder in self.folders.values():
+            if folder["parent"] == parent and folder["name"] == name:
+                message = "Folder with the same name already exists under the parent"
+                return 200, _message(200, message), {}
+        description = request.headers.get("folderDescription", "")
+        folder = self.add_folder(name, parent, description)
+        return 201, _message(201, folder["id"]), {}
+
+    def patch_folder(self, request, query, folder_id):
+        folder = self.folders.get(int(folder_id))
+        if folder is None:
+            return self._not_found("Folder", folder_id)
+        folder["name"] = request.headers.get("name") or folder["name"]
+        folder["description"] = (
+            request.headers.get("description") or folder["description"]
+        )
+        return 200, _message(200, f"Folder {folder_id} updated"), {}
+
+    def put_folder(self, request, query, folder_id):
+        folder = self.folders.get(int(folder_id))
+        parent = int(request.headers["parent"])
+        if folder is None or parent not in self.folders:
+            return self._not_found("Folder", folder_id if folder is None else parent)
+        if parent in self._subfolders(folder["id"]):
+            return 400, _message(400, "Can not move a folder into itself"), {}
+        action = request.headers["action"]
+        if action == "move":
+            folder["parent"] = parent
+        else:
+            self._copy_folder(folder["id"], parent)
+        return 202, _message(202, f"Folder {folder_id} will be {action}d"), {}
+
+    def _copy_folder(self, folder_id: int, parent: int):
+        folder = self.folders[folder_id]
+        children = [f["id"] for f in self.folders.values() if f["parent"] == folder_id]
+        copy = self.add_folder(folder["name"], parent, folder["description"])
+        for child in children:
+            self._copy_folder(child, copy["id"])
+
+    def delete_folder(self, request, query, folder_id):
+        folder_id = int(folder_id)
+        if folder_id not in self.folders:
+            return self._not_found("Folder", folder_id)
+        if self.folders[folder_id]["parent"] is None:
+            return 403, _message(403, "Can not delete the root folder"), {}
+        subtree = set(self._subfolders(folder_id))
+        for upload_id, folders in list(self.upload_folders.items()):
+            folders -= subtree
+            if not folders:
+                self._remove_upload(upload_id)
+        for subfolder in subtree:
+            del self.folders[subfolder]
+        return 202, _message(202, f"Folder {folder_id} will be deleted"), {}
+
+    # Uploads
+
+    def get_uploads(self, request, query):
+        uploads = list(self.uploads.values())
+        if "folderId" in query:
+            folder_id = int(query["folderId"])
+            if query.get("recursive") == "false":
+                folders = {folder_id}
+            else:
+                folders = set(self._subfolders(folder_id))
+            uploads = [
+                upload
+                for upload in uploads
+                if self.upload_folders[upload["id"]] & folders
+            ]
+        return (200, *_page(uploads, request.headers))
+
+    def post_upload(self, request, query):
+        folder_id = int(request.headers["folderId"])
+        if folder_id not in self.folders:
+            return self._not_found("Folder", folder_id)
+        content = request.body or b""
+        if request.headers.get("Content-Type") == "application/json":
+            spec = json.loads(content)
+            name = spec.get("vcsName") or spec.get("name") or spec.get("url")
+        else:
+            name, content = _multipart_file(request)
+        upload = self.add_upload(
+            name, folder_id, content=content, unpack_time=self.unpack_time
+        )
+        upload["description"] = request.headers.get("uploadDescription", "")
+        self.add_job(upload["id"], duration=self.unpack_time)
+        return 201, _message(201, upload["id"]), {}
+
+    def get_upload(self, request, query, upload_id):
+        upload = self.uploads.get(int(upload_id))
+        if upload is None:
+            return self._not_found("Upload", upload_id)
+        return self._unpacking(upload["id"]) or (200, upload, {})
+
+    def patch_upload(self, request, query, upload_id):
+        upload = self.uploads.get(int(upload_id))
+        folder_id = int(request.headers["folderId"])
+        if upload is None or folder_id not in self.folders:
+            return self._not_found("Upload", upload_id)
+        upload.update(folderid=folder_id, foldername=self.folders[folder_id]["name"])
+        self.upload_folders[upload["id"]] = {folder_id}
+        return 202, _message(202, f"Upload {upload_id} will be moved"), {}
+
+    def put_upload(self, request, query, upload_id):
+        upload = self.uploads.get(int(upload_id))
+        folder_id = int(request.headers["folderId"])
+        if upload is None or folder_id not in self.folders:
+            return self._not_found("Upload", upload_id)
+        self.upload_folders[upload["id"]].add(folder_id)
+        return 202, _message(202, f"Upload {upload_id} will be copied"), {}
+
+    def delete_upload(self, request, query, upload_id):
+        if int(upload_id) not in self.uploads:
+            return self._not_found("Upload", upload_id)
+        self._remove_upload(int(upload_id))
+        return 202, _message(202, f"Delete Job for file with id {upload_id}"), {}
+
+    def _remove_upload(self, upload_id: int):
+        for index in (
+            self.uploads,
+            self.upload_folders,
+            self.upload_files,
+            self.upload_ready,
+            self.trees,
+            self.license_payloads,
+        ):
+            index.pop(upload_id, None)
+
+    def get_summary(self, request, query, upload_id):
+        upload = self.uploads.get(int(upload_id))
+        if upload is None:
+            return self._not_found("Upload", upload_id)
+        unpacking = self._unpacking(upload["id"])
+        if unpacking:
+            return unpacking
+        tree = self.tree(upload["id"])
+        found = Counter(lic for item in tree for lic in item["findings"]["scanner"])
+        concluded = Counter(
+            lic for item in tree for lic in item["findings"]["conclusion"]
+        )
+        cleared = sum(1 for item in tree if item["findings"]["conclusion"])
+        summary = {
+            "id": upload["id"],
+            "uploadName": upload["uploadname"],
+            "mainLicense": found.most_common(1)[0][0] if found else None,
+            "uniqueLicenses": len(found),
+            "totalLicenses": sum(found.values()),
+            "uniqueConcludedLicenses": len(concluded),
+            "totalConcludedLicenses": sum(concluded.values()),
+            "filesToBeCleared": len(tree) - cleared,
+            "filesCleared": cleared,
+            "clearingStatus": "Open",
+            "copyrightCount": 0,
+        }
+        return 200, summary, {}
+
+    def get_licenses(self, request, query, upload_id):
+        upload_id = int(upload_id)
+        if upload_id not in self.uploads:
+            return self._not_found("Upload", upload_id)
+        agents = query.get("agent", "nomos").split(",")
+        unknown = [agent for agent in agents if agent not in FAKE_AGENTS]
+        if unknown:
+            return 412, _message(412, f"Agent {unknown[0]} not scheduled"), {}
+        return self._unpacking(upload_id) or (
+            200,
+            self.licenses_payload(upload_id),
+            {"Content-Type": "application/json"},
+        )
+
+    # Search
+
+    def _search_items(self, search_type: str, upload_id: int) -> List[Dict]:
+        if search_type == "containers":
+            upload = self.uploads[upload_id]
+            return [
+                {
+                    "uploadTreeId": upload_id * TREE_IDS,
+                    "filePath": upload["uploadname"],
+                    "size": upload["hash"]["size"],
+                    "findings": None,
+                }
+            ]
+        tree = self.tree(upload_id)
+        if search_type == "directories":
+            directories = sorted({dirname(item["filePath"]) for item in tree})
+            return [
+                {
+                    "uploadTreeId": upload_id * TREE_IDS,
+                    "filePath": directory,
+                    "size": 0,
+                    "findings": None,
+                }
+                for directory in directories
+            ]
+        return tree
+
+    def _search_match(self, headers, item: Dict) -> bool:
+        filename = headers.get("filename")
+        if filename and not _like(filename)(basename(item["filePath"])):
+            return False
+        if int(headers.get("filesizemin", 0)) > item["size"]:
+            return False
+        if "filesizemax" in headers and int(headers["filesizemax"]) < item["size"]:
+            return False
+        license = headers.get("license")
+        if license and license not in (item["findings"] or {}).get("scanner", ()):
+            return False
+        # The synthetic files have no tags and no copyrights
+        return not headers.get("tag") and not headers.get("copyright")
+
+    def get_search(self, request, query):
+        headers = request.headers
+        upload_ids = list(self.uploads)
+        if headers.get("uploadId"):
+            upload_ids = [int(headers["uploadId"])]
+            if upload_ids[0] not in self.uploads:
+                return self._not_found("Upload", upload_ids[0])
+        results = [
+            {
+                "upload": self.uploads[upload_id],
+                "uploadTreeId": item["uploadTreeId"],
+                "filename": basename(item["filePath"]),
+            }
+            for upload_id in upload_ids
+            for item in self._search_items(headers.get("searchType"), upload_id)
+            if self._search_match(headers, item)
+        ]
+        if "limit" not in headers:
+            return 200, results, {}
+        return (200, *_page(results, headers))
+
+    def post_filesearch(self, request, query):
+        results = list()
+        for item in json.loads(request.body):
+            found = self.files.get(str(item.get("sha1", "")).upper())
+            results.append(found or {"hash": item, "message": "Not found"})
+        return 200, results, {}
+
+    # Reports
+
+    def get_report(self, request, query):
+        upload_id = int(request.headers["uploadId"])
+        if upload_id not in self.uploads:
+            return self._not_found("Upload", upload_id)
+        unpacking = self._unpacking(upload_id)
+        if unpacking:
+            return unpacking
+        report_id = next(self.ids)
+        self.reports[report_id] = {
+            "upload": upload_id,
+            "format": request.headers.get("reportFormat", "readmeoss"),
+            "ready": self.clock() + self.report_time,
+        }
+        return 201, _message(201, f"{self.api}/report/{report_id}"), {}
+
+    def get_report_file(self, request, query, report_id):
+        report = self.reports.get(int(report_id))
+        if report is None:
+            return self._not_found("Report", report_id)
+        remaining = report["ready"] - self.clock()
+        if remaining > 0:
+            message = "Report is not ready yet. Check job status"
+            headers = {"Retry-After": str(max(1, math.ceil(remaining)))}
+            return 503, _message(503, message), headers
+        upload = self.uploads.get(report["upload"], {"uploadname": "deleted"})
+        name = f"{report['format']}_{upload['uploadname']}.txt"
+        content = (f"Report {report_id}\n".encode() * self.report_size)[
+            : self.report_size
+        ]
+        disposition = f'attachment; filename="{name}"'
+        return 200, content, {"Content-Disposition": disposition}
+
+    # Jobs
+
+    def get_jobs(self, request, query):
+        jobs = [self._job_status(job_id) for job_id in self.jobs]
+        if "upload" in query:
+            jobs = [job for job in jobs if job["uploadId"] == int(query["upload"])]
+        return (200, *_page(jobs, request.headers))
+
+    def post_job(self, request, query):
+        upload_id = int(request.headers["uploadId"])
+        if upload_id not in self.uploads:
+            return self._not_found("Upload", upload_id)
+        try:
+            json.loads(request.body)
+        except (TypeError, ValueError):
+            return 400, _message(400, "Invalid job specification"), {}
+        job = self.add_job(
+            upload_id, queue_time=self.job_queue_time, duration=self.job_time
+        )
+        return 201, _message(201, job["id"]), {}
+
+    def get_job(self, request, query, job_id):
+        if int(job_id) not in self.jobs:
+            return self._not_found("Job", job_id)
+        return 200, self._job_status(int(job_id), poll=True), {}
@@ -1,63 +1,307 @@
 # Copyright 2019-2021 Siemens AG
 # SPDX-License-Identifier: MIT
 
+import time
 import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterator, List
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from fossology.obj import Folder, get_options
 from fossology.exceptions import AuthorizationError, FossologyApiError
+from fossology.transport import operation
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
+class FolderTree:
+
+    """Index of the folders known to the client
+
+    Folders are indexed by id and by parent id and name, adding, updating or removing a
+    folder doesn't depend on the number of folders in the tree.
+
+    The tree also records when each folder and the whole list were last received from
+    the server, see :meth:`is_fresh`. Changes to the index are serialized by a lock,
+    a tree can be shared by several clients and threads.
+
+    .. note::
+
+        ``Fossology.folders`` used to be a plain list. The tree still supports
+        ``len()``, ``in``, iteration and indexing, but not the list methods changing
+        it: use :meth:`add` instead of ``append()``. :meth:`remove` accepts a folder
+        or its id.
+
+    :Example:
+
+    >>> foss.folders.get(3)
+    >>> foss.folders.find(foss.rootFolder.id, "Products")
+    >>> foss.folders.find_path("Products/Foo/2024", foss.rootFolder.id)
+
+    :param folders: the initial folders (default: empty)
+    :type folders: iterable of Folder
+    """
+
+    def __init__(self, folders=()):
+        self.by_id = dict()
+        self.children = dict()
+        self.updated = dict()
+        self.listed = None
+        self._lock = threading.RLock()
+        for folder in folders:
+            self.add(folder)
+
+    def __iter__(self) -> Iterator[Folder]:
+        with self._lock:
+            return iter(list(self.by_id.values()))
+
+    def __getitem__(self, index):
+        with self._lock:
+            return list(self.by_id.values())[index]
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, folder) -> bool:
+        return getattr(folder, "id", folder) in self.by_id
+
+    def add(self, folder: Folder):
+        """Add a folder to the tree or replace the folder with the same id
+
+        :param folder: the folder
+        :type folder: Folder
+        """
+        with self._lock:
+            previous = self.by_id.get(folder.id)
+            if previous is not None:
+                siblings = self.children.get(previous.parent, {})
+                if siblings.get(previous.name) is previous:
+                    del siblings[previous.name]
+            self.by_id[folder.id] = folder
+            self.children.setdefault(folder.parent, dict())[folder.name] = folder
+            self.updated[folder.id] = time.monotonic()
+
+    def replace(self, folders):
+        """Replace all the folders of the tree with a complete list of folders
+
+        :param folders: the folders
+        :type folders: iterable of Folder
+        """
+        with self._lock:
+            self.by_id = dict()
+            self.children = dict()
+            self.updated = dict()
+            for folder in folders:
+                self.add(folder)
+            self.listed = time.monotonic()
+
+    def invalidate(self, folder_id: int = None):
+        """Mark a folder - or the list of folders if no id is given - as outdated
+
+        :param folder_id: the id of the folder (default: None)
+        :type folder_id: int
+        """
+        with self._lock:
+            if folder_id is None:
+                self.listed = None
+            else:
+                self.updated.pop(folder_id, None)
+
+    def is_fresh(self, max_age: float, folder_id: int = None) -> bool:
+        """Check if a folder - or the list of folders if no id is given - was received
+        from the server less than ``max_age`` seconds ago
+
+        :param max_age: the maximum age in seconds, 0 means never fresh
+        :param folder_id: the id of the folder (default: None)
+        :type max_age: float
+        :type folder_id: int
+        :rtype: bool
+        """
+        if folder_id is None:
+            updated = self.listed
+        else:
+            updated = self.updated.get(folder_id)
+        if not max_age or updated is None:
+            return False
+        return time.monotonic() - updated < max_age
+
+    def remove(self, folder_id: int) -> List[Folder]:
+        """Remove a folder and its subfolders from the tree
+
+        :param folder_id: the id of the folder - or the folder
+        :type folder_id: int or Folder
+        :return: the folders removed from the tree
+        :rtype: list of Folder
+        """
+        removed = list()
+        to_remove = [getattr(folder_id, "id", folder_id)]
+        with self._lock:
+            while to_remove:
+                folder = self.by_id.pop(to_remove.pop(), None)
+                if folder is None:
+                    continue
+                self.updated.pop(folder.id, None)
+                siblings = self.children.get(folder.parent, {})
+                if siblings.get(folder.name) is folder:
+                    del siblings[folder.name]
+                to_remove.extend(
+                    child.id for child in self.children.pop(folder.id, {}).values()
+                )
+                removed.append(folder)
+        return removed
+
+    def get(self, folder_id: int) -> Folder:
+        """Get a folder by id
+
+        :return: the folder - or None
+        :rtype: Folder
+        """
+        return self.by_id.get(folder_id)
+
+    def find(self, parent_id: int, name: str) -> Folder:
+        """Get a folder by name in a given parent folder
+
+        :return: the folder - or None
+        :rtype: Folder
+        """
+        return self.children.get(parent_id, {}).get(name)
+
+    def subfolders(self, folder_id: int) -> List[Folder]:
+        """Get the direct subfolders of a folder
+
+        :rtype: list of Folder
+        """
+        with self._lock:
+            return list(self.children.get(folder_id, {}).values())
+
+    def path(self, folder: Folder) -> str:
+        """Get the full path of a folder, e.g. "Software Repository/Products/Foo"
+
+        :rtype: string
+        """
+        names = [folder.name]
+        seen = {folder.id}
+        parent = self.by_id.get(folder.parent)
+        while parent is not None and parent.id not in seen:
+            names.append(parent.name)
+            seen.add(parent.id)
+            parent = self.by_id.get(parent.parent)
+        return "/".join(reversed(names))
+
+    def find_path(self, path: str, root_id: int) -> Folder:
+        """Get a folder by its path relative to a given folder
+
+        :param path: the names of the folders separated by "/", e.g. "Products/Foo"
+        :param root_id: the id of the folder the path starts from
+        :type path: string
+        :type root_id: int
+        :return: the folder - or None
+        :rtype: Folder
+        """
+        folder = self.by_id.get(root_id)
+        for name in filter(None, path.split("/")):
+            if folder is None:
+                return None
+            folder = self.find(folder.id, name)
+        return folder
+
+
 class Folders:
-    """Class dedicated to all "folders" related endpoints"""
+    """Class dedicated to all "folders" related endpoints
+
+    The folders received from the server are kept in the folder index ``self.folders``
+    and reused for ``self.folder_cache_ttl`` seconds by list_folders() and
+    detail_folder(). Creating, updating, deleting, copying or moving a folder only
+    invalidates the entries changed by the operation. The number of requests saved
+    is counted in ``self.folder_cache_stats``, guarded by ``self.folder_cache_lock``.
+    """
+
+    def _folder_cache(self, max_age, folder_id=None):
+        """Check if the cached folders can be used and count the hit or the miss
 
-    def list_folders(self):
+        Requests sent without cache (a maximum age of 0) are not counted.
+
+        :rtype: bool
+        """
+        if max_age is None:
+            max_age = self.folder_cache_ttl
+        if not max_age:
+            return False
+        fresh = self.folders.is_fresh(max_age, folder_id)
+        with self.folder_cache_lock:
+            self.folder_cache_stats["hits" if fresh else "misses"] += 1
+        return fresh
+
+    @operation
+    def list_folders(self, max_age=None):
         """List all folders accessible to the authenticated user
 
         API Endpoint: GET /folders
 
+        The folder index ``self.folders`` is rebuilt from the list. The cached list is
+        returned without any request if it was received less than ``max_age`` seconds
+        ago, ``max_age=0`` forces a refresh.
+
+        :param max_age: the maximum age of the cached list in seconds (default: self.folder_cache_ttl)
+        :type max_age: float
         :return: a list of folders
         :rtype: list()
         :raises FossologyApiError: if the REST call failed
         """
-        response = self.session.get(f"{self.api}/folders")
+        if self._folder_cache(max_age):
+            return list(self.folders)
+        response = self._request("GET", "/folders")
         if response.status_code == 200:
-            folders_list = list()
-            response_list = response.json()
-            for folder in response_list:
-                sub_folder = Folder.from_json(folder)
-                sub_folder.parent = self.rootFolder.id
-                folders_list.append(sub_folder)
-            return folders_list
+            folders_list = self._decode(response, self._folders_from_json)
+            self.folders.replace(folders_list)
+            if self.rootFolder.id not in self.folders:
+                self.folders.add(self.rootFolder)
+            return list(folders_list)
         else:
             description = f"Unable to get a list of folders for {self.user.name}"
             raise FossologyApiError(description, response)
 
-    def detail_folder(self, folder_id):
+    def _folders_from_json(self, response) -> List[Folder]:
+        """Build the folders of a GET /folders response"""
+        folders_list = list()
+        for folder in self._json(response):
+            sub_folder = Folder.from_json(folder)
+            if sub_folder.parent is None and sub_folder.id != self.rootFolder.id:
+                sub_folder.parent = self.rootFolder.id
+            folders_list.append(sub_folder)
+        return folders_list
+
+    @operation
+    def detail_folder(self, folder_id, max_age=None):
         """Get details of folder.
 
         API Endpoint: GET /folders/{id}
 
+        The cached folder is returned without any request if it was received less than
+        ``max_age`` seconds ago, ``max_age=0`` forces a refresh.
+
         :param id: the ID of the folder to be analysed
+        :param max_age: the maximum age of the cached folder in seconds (default: self.folder_cache_ttl)
         :type id: int
+        :type max_age: float
         :return: the requested folder
         :rtype: Folder() object
         :raises FossologyApiError: if the REST call failed
         """
-        response = self.session.get(f"{self.api}/folders/{folder_id}")
+        if self._folder_cache(max_age, folder_id):
+            return self.folders.get(folder_id)
+        response = self._request("GET", "/folders/{id}", folder_id)
         if response.status_code == 200:
-            detailled_folder = Folder.from_json(response.json())
-            for folder in self.folders:
-                if folder.id == folder_id:
-                    self.folders.remove(folder)
-            self.folders.append(detailled_folder)
+            detailled_folder = Folder.from_json(self._json(response))
+            self.folders.add(detailled_folder)
             return detailled_folder
         else:
             description = f"Error while getting details for folder {folder_id}"
             raise FossologyApiError(description, response)
 
+    @operation
     def create_folder(self, parent, name, description=None, group=None):
         """Create a new (sub)folder
 
@@ -78,6 +322,35 @@ class Folders:
         :raises FossologyApiError: if the REST call failed
         :raises AuthorizationError: if the user is not allowed to write in the folder or access the group
         """
+        folder_id = self._post_folder(parent, name, description, group)
+        if folder_id is None:
+            logger.info(f"Folder '{name}' already exists")
+            folder = self.folders.find(parent.id, name)
+            if folder is None:
+                # The folder may have been created by another client
+                self.list_folders(max_age=0)
+                folder = self.folders.find(parent.id, name)
+            if folder is None:
+                logger.error(
+                    "Folder exists but was not found in the user's folder list"
+                )
+            return folder
+
+        logger.info(f"Folder {name} has been created")
+        return self.detail_folder(folder_id)
+
+    def _post_folder(self, parent, name, description=None, group=None):
+        """Send the request creating a folder
+
+        Internal function meant to be called by create_folder() or resolve_folder()
+
+        API Endpoint: POST /folders
+
+        :return: the ID of the folder newly created - or None if it already exists
+        :rtype: int
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user is not allowed to write in the folder or access the group
+        """
         headers = {
             "parentFolder": f"{parent.id}",
             "folderName": f"{name}",
@@ -86,20 +359,12 @@ class Folders:
         if group:
             headers["groupName"] = group
 
-        response = self.session.post(f"{self.api}/folders", headers=headers)
+        response = self._request("POST", "/folders", headers=headers)
 
         if response.status_code == 200:
-            logger.info(f"Folder '{name}' already exists")
-            for folder in self.folders:
-                if folder.name == name:
-                    return folder
-            logger.error("Folder exists but was not found in the user's folder list")
-            return
-
+            return None
         elif response.status_code == 201:
-            logger.info(f"Folder {name} has been created")
-            return self.detail_folder(response.json()["message"])
-
+            return int(self._json(response)["message"])
         elif response.status_code == 403:
             description = f"Folder creation {get_options(group, parent)}not authorized"
             raise AuthorizationError(description, response)
@@ -107,6 +372,65 @@ class Folders:
             description = f"Unable to create folder {name} under {parent}"
             raise FossologyApiError(description, response)
 
+    @operation
+    def resolve_folder(
+        self, path, create=True, parent=None, description=None, group=None
+    ):
+        """Get a folder by its path, optionally creating the missing folders (mkdir -p)
+
+        The longest existing part of the path is resolved from the folder index
+        ``self.folders`` without any request, only the missing folders are created.
+        The folders created are added to the index with the id returned by the server,
+        the folder list is only received again if a folder already existed on the
+        server but not in the index.
+
+        :Example:
+
+        >>> folder = foss.resolve_folder("Products/Foo/2024/Q3")
+
+        :param path: the names of the folders separated by "/", e.g. "Products/Foo"
+        :param create: create the missing folders (default: True)
+        :param parent: the folder the path starts from (default: the root folder)
+        :param description: the description of the folders created (default: None)
+        :param group: the name of the group chosen to create the folders (default: None)
+        :type path: string
+        :type create: boolean
+        :type parent: Folder() object
+        :type description: string
+        :type group: string
+        :return: the folder - or None if it doesn't exist and create is False
+        :rtype: Folder() object
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user is not allowed to write in the folder or access the group
+        """
+        folder = parent or self.rootFolder
+        names = [name for name in path.split("/") if name]
+        while names and self.folders.find(folder.id, names[0]):
+            folder = self.folders.find(folder.id, names.pop(0))
+        if not names:
+            return folder
+        if not create:
+            return None
+
+        for name in names:
+            folder_id = self._post_folder(folder, name, description, group)
+            if folder_id is None:
+                # The folder may have been created by another client
+                self.list_folders(max_age=0)
+                existing = self.folders.find(folder.id, name)
+                if existing is None:
+                    logger.error(
+                        "Folder exists but was not found in the user's folder list"
+                    )
+                    return None
+                folder = existing
+                continue
+            logger.info(f"Folder {name} has been created")
+            folder = Folder(folder_id, name, description, folder.id)
+            self.folders.add(folder)
+        return folder
+
+    @operation
     def update_folder(self, folder, name=None, description=None):
         """Update a folder's name or description
 
@@ -127,10 +451,17 @@ class Folders:
             headers["name"] = name
         if description:
             headers["description"] = description
-        folders_api_path = f"{self.api}/folders/{folder.id}"
 
-        response = self.session.patch(folders_api_path, headers=headers)
+        response = self._request("PATCH", "/folders/{id}", folder.id, headers=headers)
         if response.status_code == 200:
+            self.folders.add(
+                Folder(
+                    folder.id,
+                    name or folder.name,
+                    description or folder.description,
+                    folder.parent,
+                )
+            )
             folder = self.detail_folder(folder.id)
             logger.info(f"{folder} has been updated")
             return folder
@@ -138,6 +469,7 @@ class Folders:
             description = f"Unable to update folder {folder.id}"
             raise FossologyApiError(description, response)
 
+    @operation
     def delete_folder(self, folder):
         """Delete a folder
 
@@ -147,8 +479,9 @@ class Folders:
         :type folder: Folder() object
         :raises FossologyApiError: if the REST call failed
         """
-        response = self.session.delete(f"{self.api}/folders/{folder.id}")
+        response = self._request("DELETE", "/folders/{id}", folder.id)
         if response.status_code == 202:
+            self.folders.remove(folder.id)
             logger.info(f"Folder {folder.id} has been scheduled for deletion")
         else:
             description = f"Unable to delete folder {folder.id}"
@@ -172,14 +505,22 @@ class Folders:
         :raises FossologyApiError: if the REST call failed
         """
         headers = {"parent": str(parent.id), "action": action}
-        response = self.session.put(f"{self.api}/folders/{folder.id}", headers=headers)
+        response = self._request("PUT", "/folders/{id}", folder.id, headers=headers)
         if response.status_code == 202:
             logger.info(f"Folder {folder.name} has been {action}d to {parent.name}")
+            if action == "move":
+                self.folders.add(
+                    Folder(folder.id, folder.name, folder.description, parent.id)
+                )
+            else:
+                # The id of the copy is unknown, the list of folders is outdated
+                self.folders.invalidate()
             return self.detail_folder(folder.id)
         else:
             description = f"Unable to {action} folder {folder.name} to {parent.name}"
             raise FossologyApiError(description, response)
 
+    @operation
     def copy_folder(self, folder, parent):
         """Copy a folder
 
@@ -193,6 +534,7 @@ class Folders:
         """
         return self._put_folder("copy", folder, parent)
 
+    @operation
     def move_folder(self, folder, parent):
         """Move a folder
 
@@ -205,3 +547,211 @@ class Folders:
         :raises FossologyApiError: if the REST call failed
         """
         return self._put_folder("move", folder, parent)
+
+    @operation
+    def walk_folder(self, folder) -> Iterator[Folder]:
+        """Walk through a folder and all its subfolders
+
+        The subfolders are read from the folder index ``self.folders``, refreshed by
+        list_folders() beforehand. Each folder is yielded before its subfolders.
+
+        :param folder: the top folder
+        :type folder: Folder() object
+        :return: the folder and its subfolders
+        :rtype: iterator of Folder
+        :raises FossologyApiError: if the REST call failed
+        """
+        self.list_folders()
+        to_walk = deque([self.folders.get(folder.id) or folder])
+        while to_walk:
+            current = to_walk.popleft()
+            yield current
+            to_walk.extend(self.folders.subfolders(current.id))
+
+    def _map_subtree(
+        self,
+        folder,
+        folders: List[Folder],
+        action: Callable,
+        workers: int = 4,
+        errors: Dict = None,
+    ) -> Dict:
+        """Apply an action to a folder and all its subfolders, subfolders first
+
+        Internal function meant to be called by the subtree functions
+
+        Independent branches are processed in parallel by a pool of ``workers`` threads,
+        a folder is only processed once the action succeeded for all its subfolders.
+
+        :return: the result of the action by folder id
+        :rtype: dict
+        :raises FossologyApiError: if the REST call failed and no errors dictionary is given
+        :raises AuthorizationError: if the user is not authorized and no errors dictionary is given
+        """
+        by_id = {f.id: f for f in folders}
+        remaining = {f.id: 0 for f in folders}
+        for f in folders:
+            if f.id != folder.id:
+                remaining[f.parent] += 1
+        results = dict()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                self._submit(executor, action, f): f
+                for f in folders
+                if not remaining[f.id]
+            }
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    current = futures.pop(future)
+                    try:
+                        results[current.id] = future.result()
+                    except (AuthorizationError, FossologyApiError) as error:
+                        if errors is None:
+                            raise
+                        errors[current.id] = error
+                        continue
+                    if current.id == folder.id:
+                        continue
+                    remaining[current.parent] -= 1
+                    if not remaining[current.parent]:
+                        parent = by_id[current.parent]
+                        futures[self._submit(executor, action, parent)] = parent
+        return results
+
+    @operation
+    def delete_folder_tree(
+        self, folder, workers: int = 4, errors: Dict = None
+    ) -> List[Folder]:
+        """Delete a folder and all its subfolders
+
+        The subfolders are deleted before their parent, independent branches are
+        deleted in parallel. If the deletion of a folder fails, its parent folders are
+        kept. The deleted folders are removed from the folder index ``self.folders``
+        by the worker threads, its changes are serialized by the index lock.
+
+        :Example:
+
+        >>> errors = dict()
+        >>> deleted = foss.delete_folder_tree(folder, workers=8, errors=errors)
+
+        :param folder: the top folder
+        :param workers: the number of parallel requests (default: 4)
+        :param errors: a dictionary filled with the errors by folder id (default: None)
+        :type folder: Folder() object
+        :type workers: int
+        :type errors: dict
+        :return: the deleted folders
+        :rtype: list of Folder
+        :raises FossologyApiError: if the REST call failed and no errors dictionary is given
+        """
+        folders = list(self.walk_folder(folder))
+        by_id = {f.id: f for f in folders}
+        deleted = self._map_subtree(
+            folder, folders, self.delete_folder, workers, errors
+        )
+        return [by_id[folder_id] for folder_id in deleted]
+
+    @operation
+    def move_folder_uploads(
+        self,
+        folder,
+        destination,
+        group=None,
+        workers: int = 4,
+        errors: Dict = None,
+        flatten: bool = False,
+    ) -> List:
+        """Move the uploads of a folder and all its subfolders to another folder
+
+        The structure of the subfolders is kept: the uploads of a subfolder are moved
+        to the folder with the same relative path in the destination, created if
+        needed. With ``flatten=True`` all the uploads are moved directly to the
+        destination folder.
+
+        :param folder: the top folder
+        :param destination: the destination folder
+        :param group: the group name to chose while moving the uploads (default: None)
+        :param workers: the number of parallel requests (default: 4)
+        :param errors: a dictionary filled with the errors by upload id (default: None)
+        :param flatten: move all the uploads to the destination folder (default: False)
+        :type folder: Folder() object
+        :type destination: Folder() object
+        :type group: string
+        :type workers: int
+        :type errors: dict
+        :type flatten: boolean
+        :return: the moved uploads
+        :rtype: list of Upload
+        :raises FossologyApiError: if the REST call failed and no errors dictionary is given
+        :raises AuthorizationError: if the user can't access the group or folder and no errors dictionary is given
+        """
+        uploads = list(self.iter_uploads(folder, group, recursive=True))
+        targets = {folder.id: destination}
+        if not flatten:
+            # Subfolders are walked after their parent, the parent path is known
+            paths = {folder.id: ""}
+            for subfolder in self.walk_folder(folder):
+                if subfolder.id == folder.id:
+                    continue
+                paths[subfolder.id] = f"{paths[subfolder.parent]}/{subfolder.name}"
+            for upload in uploads:
+                if upload.folderid in paths and upload.folderid not in targets:
+                    targets[upload.folderid] = self.resolve_folder(
+                        paths[upload.folderid], parent=destination, group=group
+                    )
+        moved = list()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                self._submit(
+                    executor,
+                    self.move_upload,
+                    upload,
+                    targets.get(upload.folderid, destination),
+                    group,
+                )
+                for upload in uploads
+            ]
+            for upload, future in zip(uploads, futures):
+                try:
+                    future.result()
+                except (AuthorizationError, FossologyApiError) as error:
+                    if errors is None:
+                        raise
+                    errors[upload.id] = error
+                    continue
+                moved.append(upload)
+        return moved
+
+    @operation
+    def folder_tree_stats(self, folder, group=None) -> Dict:
+        """Count the subfolders and the uploads of a folder
+
+        :Example:
+
+        >>> stats = foss.folder_tree_stats(folder)
+        >>> print(stats["folders"], stats["uploads"], stats["size"])
+
+        :param folder: the top folder
+        :param group: the group name to chose while listing the uploads (default: None)
+        :type folder: Folder() object
+        :type group: string
+        :return: the number of folders, the number of uploads and their total size in
+            bytes, for the whole tree and by folder id
+        :rtype: dict
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
+        """
+        by_folder = {f.id: {"uploads": 0, "size": 0} for f in self.walk_folder(folder)}
+        stats = {"folders": len(by_folder), "uploads": 0, "size": 0}
+        for upload in self.iter_uploads(folder, group, recursive=True):
+            size = upload.hash.size or 0
+            stats["uploads"] += 1
+            stats["size"] += size
+            folder_stats = by_folder.setdefault(
+                upload.folderid, {"uploads": 0, "size": 0}
+            )
+            folder_stats["uploads"] += 1
+            folder_stats["size"] += size
+        stats["by_folder"] = by_folder
+        return stats
@@ -0,0 +1,352 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import os
+import json
+import mmap
+import zlib
+import hashlib
+import logging
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from fossology.cache import atomic_write
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+
+def _hashes(chunks) -> Dict:
+    """Compute the hash sums of a stream of bytes"""
+    sha1 = hashlib.sha1()
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    size = 0
+    for chunk in chunks:
+        sha1.update(chunk)
+        md5.update(chunk)
+        sha256.update(chunk)
+        size += len(chunk)
+    return {
+        "sha1": sha1.hexdigest().upper(),
+        "md5": md5.hexdigest().upper(),
+        "sha256": sha256.hexdigest().upper(),
+        "size": size,
+    }
+
+
+def _read_chunks(fp):
+    return iter(lambda: fp.read(HASH_CHUNK_SIZE), b"")
+
+
+def hash_file(path) -> Dict:
+    """Compute the SHA1, MD5 and SHA256 of a file
+
+    Files larger than 4MB are memory-mapped instead of being read chunk by chunk.
+
+    :param path: the path of the file
+    :type path: string or Path
+    :return: the hash sums and the size of the file
+    :rtype: dict
+    """
+    with open(path, "rb") as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            return _hashes(_read_chunks(fp))
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _hashes([mapped])
+
+
+# Errors of a file of an archive which doesn't prevent reading the other files
+ARCHIVE_MEMBER_ERRORS = (
+    OSError,
+    EOFError,
+    RuntimeError,
+    zlib.error,
+    zipfile.BadZipFile,
+    tarfile.TarError,
+)
+
+
+# Maximum size of the tar members sent together to a worker process, larger members
+# are hashed by the process reading the archive
+ARCHIVE_BATCH_SIZE = 16 * 1024 * 1024
+
+
+def _hash_zip_members(path, members: List[zipfile.ZipInfo]) -> Tuple[Dict, Dict]:
+    """Hash some files of a zip archive
+
+    Internal function meant to be called by the processes of hash_archive()
+
+    :return: the hash sums and the errors by path in the archive
+    :rtype: Tuple[dict, dict]
+    """
+    hashes = dict()
+    errors = dict()
+    with zipfile.ZipFile(path) as archive:
+        for member in members:
+            try:
+                with archive.open(member) as fp:
+                    hashes[member.filename] = _hashes(_read_chunks(fp))
+            except ARCHIVE_MEMBER_ERRORS as error:
+                errors[member.filename] = error
+    return hashes, errors
+
+
+def _hash_contents(contents: List[Tuple[str, bytes]]) -> Tuple[Dict, Dict]:
+    """Hash the content of some files read from an archive
+
+    Internal function meant to be called by the processes of hash_archive()
+
+    :return: the hash sums and the (always empty) errors by path in the archive
+    :rtype: Tuple[dict, dict]
+    """
+    return {name: _hashes([content]) for name, content in contents}, dict()
+
+
+def _hash_zip(path, executor, count: int) -> Iterator:
+    """Split the files of a zip archive between the worker processes
+
+    The members of a zip archive are read independently, each process opens the
+    archive and only decompresses its own files.
+
+    :return: the futures of the hashes and errors of each process
+    :rtype: iterator of Future
+    """
+    with zipfile.ZipFile(path) as archive:
+        members = [member for member in archive.infolist() if not member.is_dir()]
+    # Spread the large files between the processes
+    members.sort(key=lambda member: member.file_size, reverse=True)
+    for index in range(count):
+        yield executor.submit(_hash_zip_members, str(path), members[index::count])
+
+
+def _hash_tar(path, executor, count: int, hashes: Dict, failures: Dict) -> Iterator:
+    """Read a tar archive once and send the content of its files to the processes
+
+    A compressed tar archive can only be read sequentially: the files are read by the
+    calling process and hashed by the worker processes in batches of up to
+    ``ARCHIVE_BATCH_SIZE`` bytes. At most two batches per process are pending.
+
+    :return: the futures of the hashes and errors of each batch
+    :rtype: iterator of Future
+    """
+    pending = set()
+    batch = list()
+    batch_size = 0
+    with tarfile.open(path) as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            try:
+                with archive.extractfile(member) as fp:
+                    if member.size > ARCHIVE_BATCH_SIZE:
+                        hashes[member.name] = _hashes(_read_chunks(fp))
+                        continue
+                    content = fp.read()
+            except ARCHIVE_MEMBER_ERRORS as error:
+                failures[member.name] = error
+                continue
+            batch.append((member.name, content))
+            batch_size += len(content)
+            if batch_size < ARCHIVE_BATCH_SIZE:
+                continue
+            if len(pending) >= 2 * count:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from done
+            pending.add(executor.submit(_hash_contents, batch))
+            batch = list()
+            batch_size = 0
+    if batch:
+        pending.add(executor.submit(_hash_contents, batch))
+    yield from pending
+
+
+def _raise_or_record(failures: Dict, errors: Dict, path):
+    """Raise the first error of the files which couldn't be hashed, or record them"""
+    if not failures:
+        return
+    if errors is None:
+        raise next(iter(failures.values()))
+    errors.update(failures)
+    logger.warning("%s files of %s could not be hashed", len(failures), path)
+
+
+def hash_archive(path, workers: int = None, errors: Dict = None) -> Dict[str, Dict]:
+    """Compute the SHA1, MD5 and SHA256 of every file of a tar or zip archive
+
+    The files are hashed by a pool of ``workers`` processes. Each process decompresses
+    its own files of a zip archive, a tar archive is decompressed once and the content
+    of its files is sent to the processes.
+
+    :param path: the path of the archive
+    :param workers: the number of processes (default: the number of CPUs)
+    :param errors: a dictionary filled with the errors by path in the archive (default: None)
+    :type path: string or Path
+    :type workers: int
+    :type errors: dict
+    :return: the hash sums and the size of each file by path in the archive
+    :rtype: dict
+    :raises ValueError: if the file is not a tar or zip archive
+    :raises OSError, zipfile.BadZipFile, tarfile.TarError: if a file of the archive
+        can't be read and no errors dictionary is given
+    """
+    count = workers or os.cpu_count() or 1
+    hashes = dict()
+    failures = dict()
+    with ProcessPoolExecutor(max_workers=count) as executor:
+        if zipfile.is_zipfile(path):
+            futures = _hash_zip(path, executor, count)
+        elif tarfile.is_tarfile(path):
+            futures = _hash_tar(path, executor, count, hashes, failures)
+        else:
+            raise ValueError(f"{path} is not a tar or zip archive")
+        for future in futures:
+            member_hashes, member_errors = future.result()
+            hashes.update(member_hashes)
+            failures.update(member_errors)
+    _raise_or_record(failures, errors, path)
+    return hashes
+
+
+def _scan_directory(path: Path, previous: Dict):
+    """List the files of a directory and find the unchanged ones in the manifest
+
+    :return: the hash sums of the unchanged files, and the relative path, the path
+        and the modification time of the files to be hashed
+    :rtype: Tuple[dict, list]
+    """
+    unchanged = dict()
+    to_hash = list()
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if not os.path.isfile(file_path):
+                continue
+            stat = os.stat(file_path)
+            relative_path = os.path.relpath(file_path, path).replace(os.sep, "/")
+            entry = previous.get(relative_path, {})
+            if (entry.get("mtime"), entry.get("size")) == (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                unchanged[relative_path] = entry
+            else:
+                to_hash.append((relative_path, file_path, stat.st_mtime_ns))
+    return unchanged, to_hash
+
+
+def _hash_files(entries: List[Tuple[str, str, int]]) -> Tuple[Dict, Dict]:
+    """Hash some files of a directory
+
+    Internal function meant to be called by the processes of hash_tree()
+
+    :return: the hash sums and modification time, and the errors by relative path
+    :rtype: Tuple[dict, dict]
+    """
+    hashes = dict()
+    errors = dict()
+    for relative_path, file_path, mtime in entries:
+        try:
+            result = hash_file(file_path)
+        except OSError as error:
+            errors[relative_path] = error
+            continue
+        result["mtime"] = mtime
+        hashes[relative_path] = result
+    return hashes, errors
+
+
+def hash_tree(
+    path, manifest=None, workers: int = None, errors: Dict = None
+) -> Dict[str, Dict]:
+    """Compute the SHA1, MD5 and SHA256 of every file of a directory or an archive
+
+    The files of a directory or an archive are hashed by a pool of ``workers``
+    processes.
+
+    If a ``manifest`` path is given, the hash sums computed during the previous run are
+    read from it and reused for all the files with unchanged modification time and size,
+    the manifest is then updated with the current state of the directory.
+
+    :Example:
+
+    >>> from fossology.hasher import hash_tree, filesearch_list
+    >>> hashes = hash_tree("monorepo/", manifest="monorepo-hashes.json")
+    >>> results = dict(foss.filesearch_bulk(filesearch_list(hashes)))
+
+    :param path: the path of the directory or the archive
+    :param manifest: the path of the manifest of the previous run (default: None)
+    :param workers: the number of processes (default: the number of CPUs)
+    :param errors: a dictionary filled with the errors of the files which can't be
+        read, by relative path (default: None)
+    :type path: string or Path
+    :type manifest: string or Path
+    :type workers: int
+    :type errors: dict
+    :return: the hash sums and the size of each file by relative path
+    :rtype: dict
+    :raises FileNotFoundError: if the path is neither a directory nor a file
+    :raises OSError, zipfile.BadZipFile, tarfile.TarError: if a file can't be read and
+        no errors dictionary is given
+    """
+    path = Path(path)
+    if path.is_file():
+        return hash_archive(path, workers, errors)
+    if not path.is_dir():
+        raise FileNotFoundError(f"{path} is not a directory or an archive")
+
+    previous = dict()
+    if manifest and Path(manifest).is_file():
+        try:
+            previous = json.loads(Path(manifest).read_text())
+        except ValueError:
+            logger.warning(f"Ignoring invalid hash manifest {manifest}")
+
+    hashes, to_hash = _scan_directory(path, previous)
+    logger.debug(
+        "Hashing %s files in %s, %s files are unchanged",
+        len(to_hash),
+        path,
+        len(hashes),
+    )
+    failures = dict()
+    if to_hash:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_hash_files, to_hash[index : index + 64])
+                for index in range(0, len(to_hash), 64)
+            ]
+            for future in futures:
+                file_hashes, file_errors = future.result()
+                hashes.update(file_hashes)
+                failures.update(file_errors)
+    _raise_or_record(failures, errors, path)
+
+    if manifest:
+        atomic_write(Path(manifest), json.dumps(hashes).encode())
+    return hashes
+
+
+def filesearch_list(hashes: Dict[str, Dict]) -> List[Dict]:
+    """Get the file list expected by the filesearch functions
+
+    :param hashes: the hash sums of the files by path, as returned by hash_tree()
+    :type hashes: dict
+    :return: the hash sums of each distinct file
+    :rtype: list of dict
+    """
+    filelist = dict()
+    for file_hashes in hashes.values():
+        filelist[file_hashes["sha1"]] = {
+            "sha1": file_hashes["sha1"],
+            "md5": file_hashes["md5"],
+            "sha256": file_hashes["sha256"],
+        }
+    return list(filelist.values())
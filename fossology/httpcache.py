@@ -0,0 +1,151 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Read endpoints cached by default, with the time their responses are reused without
+# any request. The state of folders, users, uploads and jobs changes, their responses
+# are only reused after a revalidation, if the server sends validators (ETag,
+# Last-Modified). Pass longer TTLs to HttpCache to save the round trips.
+CACHEABLE_ENDPOINTS = {
+    "/folders": 0,
+    "/users": 0,
+    "/uploads/{id}": 0,
+    "/jobs/{id}": 0,
+    "/version": 3600,
+}
+
+# Result of an entry which wasn't decoded yet
+NOT_DECODED = object()
+
+
+class CacheEntry:
+
+    """A response stored in the HTTP cache and the result built from it"""
+
+    __slots__ = ("response", "result", "etag", "last_modified", "expires")
+
+    def __init__(self, response, ttl: float):
+        self.response = response
+        self.result = NOT_DECODED
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.expires = time.monotonic() + ttl
+
+    def validators(self) -> Dict[str, str]:
+        """Get the headers of a conditional request revalidating the entry
+
+        :rtype: dict
+        """
+        headers = dict()
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+
+    """Cache of the responses of read endpoints
+
+    The responses to GET requests sent to the cached ``endpoints`` are stored by URL and
+    request headers, and reused without any request during the TTL of the endpoint.
+    Once the TTL is over, if the server sent an ETag or a Last-Modified header, the next
+    request is conditional and a "304 Not Modified" answer returns the stored response.
+
+    Only ``/version`` is reused without any request by default (TTL of one hour), the
+    other endpoints have a TTL of 0: without validators sent by the server their
+    responses aren't stored. Give the TTLs suited to the application, e.g. the time a
+    folder list may be outdated, to save the round trips.
+
+    The result built from a stored response (e.g. the Upload of detail_upload()) is
+    kept with it: fresh hits and "304 Not Modified" answers skip the JSON decoding
+    and the construction of the objects. These objects are shared by all the callers
+    and must be treated as read-only, only the lists returned are new for each call.
+
+    :Example:
+
+    >>> from fossology.httpcache import HttpCache
+    >>> cache = HttpCache(endpoints={"/folders": 30, "/uploads/{id}": 0})
+    >>> foss = Fossology(FOSS_URL, FOSS_TOKEN, username, http_cache=cache)
+    >>> print(cache.stats)
+
+    :param endpoints: the TTL in seconds by endpoint (default: CACHEABLE_ENDPOINTS)
+    :param max_entries: the maximum number of responses stored (default: 1024)
+    :type endpoints: dict
+    :type max_entries: int
+    """
+
+    def __init__(self, endpoints: Dict[str, float] = None, max_entries: int = 1024):
+        self.endpoints = dict(CACHEABLE_ENDPOINTS if endpoints is None else endpoints)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    @staticmethod
+    def key(url: str, kwargs: Dict) -> tuple:
+        """Get the key of a request: its URL, headers and query parameters"""
+        return (
+            url,
+            tuple(sorted(kwargs.get("headers", {}).items())),
+            tuple(sorted((kwargs.get("params") or {}).items())),
+        )
+
+    def get(self, key: tuple) -> CacheEntry:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def store(self, key: tuple, endpoint: str, response) -> CacheEntry:
+        ttl = self.endpoints[endpoint]
+        entry = CacheEntry(response, ttl)
+        if ttl <= 0 and not entry.validators():
+            # The response can't be reused
+            return None
+        response.cache_entry = entry
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def decode(response, build):
+        """Get the result of a response, built once for a stored response
+
+        :param response: the response of the server - or a stored response
+        :param build: the function building the result from the response
+        :type response: requests.Response
+        :type build: function taking a response
+        :return: the result of build(), shared with the other callers
+        """
+        entry = getattr(response, "cache_entry", None)
+        if entry is None:
+            return build(response)
+        result = entry.result
+        if result is NOT_DECODED:
+            result = entry.result = build(response)
+        if isinstance(result, list):
+            return list(result)
+        return result
+
+    def count(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def clear(self):
+        """Remove all stored responses"""
+        with self.lock:
+            self.entries.clear()
@@ -1,12 +1,11 @@
 # Copyright 2019-2021 Siemens AG
 # SPDX-License-Identifier: MIT
 
-import json
-import time
 import logging
 
 from fossology.obj import Job, get_options
 from fossology.exceptions import AuthorizationError, FossologyApiError
+from fossology.transport import operation
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -15,6 +14,7 @@ logger.setLevel(logging.DEBUG)
 class Jobs:
     """Class dedicated to all "jobs" related endpoints"""
 
+    @operation
     def list_jobs(self, page_size=20, page=1, upload=None):
         """Get all available jobs
 
@@ -36,16 +36,17 @@ class Jobs:
         headers = {"limit": str(page_size), "page": str(page)}
         if upload:
             params["upload"] = upload.id
-        response = self.session.get(f"{self.api}/jobs", params=params, headers=headers)
+        response = self._request("GET", "/jobs", params=params, headers=headers)
         if response.status_code == 200:
             jobs_list = list()
-            for job in response.json():
+            for job in self._json(response):
                 jobs_list.append(Job.from_json(job))
             return jobs_list
         else:
             description = "Getting the list of jobs failed"
             raise FossologyApiError(description, response)
 
+    @operation
     def detail_job(self, job_id, wait=False, timeout=30):
         """Get detailled information about a job
 
@@ -61,27 +62,28 @@ class Jobs:
         :rtype: Job
         :raises FossologyApiError: if the REST call failed
         """
-        response = self.session.get(f"{self.api}/jobs/{job_id}")
+        response = self._request("GET", "/jobs/{id}", job_id)
         if wait:
             if response.status_code == 200:
-                job = Job.from_json(response.json())
+                job = self._decode(response, lambda r: Job.from_json(self._json(r)))
                 if job.status == "Completed":
-                    logger.debug(f"Job {job_id} has completed")
+                    logger.debug("Job %s has completed", job_id)
                     return job
             else:
                 description = f"Error while getting details for job {job_id}"
                 raise FossologyApiError(description, response)
-            logger.debug(f"Waiting for job {job_id} to complete")
-            time.sleep(timeout)
-            response = self.session.get(f"{self.api}/jobs/{job_id}")
+            logger.debug("Waiting for job %s to complete", job_id)
+            self._wait(timeout)
+            response = self._request("GET", "/jobs/{id}", job_id)
 
         if response.status_code == 200:
-            logger.debug(f"Got details for job {job_id}")
-            return Job.from_json(response.json())
+            logger.debug("Got details for job %s", job_id)
+            return self._decode(response, lambda r: Job.from_json(self._json(r)))
         else:
             description = f"Error while getting details for job {job_id}"
             raise FossologyApiError(description, response)
 
+    @operation
     def schedule_jobs(self, folder, upload, spec, group=None, wait=False, timeout=30):
         """Schedule jobs for a specific upload
 
@@ -143,13 +145,13 @@ class Jobs:
         if group:
             headers["groupName"] = group
 
-        response = self.session.post(
-            f"{self.api}/jobs", headers=headers, data=json.dumps(spec)
+        response = self._request(
+            "POST", "/jobs", headers=headers, data=self.codec.dumps(spec)
         )
 
         if response.status_code == 201:
             detailled_job = self.detail_job(
-                response.json()["message"], wait=wait, timeout=timeout
+                self._json(response)["message"], wait=wait, timeout=timeout
             )
             return detailled_job
 
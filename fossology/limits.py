@@ -0,0 +1,298 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Tuple
+
+from fossology.transport import get_retry_after
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Endpoints answering "503 Service Unavailable" while a single resource isn't ready
+# yet (an upload being unpacked, a report being generated), not because the server is
+# overloaded
+READINESS_ENDPOINTS = (
+    "GET /uploads/{id}",
+    "GET /uploads/{id}/summary",
+    "GET /uploads/{id}/licenses",
+    "GET /report",
+    "GET /report/{id}",
+)
+
+
+class RateLimiter:
+
+    """Token bucket limiting the rate of requests sent to the server
+
+    A rate limiter can be shared by several threads and several calls, each request
+    consumes one token. Tokens are refilled at ``rate`` tokens per second, up to
+    ``burst`` tokens.
+
+    :Example:
+
+    >>> from fossology.limits import RateLimiter
+    >>> limiter = RateLimiter(rate=20, burst=5)
+    >>> results = foss.search_uploads(uploads, filename="%openssl%", rate_limiter=limiter)
+
+    :param rate: the number of requests allowed per second
+    :param burst: the maximum number of requests sent at once (default: 1)
+    :type rate: float
+    :type burst: int
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, wait: Callable[[float], None] = time.sleep) -> float:
+        """Wait until a request may be sent
+
+        :param wait: the function waiting, e.g. the client's wait recording the time in
+            its metrics (default: time.sleep)
+        :type wait: function taking the time to wait in seconds
+        :return: the time waited in seconds
+        :rtype: float
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # Reserve the token now, the bucket may become negative
+            self.tokens -= 1
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait_time:
+            wait(wait_time)
+        return wait_time
+
+
+def endpoint_family(endpoint: str) -> str:
+    """Get the family of an endpoint, e.g. "uploads" for "GET /uploads/{id}/licenses"
+
+    :rtype: string
+    """
+    path = endpoint.split(" ", 1)[-1]
+    return path.strip("/").split("/", 1)[0]
+
+
+class AdaptiveConcurrency:
+
+    """Limit the number of requests in flight and adapt the limit to the server load
+
+    The limit grows additively, by one request per ``limit`` successful requests sent
+    while the limit was reached (a limit which isn't used doesn't grow), and shrinks
+    multiplicatively by ``backoff`` when the server is overloaded: it answered
+    with an overload status, or the ``percentile`` of the latencies of the last
+    ``window`` requests exceeds ``latency_target``. The limit is decreased at most once
+    per ``limit`` completed requests, so that a burst of overload responses to requests
+    sent with the previous limit doesn't collapse it.
+
+    :param initial: the initial number of requests in flight (default: 4)
+    :param minimum: the minimum number of requests in flight (default: 1)
+    :param maximum: the maximum number of requests in flight (default: 32)
+    :param backoff: the factor applied to the limit when overloaded (default: 0.5)
+    :param latency_target: the maximum latency in seconds (default: None, no target)
+    :param percentile: the percentile of the latencies compared to the target (default: 0.9)
+    :param window: the number of latencies considered (default: 50)
+    :type initial: int
+    :type minimum: int
+    :type maximum: int
+    :type backoff: float
+    :type latency_target: float
+    :type percentile: float
+    :type window: int
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 32,
+        backoff: float = 0.5,
+        latency_target: float = None,
+        percentile: float = 0.9,
+        window: int = 50,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.percentile = percentile
+        self.latencies = deque(maxlen=window)
+        self.in_flight = 0
+        self.since_decrease = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Wait until a request may be sent"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, overloaded: bool = False):
+        """Record the end of a request and adapt the limit
+
+        :param latency: the latency of the request in seconds
+        :param overloaded: the server answered with an overload status
+        :type latency: float
+        :type overloaded: bool
+        """
+        with self.condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.since_decrease += 1
+            self.latencies.append(latency)
+            if overloaded or self._too_slow():
+                if self.since_decrease >= int(self.limit):
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self.since_decrease = 0
+                    logger.debug("Concurrency limit decreased to %d", self.limit)
+            elif saturated:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def _too_slow(self) -> bool:
+        if self.latency_target is None or len(self.latencies) < self.latencies.maxlen:
+            return False
+        latencies = sorted(self.latencies)
+        return latencies[int(self.percentile * (len(latencies) - 1))] > (
+            self.latency_target
+        )
+
+
+class ClientLimiter:
+
+    """Limits shared by all the requests of one or several clients
+
+    Each endpoint family ("uploads", "search", "report", ...) has its own token bucket,
+    the family "*" applies to the families without bucket. The number of requests in
+    flight is limited by an optional :class:`AdaptiveConcurrency`.
+
+    When the server answers with an overload status and a ``Retry-After`` header, all
+    the requests of the endpoint family are held for the Retry-After interval, not only
+    the request retried by the thread which received the answer.
+
+    "503 Service Unavailable" is also the answer of the ``readiness_endpoints`` while
+    the requested resource isn't ready yet: like for the
+    :class:`~fossology.transport.CircuitBreaker`, these answers must not hold the
+    requests for the other resources, they are not counted as an overload.
+
+    :Example:
+
+    >>> from fossology.limits import AdaptiveConcurrency, ClientLimiter
+    >>> limiter = ClientLimiter(
+            rates={"search": 10, "*": 50},
+            concurrency=AdaptiveConcurrency(initial=8, latency_target=2.0),
+        )
+    >>> foss = Fossology(FOSS_URL, FOSS_TOKEN, username, limiter=limiter)
+
+    :param rates: the number of requests per second by endpoint family (default: None)
+    :param burst: the maximum number of requests sent at once per family (default: 1)
+    :param concurrency: the adaptive concurrency limit (default: None)
+    :param overload_statuses: the status codes sent by an overloaded server (default: 429, 503)
+    :param readiness_endpoints: the endpoints whose 503 answers mean that a resource
+        isn't ready yet (default: READINESS_ENDPOINTS)
+    :type rates: dict
+    :type burst: int
+    :type concurrency: AdaptiveConcurrency
+    :type overload_statuses: tuple of int
+    :type readiness_endpoints: tuple of string
+    """
+
+    def __init__(
+        self,
+        rates: Dict[str, float] = None,
+        burst: int = 1,
+        concurrency: AdaptiveConcurrency = None,
+        overload_statuses: Tuple[int, ...] = (429, 503),
+        readiness_endpoints: Tuple[str, ...] = READINESS_ENDPOINTS,
+    ):
+        self.buckets = {
+            family: RateLimiter(rate, burst) for family, rate in (rates or {}).items()
+        }
+        self.concurrency = concurrency
+        self.overload_statuses = overload_statuses
+        self.readiness_endpoints = readiness_endpoints
+        self.paused = dict()
+        self.lock = threading.Lock()
+
+    def pause(self, family: str, seconds: float):
+        """Hold the requests of an endpoint family for some time
+
+        :param family: the endpoint family, e.g. "uploads"
+        :param seconds: the time to hold the requests in seconds
+        :type family: string
+        :type seconds: float
+        """
+        with self.lock:
+            until = time.monotonic() + seconds
+            if until > self.paused.get(family, 0):
+                self.paused[family] = until
+
+    def acquire(
+        self, endpoint: str, wait: Callable[[float], None] = time.sleep
+    ) -> float:
+        """Wait until a request to an endpoint may be sent
+
+        :param endpoint: the endpoint, e.g. "GET /uploads/{id}"
+        :param wait: the function waiting for a token (default: time.sleep)
+        :type endpoint: string
+        :type wait: function taking the time to wait in seconds
+        :return: the time waited for the end of a pause and for a token in seconds
+        :rtype: float
+        """
+        family = endpoint_family(endpoint)
+        wait_time = 0.0
+        paused = self.paused.get(family, 0) - time.monotonic()
+        if paused > 0:
+            wait(paused)
+            wait_time += paused
+        bucket = self.buckets.get(family, self.buckets.get("*"))
+        if bucket:
+            wait_time += bucket.acquire(wait)
+        if self.concurrency:
+            self.concurrency.acquire()
+        return wait_time
+
+    def release(self, endpoint: str, latency: float, response=None):
+        """Record the end of a request to an endpoint
+
+        :param endpoint: the endpoint, e.g. "GET /uploads/{id}"
+        :param latency: the latency of the request in seconds
+        :param response: the response of the server - or None if it couldn't be reached
+        :type endpoint: string
+        :type latency: float
+        :type response: requests.Response
+        """
+        overloaded = self.overloaded(endpoint, response)
+        if overloaded and response is not None:
+            retry_after = get_retry_after(response)
+            if retry_after is not None:
+                self.pause(endpoint_family(endpoint), retry_after)
+        if self.concurrency:
+            self.concurrency.release(latency, overloaded)
+
+    def overloaded(self, endpoint: str, response=None) -> bool:
+        """Check if the answer to a request means that the server is overloaded
+
+        :param endpoint: the endpoint, e.g. "GET /uploads/{id}"
+        :param response: the response of the server - or None if it couldn't be reached
+        :type endpoint: string
+        :type response: requests.Response
+        :rtype: bool
+        """
+        if response is None:
+            return True
+        if response.status_code == 503 and endpoint in self.readiness_endpoints:
+            return False
+        return response.status_code in self.overload_statuses
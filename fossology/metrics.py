@@ -0,0 +1,263 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import logging
+import threading
+from bisect import bisect_left
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class EndpointMetrics:
+
+    """Counters of the requests sent to one endpoint"""
+
+    __slots__ = (
+        "requests",
+        "errors",
+        "statuses",
+        "bytes_in",
+        "bytes_out",
+        "latency_sum",
+        "latency_buckets",
+        "retries",
+        "sleeps",
+        "sleep_seconds",
+        "decodes",
+        "decode_seconds",
+    )
+
+    def __init__(self, buckets: int):
+        self.requests = 0
+        self.errors = 0
+        self.statuses = dict()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (buckets + 1)
+        self.retries = 0
+        self.sleeps = 0
+        self.sleep_seconds = 0.0
+        self.decodes = 0
+        self.decode_seconds = 0.0
+
+
+def _request_size(response) -> int:
+    request = getattr(response, "request", None)
+    body = getattr(request, "body", None)
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0
+
+
+def _response_size(response, stream: bool) -> int:
+    if not stream:
+        return len(response.content)
+    return int(response.headers.get("Content-Length", 0))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class Metrics:
+
+    """Per-endpoint metrics of the requests sent by one or several clients
+
+    For each endpoint, e.g. "GET /uploads/{id}", the number of requests, the status
+    codes, the bytes sent and received, a latency histogram, the number of retries, the
+    time spent waiting (Retry-After, polling, rate limits) and the time spent building
+    the results from the responses (JSON decoding and ``from_json``) are recorded.
+    Waits and decoding are attributed to the last endpoint requested by the same
+    thread.
+
+    Metrics are only recorded if they are given to the client, the overhead of a client
+    without metrics is a single attribute check per request.
+
+    :Example:
+
+    >>> from fossology.metrics import Metrics
+    >>> metrics = Metrics()
+    >>> foss = Fossology(FOSS_URL, FOSS_TOKEN, username, metrics=metrics)
+    >>> snapshot = metrics.snapshot()
+    >>> print(metrics.prometheus())
+
+    :param buckets: the upper bounds of the latency histogram buckets in seconds
+    :type buckets: tuple of float
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.endpoints = dict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _endpoint(self, endpoint: str) -> EndpointMetrics:
+        metrics = self.endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self.endpoints[endpoint] = EndpointMetrics(len(self.buckets))
+        return metrics
+
+    def record(self, endpoint: str, latency: float, response=None, stream=False):
+        """Record a request
+
+        :param endpoint: the endpoint, e.g. "GET /uploads/{id}"
+        :param latency: the latency of the request in seconds
+        :param response: the response of the server - or None if it couldn't be reached
+        :param stream: the content of the response is streamed (default: False)
+        :type endpoint: string
+        :type latency: float
+        :type response: requests.Response
+        :type stream: bool
+        """
+        self.local.endpoint = endpoint
+        bytes_out = bytes_in = 0
+        if response is not None:
+            bytes_out = _request_size(response)
+            bytes_in = _response_size(response, stream)
+        bucket = bisect_left(self.buckets, latency)
+        with self.lock:
+            metrics = self._endpoint(endpoint)
+            metrics.requests += 1
+            metrics.latency_sum += latency
+            metrics.latency_buckets[bucket] += 1
+            if response is None:
+                metrics.errors += 1
+                return
+            status = response.status_code
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.bytes_in += bytes_in
+            metrics.bytes_out += bytes_out
+
+    def record_retry(self, endpoint: str):
+        """Record the retry of a request
+
+        :param endpoint: the endpoint, e.g. "GET /uploads/{id}"
+        :type endpoint: string
+        """
+        with self.lock:
+            self._endpoint(endpoint).retries += 1
+
+    def record_sleep(self, seconds: float, endpoint: str = None):
+        """Record a wait
+
+        :param seconds: the time waited in seconds
+        :param endpoint: the endpoint (default: the last endpoint requested by the thread)
+        :type seconds: float
+        :type endpoint: string
+        """
+        endpoint = endpoint or getattr(self.local, "endpoint", "none")
+        with self.lock:
+            metrics = self._endpoint(endpoint)
+            metrics.sleeps += 1
+            metrics.sleep_seconds += seconds
+
+    def record_decode(self, seconds: float, endpoint: str = None):
+        """Record the time spent building the result of a response
+
+        :param seconds: the time spent in seconds
+        :param endpoint: the endpoint (default: the last endpoint requested by the thread)
+        :type seconds: float
+        :type endpoint: string
+        """
+        endpoint = endpoint or getattr(self.local, "endpoint", "none")
+        with self.lock:
+            metrics = self._endpoint(endpoint)
+            metrics.decodes += 1
+            metrics.decode_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Get the current value of the metrics
+
+        :return: the metrics by endpoint, the latency buckets are cumulative and keyed
+            by upper bound, as in Prometheus
+        :rtype: dict
+        """
+        snapshot = dict()
+        with self.lock:
+            for endpoint, metrics in self.endpoints.items():
+                cumulative = 0
+                buckets = dict()
+                for bound, count in zip(
+                    self.buckets + (float("inf"),), metrics.latency_buckets
+                ):
+                    cumulative += count
+                    buckets[bound] = cumulative
+                snapshot[endpoint] = {
+                    "requests": metrics.requests,
+                    "errors": metrics.errors,
+                    "statuses": dict(metrics.statuses),
+                    "bytes_in": metrics.bytes_in,
+                    "bytes_out": metrics.bytes_out,
+                    "latency": {
+                        "count": metrics.requests,
+                        "sum": metrics.latency_sum,
+                        "buckets": buckets,
+                    },
+                    "retries": metrics.retries,
+                    "sleeps": metrics.sleeps,
+                    "sleep_seconds": metrics.sleep_seconds,
+                    "decodes": metrics.decodes,
+                    "decode_seconds": metrics.decode_seconds,
+                }
+        return snapshot
+
+    def prometheus(self, prefix: str = "fossology") -> str:
+        """Export the metrics in the Prometheus text format
+
+        :param prefix: the prefix of the metric names (default: "fossology")
+        :type prefix: string
+        :rtype: string
+        """
+        families = {
+            "requests_total": ("counter", "Requests sent by endpoint and status"),
+            "request_errors_total": ("counter", "Requests without response"),
+            "bytes_total": ("counter", "Bytes sent (out) and received (in)"),
+            "request_duration_seconds": ("histogram", "Latency of the requests"),
+            "retries_total": ("counter", "Retried requests"),
+            "sleep_seconds_total": ("counter", "Time spent waiting"),
+            "decode_seconds_total": ("counter", "Time spent building the results"),
+        }
+        samples = {name: list() for name in families}
+        for endpoint, metrics in self.snapshot().items():
+            label = f'endpoint="{_escape(endpoint)}"'
+            for status, count in sorted(metrics["statuses"].items()):
+                samples["requests_total"].append(
+                    f'{{{label},status="{status}"}} {count}'
+                )
+            samples["request_errors_total"].append(f"{{{label}}} {metrics['errors']}")
+            for direction in ("in", "out"):
+                samples["bytes_total"].append(
+                    f'{{{label},direction="{direction}"}} '
+                    f"{metrics[f'bytes_{direction}']}"
+                )
+            latency = metrics["latency"]
+            for bound, count in latency["buckets"].items():
+                le = "+Inf" if bound == float("inf") else bound
+                samples["request_duration_seconds"].append(
+                    f'_bucket{{{label},le="{le}"}} {count}'
+                )
+            samples["request_duration_seconds"].append(
+                f"_sum{{{label}}} {latency['sum']}"
+            )
+            samples["request_duration_seconds"].append(
+                f"_count{{{label}}} {latency['count']}"
+            )
+            samples["retries_total"].append(f"{{{label}}} {metrics['retries']}")
+            samples["sleep_seconds_total"].append(
+                f"{{{label}}} {metrics['sleep_seconds']}"
+            )
+            samples["decode_seconds_total"].append(
+                f"{{{label}}} {metrics['decode_seconds']}"
+            )
+
+        lines = list()
+        for name, (metric_type, description) in families.items():
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            lines.extend(f"{prefix}_{name}{sample}" for sample in samples[name])
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,177 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import json
+import logging
+from pathlib import Path, PurePosixPath
+from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+
+from fossology.obj import AccessLevel, Folder
+from fossology.cache import atomic_write
+from fossology.hasher import hash_tree
+from fossology.exceptions import AuthorizationError, FossologyApiError
+from fossology.transport import operation
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+def _read_manifest(manifest: Path) -> Dict:
+    if not manifest.is_file():
+        return dict()
+    try:
+        return json.loads(manifest.read_text())
+    except ValueError:
+        logger.warning(f"Ignoring invalid mirror manifest {manifest}")
+        return dict()
+
+
+def _resolve_folders(
+    foss, folder: Folder, paths, group: str = None, errors: Dict = None
+) -> Dict:
+    # Folders are resolved one after the other, each missing folder is created once.
+    # The files of a folder which can't be resolved are recorded in the errors.
+    folders = {".": folder}
+    targets = dict()
+    for relative_path in paths:
+        directory = str(PurePosixPath(relative_path).parent)
+        if directory not in folders:
+            try:
+                resolved = foss.resolve_folder(directory, parent=folder, group=group)
+            except (AuthorizationError, FossologyApiError) as error:
+                resolved = error
+            if resolved is None:
+                resolved = FossologyApiError(
+                    f"Folder {directory} could not be resolved in folder {folder.name}"
+                )
+            folders[directory] = resolved
+        target = folders[directory]
+        if not isinstance(target, Exception):
+            targets[relative_path] = target
+        elif errors is None:
+            raise target
+        else:
+            errors[relative_path] = target
+    return targets
+
+
+@operation
+def mirror_directory(
+    foss,
+    path,
+    manifest,
+    folder: Folder = None,
+    description: str = None,
+    access_level: AccessLevel = None,
+    group: str = None,
+    workers: int = 4,
+    errors: Dict = None,
+    hash_manifest=None,
+) -> Dict:
+    """Mirror a local directory into Fossology folders and uploads
+
+    Each subdirectory is mapped to a Fossology folder with the same path, created if
+    needed, and each file is uploaded to the folder of its directory.
+
+    The ``manifest`` records the hash sums and the upload id of every file mirrored
+    during the previous runs. Only the files which are new or whose content changed
+    are uploaded again, the uploads are performed by a pool of ``workers`` threads.
+    Uploads of files removed from the directory are not deleted.
+
+    The hash sums of the files are computed by :func:`~fossology.hasher.hash_tree`,
+    which keeps its own manifest ``hash_manifest`` to skip hashing unchanged files.
+    The missing folders are created once and added to the folder index, the folder
+    list isn't received again for each directory.
+
+    :Example:
+
+    >>> from fossology.mirror import mirror_directory
+    >>> result = mirror_directory(
+            foss, "releases/", "releases-mirror.json", folder=releases_folder
+        )
+    >>> print(len(result["uploaded"]), len(result["unchanged"]))
+
+    :param foss: the Fossology client
+    :param path: the path of the local directory
+    :param manifest: the path of the manifest file, created if it doesn't exist
+    :param folder: the folder mapped to the directory (default: the root folder)
+    :param description: the description of the new uploads (default: None)
+    :param access_level: the access permissions of the new uploads (default: protected)
+    :param group: the group name to chose while uploading the files (default: None)
+    :param workers: the number of parallel uploads (default: 4)
+    :param errors: a dictionary filled with the errors by file path (default: None)
+    :param hash_manifest: the path of the hash manifest (default: the manifest path
+        with a "-hashes" suffix, e.g. "releases-mirror-hashes.json")
+    :type foss: Fossology
+    :type path: string or Path
+    :type manifest: string or Path
+    :type folder: Folder
+    :type description: string
+    :type access_level: AccessLevel
+    :type group: string
+    :type workers: int
+    :type errors: dict
+    :type hash_manifest: string or Path
+    :return: the new uploads by file path ("uploaded") and the paths of the files
+        skipped because they didn't change ("unchanged")
+    :rtype: dict
+    :raises FossologyApiError: if a REST call failed or a folder couldn't be resolved
+        and no errors dictionary is given
+    :raises AuthorizationError: if the user can't access the group or folder and no errors dictionary is given
+    """
+    path = Path(path)
+    manifest = Path(manifest)
+    if hash_manifest is None:
+        hash_manifest = manifest.with_name(f"{manifest.stem}-hashes{manifest.suffix}")
+    folder = folder or foss.rootFolder
+    previous = _read_manifest(manifest)
+    hashes = hash_tree(path, manifest=hash_manifest)
+
+    entries = dict()
+    to_upload = list()
+    for relative_path, file_hashes in sorted(hashes.items()):
+        entry = previous.get(relative_path, {})
+        if entry.get("upload") and entry.get("sha1") == file_hashes["sha1"]:
+            file_hashes["upload"] = entry["upload"]
+            entries[relative_path] = file_hashes
+        else:
+            to_upload.append(relative_path)
+
+    targets = _resolve_folders(foss, folder, to_upload, group, errors)
+
+    uploaded = dict()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            relative_path: foss._submit(
+                executor,
+                foss.upload_file,
+                target,
+                file=str(path / relative_path),
+                description=description,
+                access_level=access_level,
+                group=group,
+            )
+            for relative_path, target in targets.items()
+        }
+        try:
+            for relative_path, future in futures.items():
+                try:
+                    upload = future.result()
+                except (AuthorizationError, FossologyApiError) as error:
+                    if errors is None:
+                        raise
+                    errors[relative_path] = error
+                    continue
+                hashes[relative_path]["upload"] = upload.id
+                entries[relative_path] = hashes[relative_path]
+                uploaded[relative_path] = upload
+        finally:
+            # Record the uploads performed so far, even if one of them failed
+            atomic_write(manifest, json.dumps(entries).encode())
+
+    unchanged = [p for p in entries if p not in uploaded]
+    logger.info(
+        f"Mirrored {path}: {len(uploaded)} files uploaded, {len(unchanged)} unchanged"
+    )
+    return {"uploaded": uploaded, "unchanged": unchanged}
@@ -1,6 +1,7 @@
 # Copyright 2019-2021 Siemens AG
 # SPDX-License-Identifier: MIT
 
+import sys
 import json
 from enum import Enum
 
@@ -60,6 +61,41 @@ class ClearingStatus(Enum):
     REJECTED = "Rejected"
 
 
+def _intern(value):
+    """Intern a string repeated across many objects, e.g. a license or folder name"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def _intern_all(values):
+    if isinstance(values, list):
+        return [_intern(value) for value in values]
+    return values
+
+
+class _Model(object):
+
+    """Base class of the memory-lean objects built from the responses
+
+    The attributes are stored in slots instead of a dictionary per object, the
+    dictionary of additional information is only created if the server sent any or
+    if it is accessed.
+    """
+
+    __slots__ = ("_additional_info",)
+
+    @property
+    def additional_info(self) -> dict:
+        if self._additional_info is None:
+            self._additional_info = dict()
+        return self._additional_info
+
+    @additional_info.setter
+    def additional_info(self, additional_info: dict):
+        self._additional_info = additional_info or None
+
+
 class Agents(object):
 
     """FOSSology agents.
@@ -88,6 +124,19 @@ class Agents(object):
     :type kwargs: key word argument
     """
 
+    __slots__ = (
+        "bucket",
+        "copyright_email_author",
+        "ecc",
+        "keyword",
+        "mimetype",
+        "monk",
+        "nomos",
+        "ojo",
+        "package",
+        "additional_agents",
+    )
+
     def __init__(
         self,
         bucket,
@@ -149,7 +198,7 @@ class Agents(object):
         return json.dumps(self.to_dict())
 
 
-class User(object):
+class User(_Model):
 
     """FOSSology user.
 
@@ -175,6 +224,17 @@ class User(object):
     :type kwargs: key word argument
     """
 
+    __slots__ = (
+        "id",
+        "name",
+        "description",
+        "email",
+        "accessLevel",
+        "rootFolderId",
+        "emailNotification",
+        "agents",
+    )
+
     def __init__(
         self,
         id,
@@ -191,7 +251,7 @@ class User(object):
         self.name = name
         self.description = description
         self.email = email
-        self.accessLevel = accessLevel
+        self.accessLevel = _intern(accessLevel)
         self.rootFolderId = rootFolderId
         self.emailNotification = emailNotification
         self.agents = agents
@@ -209,7 +269,7 @@ class User(object):
         return cls(**json_dict)
 
 
-class Folder(object):
+class Folder(_Model):
 
     """FOSSology folder.
 
@@ -227,9 +287,11 @@ class Folder(object):
     :type kwargs: key word argument
     """
 
+    __slots__ = ("id", "name", "description", "parent")
+
     def __init__(self, id, name, description, parent, **kwargs):
         self.id = id
-        self.name = name
+        self.name = _intern(name)
         self.description = description
         self.parent = parent
         self.additional_info = kwargs
@@ -245,7 +307,7 @@ class Folder(object):
         return cls(**json_dict)
 
 
-class Findings(object):
+class Findings(_Model):
 
     """FOSSology license findings.
 
@@ -259,11 +321,13 @@ class Findings(object):
     :type kwargs: key word argument
     """
 
+    __slots__ = ("scanner", "conclusion")
+
     def __init__(
         self, scanner, conclusion, **kwargs,
     ):
-        self.scanner = scanner
-        self.conclusion = conclusion
+        self.scanner = _intern_all(scanner)
+        self.conclusion = _intern_all(conclusion)
         self.additional_info = kwargs
 
     def __str__(self):
@@ -274,7 +338,7 @@ class Findings(object):
         return cls(**json_dict)
 
 
-class Licenses(object):
+class Licenses(_Model):
 
     """FOSSology file license findings.
 
@@ -286,15 +350,31 @@ class Licenses(object):
     :type filePath: string
     :type findings: Findings
     :type kwargs: key word argument
+
+    .. note::
+
+        The findings are converted to a Findings object when they're first accessed
     """
 
+    __slots__ = ("filepath", "_findings")
+
     def __init__(
         self, filePath, findings, **kwargs,
     ):
         self.filepath = filePath
-        self.findings = Findings.from_json(findings)
+        self._findings = findings
         self.additional_info = kwargs
 
+    @property
+    def findings(self) -> Findings:
+        if isinstance(self._findings, dict):
+            self._findings = Findings.from_json(self._findings)
+        return self._findings
+
+    @findings.setter
+    def findings(self, findings: Findings):
+        self._findings = findings
+
     def __str__(self):
         if self.findings.conclusion:
             return f"File {self.filepath} has {len(self.findings.conclusion)} concluded licenses"
@@ -306,7 +386,7 @@ class Licenses(object):
         return cls(**json_dict)
 
 
-class Hash(object):
+class Hash(_Model):
 
     """FOSSology hash.
 
@@ -324,6 +404,8 @@ class Hash(object):
     :type kwargs: key word argument
     """
 
+    __slots__ = ("sha1", "md5", "sha256", "size")
+
     def __init__(
         self, sha1, md5, sha256, size, **kwargs,
     ):
@@ -341,7 +423,7 @@ class Hash(object):
         return cls(**json_dict)
 
 
-class File(object):
+class File(_Model):
 
     """FOSSology file response from filesearch.
 
@@ -353,15 +435,42 @@ class File(object):
     :type hash: Hash
     :type findings: Findings
     :type kwargs: key word argument
+
+    .. note::
+
+        The hash and the findings are converted to Hash and Findings objects when
+        they're first accessed
     """
 
+    __slots__ = ("_hash", "_findings")
+
     def __init__(
         self, hash, findings, **kwargs,
     ):
-        self.hash = Hash.from_json(hash)
-        self.findings = Findings.from_json(findings)
+        self._hash = hash
+        self._findings = findings
         self.additional_info = kwargs
 
+    @property
+    def hash(self) -> Hash:
+        if isinstance(self._hash, dict):
+            self._hash = Hash.from_json(self._hash)
+        return self._hash
+
+    @hash.setter
+    def hash(self, hash: Hash):
+        self._hash = hash
+
+    @property
+    def findings(self) -> Findings:
+        if isinstance(self._findings, dict):
+            self._findings = Findings.from_json(self._findings)
+        return self._findings
+
+    @findings.setter
+    def findings(self, findings: Findings):
+        self._findings = findings
+
     def __str__(self):
         if self.findings.conclusion:
             return f"File with SHA1 {self.hash.sha1} has {len(self.findings.conclusion)} concluded licenses"
@@ -373,7 +482,7 @@ class File(object):
         return cls(**json_dict)
 
 
-class Upload(object):
+class Upload(_Model):
 
     """FOSSology upload.
 
@@ -395,8 +504,22 @@ class Upload(object):
     :type uploaddate: string
     :type hash: Hash
     :type kwargs: key word argument
+
+    .. note::
+
+        The hash data is converted to a Hash object when it's first accessed
     """
 
+    __slots__ = (
+        "folderid",
+        "foldername",
+        "id",
+        "description",
+        "uploadname",
+        "uploaddate",
+        "_hash",
+    )
+
     def __init__(
         self,
         folderid,
@@ -409,14 +532,24 @@ class Upload(object):
         **kwargs,
     ):
         self.folderid = folderid
-        self.foldername = foldername
+        self.foldername = _intern(foldername)
         self.id = id
         self.description = description
         self.uploadname = uploadname
         self.uploaddate = uploaddate
-        self.hash = Hash.from_json(hash)
+        self._hash = hash
         self.additional_info = kwargs
 
+    @property
+    def hash(self) -> Hash:
+        if isinstance(self._hash, dict):
+            self._hash = Hash.from_json(self._hash)
+        return self._hash
+
+    @hash.setter
+    def hash(self, hash: Hash):
+        self._hash = hash
+
     def __str__(self):
         return (
             f"Upload '{self.uploadname}' ({self.id}, {self.hash.size}B, {self.hash.sha1}) "
@@ -428,7 +561,56 @@ class Upload(object):
         return cls(**json_dict)
 
 
-class Summary(object):
+class SearchResult(_Model):
+
+    """FOSSology search result.
+
+    Represents a file found by the FOSSology search.
+
+    :param upload: the upload the file belongs to
+    :param uploadTreeId: the ID of the file in the upload tree
+    :param filename: the name of the file
+    :param kwargs: handle any other search result information provided by the fossology instance
+    :type upload: Upload
+    :type uploadTreeId: int
+    :type filename: string
+    :type kwargs: key word argument
+
+    .. note::
+
+        The upload is converted to an Upload object when it's first accessed
+    """
+
+    __slots__ = ("_upload", "uploadTreeId", "filename")
+
+    def __init__(self, upload, uploadTreeId, filename, **kwargs):
+        self._upload = upload
+        self.uploadTreeId = uploadTreeId
+        self.filename = filename
+        self.additional_info = kwargs
+
+    @property
+    def upload(self) -> Upload:
+        if isinstance(self._upload, dict):
+            self._upload = Upload.from_json(self._upload)
+        return self._upload
+
+    @upload.setter
+    def upload(self, upload: Upload):
+        self._upload = upload
+
+    def __str__(self):
+        return (
+            f"File '{self.filename}' ({self.uploadTreeId}) "
+            f"in upload {self.upload.uploadname} ({self.upload.id})"
+        )
+
+    @classmethod
+    def from_json(cls, json_dict):
+        return cls(**json_dict)
+
+
+class Summary(_Model):
 
     """FOSSology upload summary.
 
@@ -460,6 +642,20 @@ class Summary(object):
     :type kwargs: key word argument
     """
 
+    __slots__ = (
+        "id",
+        "uploadName",
+        "mainLicense",
+        "uniqueLicenses",
+        "totalLicenses",
+        "uniqueConcludedLicenses",
+        "totalConcludedLicenses",
+        "filesToBeCleared",
+        "filesCleared",
+        "clearingStatus",
+        "copyrightCount",
+    )
+
     def __init__(
         self,
         id,
@@ -477,14 +673,14 @@ class Summary(object):
     ):
         self.id = id
         self.uploadName = uploadName
-        self.mainLicense = mainLicense
+        self.mainLicense = _intern(mainLicense)
         self.uniqueLicenses = uniqueLicenses
         self.totalLicenses = totalLicenses
         self.uniqueConcludedLicenses = uniqueConcludedLicenses
         self.totalConcludedLicenses = totalConcludedLicenses
         self.filesToBeCleared = filesToBeCleared
         self.filesCleared = filesCleared
-        self.clearingStatus = clearingStatus
+        self.clearingStatus = _intern(clearingStatus)
         self.copyrightCount = copyrightCount
         self.additional_info = kwargs
 
@@ -499,7 +695,7 @@ class Summary(object):
         return cls(**json_dict)
 
 
-class Job(object):
+class Job(_Model):
 
     """FOSSology job.
 
@@ -525,17 +721,28 @@ class Job(object):
     :type kwargs: key word argument
     """
 
+    __slots__ = (
+        "id",
+        "name",
+        "queueDate",
+        "uploadId",
+        "userId",
+        "groupId",
+        "eta",
+        "status",
+    )
+
     def __init__(
         self, id, name, queueDate, uploadId, userId, groupId, eta, status, **kwargs
     ):
         self.id = id
-        self.name = name
+        self.name = _intern(name)
         self.queueDate = queueDate
         self.uploadId = uploadId
         self.userId = userId
         self.groupId = groupId
         self.eta = eta
-        self.status = status
+        self.status = _intern(status)
         self.additional_info = kwargs
 
     def __str__(self):
@@ -556,3 +763,17 @@ def get_options(group: str = None, folder: Folder = None) -> str:
     if folder:
         options += f"in folder {folder.id} "
     return options
+
+
+def get_hash(item: dict) -> tuple:
+    """Get the hash used to identify a file in a filesearch request
+
+    :param item: the hashes of a file, e.g. {"sha1": "...", "md5": "..."}
+    :type item: dict
+    :return: the algorithm and the value of the first hash available (sha1, md5, sha256)
+    :rtype: tuple
+    """
+    for algorithm in ("sha1", "md5", "sha256"):
+        if item.get(algorithm):
+            return algorithm, item[algorithm]
+    return None, None
@@ -1,23 +1,64 @@
 # Copyright 2019-2021 Siemens AG
 # SPDX-License-Identifier: MIT
 
+import os
 import re
 import time
+import hashlib
 import logging
-from typing import Tuple
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from tenacity import retry, TryAgain, stop_after_attempt, retry_if_exception_type
-from fossology.exceptions import FossologyApiError, AuthorizationError
+from fossology.cache import file_mode
+from fossology.exceptions import (
+    AuthorizationError,
+    FossologyApiError,
+    ServerUnavailableError,
+)
 from fossology.obj import ReportFormat, Upload, get_options
+from fossology.transport import get_retry_after, operation
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+REPORT_CHUNK_SIZE = 64 * 1024
+
+# Minimum delay between two requests polling a report, even if the server answers
+# with "Retry-After: 0" or the caller gives a wait time of 0
+MIN_POLL_INTERVAL = 0.5
+
+
+def get_report_name(response) -> str:
+    """Get the report file name from the Content-Disposition header of a response
+
+    :param response: the response of a GET /report/{id} request
+    :type response: requests.Response
+    :return: the name of the report file
+    :rtype: string
+    """
+    content = response.headers["Content-Disposition"]
+    report_name_pattern = '(^attachment; filename=")(.*)("$)'
+    return re.match(report_name_pattern, content).group(2)
+
+
+def get_report_id(response) -> str:
+    """Get the report id from the response of a report generation request
+
+    :param response: the response of a GET /report request
+    :type response: requests.Response
+    :return: the id of the report
+    :rtype: string
+    """
+    return re.search("[0-9]*$", response.json()["message"])[0]
+
 
 class Report:
     """Class dedicated to all "report" related endpoints"""
 
-    @retry(retry=retry_if_exception_type(TryAgain), stop=stop_after_attempt(3))
+    @operation
     def generate_report(
         self, upload: Upload, report_format: ReportFormat = None, group: str = None
     ):
@@ -35,6 +76,41 @@ class Report:
         :rtype: int
         :raises FossologyApiError: if the REST call failed
         :raises AuthorizationError: if the user can't access the group
+        :raises ServerUnavailableError: if the upload is still not ready after all the
+            attempts of the retry policy
+        """
+        response = self._request_report(upload, report_format, group)
+        if response.status_code == 201:
+            return get_report_id(response)
+        else:
+            description = f"Report generation for upload {upload.uploadname} not ready"
+            raise ServerUnavailableError(description, response)
+
+    def _request_report(
+        self,
+        upload: Upload,
+        report_format: ReportFormat = None,
+        group: str = None,
+        poll: bool = False,
+    ):
+        """Send a report generation request
+
+        Internal function meant to be called by the report generation functions
+
+        API Endpoint: GET /report
+
+        :param upload: the upload which report will be generated
+        :param format: the report format (default: ReportFormat.READMEOSS)
+        :param group: the group name to choose while generating the report (default: None)
+        :param poll: return the 503 answers instead of retrying them (default: False)
+        :type upload: Upload
+        :type format: ReportFormat
+        :type group: string
+        :type poll: boolean
+        :return: the response of the server if the report is scheduled (201) or not (503)
+        :rtype: requests.Response
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
         """
         headers = {"uploadId": str(upload.id)}
         if report_format:
@@ -44,27 +120,22 @@ class Report:
         if group:
             headers["groupName"] = group
 
-        response = self.session.get(f"{self.api}/report", headers=headers)
+        response = self._request(
+            "GET", "/report", headers=headers, retry_policy=self._poll_policy(poll)
+        )
 
-        if response.status_code == 201:
-            report_id = re.search("[0-9]*$", response.json()["message"])
-            return report_id[0]
+        if response.status_code in (201, 503):
+            return response
 
         elif response.status_code == 403:
             description = f"Generating report for upload {upload.id} {get_options(group)}not authorized"
             raise AuthorizationError(description, response)
 
-        elif response.status_code == 503:
-            wait_time = response.headers["Retry-After"]
-            logger.debug(f"Retry generate report after {wait_time} seconds")
-            time.sleep(int(wait_time))
-            raise TryAgain
-
         else:
             description = f"Report generation for upload {upload.uploadname} failed"
             raise FossologyApiError(description, response)
 
-    @retry(retry=retry_if_exception_type(TryAgain), stop=stop_after_attempt(3))
+    @operation
     def download_report(self, report_id: int, group: str = None) -> Tuple[str, str]:
         """Download a report
 
@@ -90,28 +161,466 @@ class Report:
         :rtype: Tuple[str, str]
         :raises FossologyApiError: if the REST call failed
         :raises AuthorizationError: if the user can't access the group
-        :raises TryAgain: if the report generation timed out after 3 retries
+        :raises ServerUnavailableError: if the report is still not ready after all the
+            attempts of the retry policy
+        """
+        response = self._get_report(report_id, group)
+        if response.status_code == 200:
+            return response.text, get_report_name(response)
+        else:
+            description = f"Report {report_id} not ready"
+            raise ServerUnavailableError(description, response)
+
+    @operation
+    def download_report_file(
+        self,
+        report_id: int,
+        report_file,
+        group: str = None,
+        chunk_size: int = REPORT_CHUNK_SIZE,
+    ) -> Tuple[str, int, str]:
+        """Download a report and stream its content to a file
+
+        API Endpoint: GET /report/{id}
+
+        The report is written chunk by chunk as raw bytes, binary report formats are
+        stored unchanged and the memory usage does not depend on the report size.
+
+        If ``report_file`` is a path, the report is first written to a temporary file
+        in the same directory and renamed once complete. If the path is an existing
+        directory, the report name sent by the server is used as file name.
+
+        :Example:
+
+        >>> report_id = foss.generate_report(foss.detail_upload(1))
+        >>> report_name, size, sha256 = foss.download_report_file(report_id, "reports/")
+
+        :param report_id: the id of the generated report
+        :param report_file: the path or the binary file object to write the report to
+        :param group: the group name to choose while downloading a specific report (default: None)
+        :param chunk_size: the size of the chunks read from the server in bytes (default: 64kB)
+        :type report_id: int
+        :type report_file: string, Path or file object opened in binary mode
+        :type group: string
+        :type chunk_size: int
+        :return: the report name, the number of bytes written and the SHA256 of the report
+        :rtype: Tuple[str, int, str]
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
+        :raises ServerUnavailableError: if the report is still not ready after all the
+            attempts of the retry policy
+        """
+        response = self._get_report(report_id, group, stream=True)
+        if response.status_code == 200:
+            return self._write_report(response, report_file, chunk_size)
+        with response:
+            description = f"Report {report_id} not ready"
+            raise ServerUnavailableError(description, response)
+
+    @operation
+    def fetch_report(
+        self,
+        upload: Upload,
+        report_format: ReportFormat = None,
+        report_file=".",
+        group: str = None,
+        timeout: int = 3600,
+        wait_time: int = 5,
+        max_wait_time: int = 120,
+        metrics: Dict = None,
+    ) -> Tuple[str, int, str]:
+        """Generate a report, wait until it is ready and download it
+
+        API Endpoints: GET /report, GET /report/{id}
+
+        Unlike :func:`~fossology.report.Report.generate_report` and
+        :func:`~fossology.report.Report.download_report`, the number of attempts is not
+        limited: the server is polled until ``timeout`` seconds are elapsed, starting
+        with a delay of ``wait_time`` seconds which is doubled after each attempt up to
+        ``max_wait_time`` (but never shorter than the ``Retry-After`` interval or than
+        ``MIN_POLL_INTERVAL``).
+
+        If a ``metrics`` dictionary is given, it is filled with the number of requests
+        sent and the time spent (in seconds) generating the report, waiting for the
+        report to be ready and transferring the report:
+
+        >>> metrics = {}
+        >>> foss.fetch_report(upload, ReportFormat.SPDX2, "reports/", metrics=metrics)
+        >>> metrics
+        >>> {"requests": 5, "generate": 0.2, "wait": 45.1, "transfer": 3.4}
+
+        :param upload: the upload which report will be generated
+        :param report_format: the report format (default: ReportFormat.READMEOSS)
+        :param report_file: the path, the directory or the binary file object to write the report to (default: ".")
+        :param group: the group name to choose while generating the report (default: None)
+        :param timeout: stop waiting for the report after x seconds (default: 3600)
+        :param wait_time: the initial delay between two attempts (default: 5)
+        :param max_wait_time: the maximum delay between two attempts (default: 120)
+        :param metrics: a dictionary to be filled with the request metrics (default: None)
+        :type upload: Upload
+        :type report_format: ReportFormat
+        :type report_file: string, Path or file object opened in binary mode
+        :type group: string
+        :type timeout: int
+        :type wait_time: int
+        :type max_wait_time: int
+        :type metrics: dict
+        :return: the report name, the number of bytes written and the SHA256 of the report
+        :rtype: Tuple[str, int, str]
+        :raises FossologyApiError: if the REST call failed or the report wasn't ready in time
+        :raises AuthorizationError: if the user can't access the group
+        """
+        if metrics is None:
+            metrics = dict()
+        metrics.update(requests=0, generate=0.0, wait=0.0, transfer=0.0)
+        deadline = time.monotonic() + timeout
+        delay = max(wait_time, MIN_POLL_INTERVAL)
+
+        def wait(response, step):
+            nonlocal delay
+            sleep_time = max(delay, get_retry_after(response) or 0)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                description = f"Report {step} for upload {upload.uploadname} timed out"
+                raise FossologyApiError(description, response)
+            logger.debug("Retry report %s after %s seconds", step, sleep_time)
+            self._wait(min(sleep_time, remaining))
+            delay = min(delay * 2, max_wait_time)
+
+        start = time.monotonic()
+        while True:
+            metrics["requests"] += 1
+            response = self._request_report(upload, report_format, group, poll=True)
+            if response.status_code == 201:
+                report_id = get_report_id(response)
+                break
+            wait(response, "generation")
+        metrics["generate"] = time.monotonic() - start
+
+        start = time.monotonic()
+        delay = max(wait_time, MIN_POLL_INTERVAL)
+        while True:
+            metrics["requests"] += 1
+            response = self._get_report(report_id, group, stream=True, poll=True)
+            if response.status_code == 200:
+                break
+            response.close()
+            wait(response, "download")
+        metrics["wait"] = time.monotonic() - start
+
+        start = time.monotonic()
+        report = self._write_report(response, report_file, REPORT_CHUNK_SIZE)
+        metrics["transfer"] = time.monotonic() - start
+        logger.debug(
+            "Report %s fetched: generation %.1fs, wait %.1fs, transfer %.1fs",
+            report_id,
+            metrics["generate"],
+            metrics["wait"],
+            metrics["transfer"],
+        )
+        return report
+
+    def _get_report(
+        self,
+        report_id: int,
+        group: str = None,
+        stream: bool = False,
+        poll: bool = False,
+    ):
+        """Send a request for a report
+
+        Internal function meant to be called by the report download functions
+
+        API Endpoint: GET /report/{id}
+
+        :param report_id: the id of the generated report
+        :param group: the group name to choose while downloading a specific report (default: None)
+        :param stream: don't read the response content immediately (default: False)
+        :param poll: return the 503 answers instead of retrying them (default: False)
+        :type report_id: int
+        :type group: string
+        :type stream: boolean
+        :type poll: boolean
+        :return: the response of the server if the report is ready (200) or not (503)
+        :rtype: requests.Response
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
         """
         headers = dict()
         if group:
             headers["groupName"] = group
 
-        response = self.session.get(f"{self.api}/report/{report_id}", headers=headers)
-        if response.status_code == 200:
-            content = response.headers["Content-Disposition"]
-            report_name_pattern = '(^attachment; filename=")(.*)("$)'
-            report_name = re.match(report_name_pattern, content).group(2)
-            return response.text, report_name
-        elif response.status_code == 403:
-            description = (
-                f"Getting report {report_id} {get_options(group)}not authorized"
+        response = self._request(
+            "GET",
+            "/report/{id}",
+            report_id,
+            headers=headers,
+            stream=stream,
+            retry_policy=self._poll_policy(poll),
+        )
+        if response.status_code in (200, 503):
+            return response
+        # Close the streamed response once the error message has been read
+        with response:
+            if response.status_code == 403:
+                description = (
+                    f"Getting report {report_id} {get_options(group)}not authorized"
+                )
+                raise AuthorizationError(description, response)
+            else:
+                description = f"Download of report {report_id} failed"
+                raise FossologyApiError(description, response)
+
+    @operation
+    def generate_reports(
+        self,
+        uploads: List[Upload],
+        report_formats: List[ReportFormat] = None,
+        directory=".",
+        group: str = None,
+        workers: int = 4,
+        timeout: int = 3600,
+        wait_time: int = 5,
+        max_wait_time: int = 120,
+    ) -> List[Dict]:
+        """Generate and download reports for several uploads and formats
+
+        API Endpoints: GET /report, GET /report/{id}
+
+        Report generations are requested and the reports downloaded by a pool of
+        ``workers`` threads. Reports which are not ready yet are polled in rounds: all
+        pending reports share a single back-off delay starting at ``wait_time`` seconds,
+        doubled after each round without progress up to ``max_wait_time`` and never
+        shorter than the ``Retry-After`` interval sent by the server or than
+        ``MIN_POLL_INTERVAL``.
+
+        The reports are written to ``directory`` under the name given by the server,
+        prefixed with the upload id (e.g. ``1_SPDX2_upload-1.rdf``) so that the
+        reports of different uploads don't overwrite each other. A report whose file
+        name was already written by the same call is marked as failed instead of
+        replacing the first one.
+
+        Each entry of the returned manifest describes one report:
+
+        >>> {
+        >>>     "upload": 1,
+        >>>     "format": "spdx2",
+        >>>     "report_id": "12",
+        >>>     "status": "downloaded",  # or "failed", "timeout"
+        >>>     "report_name": "1_SPDX2_upload-1.rdf",
+        >>>     "size": 1024,
+        >>>     "sha256": "...",
+        >>>     "error": None,
+        >>> }
+
+        :Example:
+
+        >>> uploads = foss.list_uploads(page_size=100)
+        >>> manifest = foss.generate_reports(
+                uploads, [ReportFormat.SPDX2, ReportFormat.DEP5], "reports/"
             )
-            raise AuthorizationError(description, response)
-        elif response.status_code == 503:
-            wait_time = response.headers["Retry-After"]
-            logger.debug(f"Retry get report after {wait_time} seconds")
-            time.sleep(int(wait_time))
-            raise TryAgain
-        else:
-            description = f"Download of report {report_id} failed"
-            raise FossologyApiError(description, response)
+        >>> failed = [item for item in manifest if item["status"] != "downloaded"]
+
+        :param uploads: the uploads which reports will be generated
+        :param report_formats: the report formats (default: [ReportFormat.READMEOSS])
+        :param directory: the directory the reports will be written to (default: ".")
+        :param group: the group name to choose while generating the reports (default: None)
+        :param workers: the maximum number of concurrent requests (default: 4)
+        :param timeout: stop waiting for reports after x seconds (default: 3600)
+        :param wait_time: the initial delay between two polling rounds (default: 5)
+        :param max_wait_time: the maximum delay between two polling rounds (default: 120)
+        :type uploads: list of Upload
+        :type report_formats: list of ReportFormat
+        :type directory: string or Path
+        :type group: string
+        :type workers: int
+        :type timeout: int
+        :type wait_time: int
+        :type max_wait_time: int
+        :return: the status of each report
+        :rtype: list of dict
+        """
+        if not report_formats:
+            report_formats = [ReportFormat.READMEOSS]
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        queue = list()
+        for upload in uploads:
+            for report_format in report_formats:
+                item = {
+                    "upload": upload.id,
+                    "format": report_format.value,
+                    "report_id": None,
+                    "status": "queued",
+                    "report_name": None,
+                    "size": None,
+                    "sha256": None,
+                    "error": None,
+                }
+                queue.append((item, upload, report_format))
+
+        deadline = time.monotonic() + timeout
+        delay = max(wait_time, MIN_POLL_INTERVAL)
+        pending = queue
+        written = (set(), threading.Lock())
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending:
+                futures = [
+                    self._submit(
+                        executor,
+                        self._report_queue_step,
+                        *entry,
+                        directory,
+                        group,
+                        written,
+                    )
+                    for entry in pending
+                ]
+                retry_after = [future.result() for future in as_completed(futures)]
+                retry_after = [wait for wait in retry_after if wait is not None]
+                pending = [
+                    entry
+                    for entry in pending
+                    if entry[0]["status"] in ("queued", "generated")
+                ]
+                if not pending:
+                    break
+
+                if len(retry_after) < len(futures):
+                    delay = max(wait_time, MIN_POLL_INTERVAL)
+                else:
+                    delay = min(delay * 2, max_wait_time)
+                sleep_time = max([delay] + retry_after)
+                if time.monotonic() + sleep_time > deadline:
+                    for item, upload, report_format in pending:
+                        item["status"] = "timeout"
+                        item["error"] = f"Report not ready after {timeout} seconds"
+                    break
+                logger.debug(
+                    "%s reports not ready, next check in %s seconds",
+                    len(pending),
+                    sleep_time,
+                )
+                self._wait(sleep_time)
+
+        return [entry[0] for entry in queue]
+
+    def _report_queue_step(
+        self,
+        item: Dict,
+        upload: Upload,
+        report_format: ReportFormat,
+        directory,
+        group,
+        written,
+    ):
+        """Generate or download a report of the report queue
+
+        Internal function meant to be called by generate_reports(), the manifest item is
+        updated in place. ``written`` holds the names of the report files already
+        written by the queue and the lock guarding them.
+
+        :return: the time to wait if the report is not ready yet, else None
+        :rtype: float
+        """
+        try:
+            if item["status"] == "queued":
+                response = self._request_report(upload, report_format, group, poll=True)
+                if response.status_code == 503:
+                    return get_retry_after(response) or 0
+                item["report_id"] = get_report_id(response)
+                item["status"] = "generated"
+
+            response = self._get_report(
+                item["report_id"], group, stream=True, poll=True
+            )
+            if response.status_code == 503:
+                response.close()
+                return get_retry_after(response) or 0
+            try:
+                name = f"{upload.id}_{get_report_name(response)}"
+            except (AttributeError, KeyError):
+                response.close()
+                item.update(
+                    status="failed",
+                    error=f"Report {item['report_id']} has no valid file name",
+                )
+                return None
+            names, lock = written
+            with lock:
+                collision = name in names
+                names.add(name)
+            if collision:
+                response.close()
+                item.update(
+                    status="failed",
+                    error=f"Report {name} was already written by another report",
+                )
+                return None
+            _, size, digest = self._write_report(
+                response, Path(directory) / name, REPORT_CHUNK_SIZE
+            )
+            item.update(status="downloaded", report_name=name, size=size, sha256=digest)
+        except (AuthorizationError, FossologyApiError) as error:
+            item.update(status="failed", error=error.message)
+        except OSError as error:
+            item.update(status="failed", error=str(error))
+
+    def _poll_policy(self, poll: bool):
+        """Get the retry policy of a report request
+
+        The report polling functions wait for the reports with their own deadline and
+        back-off, the 503 answers are given back to them instead of being retried.
+
+        :param poll: whether the request is sent by a polling function
+        :type poll: boolean
+        :return: the retry policy - or None for the policy of the client
+        :rtype: RetryPolicy
+        """
+        if poll:
+            return self.retry_policy.replace(unavailable_attempts=1)
+        return None
+
+    @staticmethod
+    def _write_report(response, report_file, chunk_size: int) -> Tuple[str, int, str]:
+        """Write the content of a streamed report response
+
+        :param response: the streamed response of the report download
+        :param report_file: the path or the binary file object to write the report to
+        :param chunk_size: the size of the chunks read from the server in bytes
+        :type response: requests.Response
+        :type report_file: string, Path or file object opened in binary mode
+        :type chunk_size: int
+        :return: the report name, the number of bytes written and the SHA256 of the report
+        :rtype: Tuple[str, int, str]
+        """
+        checksum = hashlib.sha256()
+        size = 0
+
+        def write_chunks(fp):
+            nonlocal size
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                fp.write(chunk)
+                checksum.update(chunk)
+                size += len(chunk)
+
+        with response:
+            name = get_report_name(response)
+            if hasattr(report_file, "write"):
+                write_chunks(report_file)
+            else:
+                report_path = Path(report_file)
+                if report_path.is_dir():
+                    report_path = report_path / name
+                fd, tmp_path = tempfile.mkstemp(
+                    prefix=f".{report_path.name}.", dir=report_path.parent
+                )
+                try:
+                    with os.fdopen(fd, "wb") as fp:
+                        write_chunks(fp)
+                    os.chmod(tmp_path, file_mode())
+                    os.replace(tmp_path, report_path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+        logger.debug("Report %s downloaded (%s bytes)", name, size)
+        return name, size, checksum.hexdigest()
@@ -0,0 +1,410 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import io
+import re
+import logging
+import xml.etree.ElementTree as ET
+from typing import Iterator, Union
+
+from fossology.obj import ReportFormat
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+SPDX_NS = "{http://spdx.org/rdf/terms#}"
+RDF_NS = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+RDF_PROPERTIES = {
+    f"{SPDX_NS}{tag}"
+    for tag in (
+        "fileName",
+        "name",
+        "packageFileName",
+        "checksum",
+        "licenseConcluded",
+        "licenseDeclared",
+        "licenseInfoInFile",
+        "licenseInfoFromFiles",
+        "copyrightText",
+    )
+}
+
+
+class SpdxFile(object):
+
+    """File described in a SPDX report.
+
+    :param path: the path of the file in the upload
+    :param spdx_id: the SPDX identifier of the file
+    :param checksums: the checksums of the file by algorithm (e.g. "SHA1")
+    :param license_concluded: the concluded license expression
+    :param license_info: the licenses found in the file
+    :param copyright_text: the copyright statements found in the file
+    :type path: string
+    :type spdx_id: string
+    :type checksums: dict
+    :type license_concluded: string
+    :type license_info: list of string
+    :type copyright_text: string
+    """
+
+    __slots__ = (
+        "path",
+        "spdx_id",
+        "checksums",
+        "license_concluded",
+        "license_info",
+        "copyright_text",
+    )
+
+    def __init__(
+        self,
+        path=None,
+        spdx_id=None,
+        checksums=None,
+        license_concluded=None,
+        license_info=None,
+        copyright_text=None,
+    ):
+        self.path = path
+        self.spdx_id = spdx_id
+        self.checksums = checksums if checksums is not None else dict()
+        self.license_concluded = license_concluded
+        self.license_info = license_info if license_info is not None else list()
+        self.copyright_text = copyright_text
+
+    def __str__(self):
+        return f"File {self.path}, concluded license: {self.license_concluded}"
+
+
+class SpdxPackage(object):
+
+    """Package described in a SPDX report.
+
+    :param name: the name of the package
+    :param spdx_id: the SPDX identifier of the package
+    :param file_name: the file name of the package
+    :param checksums: the checksums of the package by algorithm (e.g. "SHA1")
+    :param license_concluded: the concluded license expression
+    :param license_declared: the declared license expression
+    :param license_info: the licenses found in the files of the package
+    :param copyright_text: the copyright statements of the package
+    :type name: string
+    :type spdx_id: string
+    :type file_name: string
+    :type checksums: dict
+    :type license_concluded: string
+    :type license_declared: string
+    :type license_info: list of string
+    :type copyright_text: string
+    """
+
+    __slots__ = (
+        "name",
+        "spdx_id",
+        "file_name",
+        "checksums",
+        "license_concluded",
+        "license_declared",
+        "license_info",
+        "copyright_text",
+    )
+
+    def __init__(
+        self,
+        name=None,
+        spdx_id=None,
+        file_name=None,
+        checksums=None,
+        license_concluded=None,
+        license_declared=None,
+        license_info=None,
+        copyright_text=None,
+    ):
+        self.name = name
+        self.spdx_id = spdx_id
+        self.file_name = file_name
+        self.checksums = checksums if checksums is not None else dict()
+        self.license_concluded = license_concluded
+        self.license_declared = license_declared
+        self.license_info = license_info if license_info is not None else list()
+        self.copyright_text = copyright_text
+
+    def __str__(self):
+        return (
+            f"Package {self.name}, concluded license: {self.license_concluded}, "
+            f"declared license: {self.license_declared}"
+        )
+
+
+# Tag-value format
+
+TV_FILE_TAGS = {
+    "FileName": "path",
+    "SPDXID": "spdx_id",
+    "LicenseConcluded": "license_concluded",
+    "FileCopyrightText": "copyright_text",
+}
+TV_PACKAGE_TAGS = {
+    "PackageName": "name",
+    "SPDXID": "spdx_id",
+    "PackageFileName": "file_name",
+    "PackageLicenseConcluded": "license_concluded",
+    "PackageLicenseDeclared": "license_declared",
+    "PackageCopyrightText": "copyright_text",
+}
+TV_SECTION_TAGS = ("SnippetSPDXID", "LicenseID", "Relationship", "ReviewDate")
+
+
+def _tag_values(text_file) -> Iterator:
+    """Read the tag/value pairs of a SPDX tag-value document
+
+    Values enclosed in <text>...</text> may span several lines.
+    """
+    for line in text_file:
+        if not line.strip() or line.startswith("#") or ":" not in line:
+            continue
+        tag, value = line.split(":", 1)
+        value = value.strip()
+        if value.startswith("<text>"):
+            lines = [value[len("<text>") :]]
+            while "</text>" not in lines[-1]:
+                next_line = text_file.readline()
+                if not next_line:
+                    break
+                lines.append(next_line.rstrip("\n"))
+            value = "\n".join(lines).split("</text>", 1)[0].strip()
+        yield tag.strip(), value
+
+
+def _set_tv_field(record: Union[SpdxFile, SpdxPackage], tag: str, value: str):
+    """Set the record field corresponding to a tag-value pair"""
+    if isinstance(record, SpdxFile):
+        tags = TV_FILE_TAGS
+        checksum_tag, info_tag = "FileChecksum", "LicenseInfoInFile"
+    else:
+        tags = TV_PACKAGE_TAGS
+        checksum_tag, info_tag = "PackageChecksum", "PackageLicenseInfoFromFiles"
+    if tag in tags:
+        setattr(record, tags[tag], value)
+    elif tag == checksum_tag and ":" in value:
+        algorithm, checksum = value.split(":", 1)
+        record.checksums[algorithm.strip().upper()] = checksum.strip()
+    elif tag == info_tag:
+        record.license_info.append(value)
+
+
+def parse_spdx_tv(text_file) -> Iterator[Union[SpdxFile, SpdxPackage]]:
+    """Parse a SPDX tag-value report (ReportFormat.SPDX2TV)
+
+    Files and packages are yielded as soon as their section is complete, the whole
+    document is never loaded in memory.
+
+    :param text_file: the report opened in text mode
+    :type text_file: file object
+    :return: the files and packages described in the report
+    :rtype: iterator of SpdxFile and SpdxPackage
+    """
+    record = None
+    for tag, value in _tag_values(text_file):
+        if tag in ("PackageName", "FileName") or tag in TV_SECTION_TAGS:
+            if record is not None:
+                yield record
+            record = None
+            if tag == "PackageName":
+                record = SpdxPackage()
+            elif tag == "FileName":
+                record = SpdxFile()
+        if record is None:
+            continue
+
+        _set_tv_field(record, tag, value)
+    if record is not None:
+        yield record
+
+
+# RDF format
+
+
+def _license_id(uri: str) -> str:
+    """Get a license identifier from a SPDX license URI"""
+    if "#" in uri:
+        license_id = uri.rsplit("#", 1)[1]
+        if license_id in ("noassertion", "none"):
+            return license_id.upper()
+        return license_id
+    return uri.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _license_expression(element) -> str:
+    """Get the license expression of a license property element"""
+    resource = element.get(f"{RDF_NS}resource")
+    if resource:
+        return _license_id(resource)
+    for child in element:
+        tag = child.tag[len(SPDX_NS) :]
+        if tag in ("DisjunctiveLicenseSet", "ConjunctiveLicenseSet"):
+            operator = " OR " if tag == "DisjunctiveLicenseSet" else " AND "
+            members = [
+                _license_expression(member)
+                for member in child.findall(f"{SPDX_NS}member")
+            ]
+            members = [member for member in members if member]
+            if len(members) > 1:
+                return "(" + operator.join(members) + ")"
+            return members[0] if members else None
+        license_id = child.find(f"{SPDX_NS}licenseId")
+        if license_id is not None and license_id.text:
+            return license_id.text.strip()
+        about = child.get(f"{RDF_NS}about")
+        if about:
+            return _license_id(about)
+    return None
+
+
+def _text(element) -> str:
+    """Get the text or the resource of a literal property element"""
+    resource = element.get(f"{RDF_NS}resource")
+    if resource:
+        return _license_id(resource)
+    return element.text.strip() if element.text else ""
+
+
+def _checksums(element) -> dict:
+    checksums = dict()
+    for checksum in element.iter(f"{SPDX_NS}Checksum"):
+        algorithm = checksum.find(f"{SPDX_NS}algorithm")
+        value = checksum.find(f"{SPDX_NS}checksumValue")
+        if algorithm is None or value is None:
+            continue
+        algorithm = algorithm.get(f"{RDF_NS}resource", "").rsplit("_", 1)[-1]
+        checksums[algorithm.upper()] = value.text.strip()
+    return checksums
+
+
+def _rdf_record(element) -> Union[SpdxFile, SpdxPackage]:
+    """Build a record from a spdx:File or spdx:Package element"""
+    if element.tag == f"{SPDX_NS}File":
+        record = SpdxFile()
+        fields = {"fileName": "path", "copyrightText": "copyright_text"}
+        info_tag = "licenseInfoInFile"
+    else:
+        record = SpdxPackage()
+        fields = {
+            "name": "name",
+            "packageFileName": "file_name",
+            "copyrightText": "copyright_text",
+        }
+        info_tag = "licenseInfoFromFiles"
+    about = element.get(f"{RDF_NS}about")
+    if about:
+        record.spdx_id = about.rsplit("#", 1)[-1]
+
+    for child in element:
+        tag = child.tag[len(SPDX_NS) :]
+        if tag in fields:
+            setattr(record, fields[tag], _text(child))
+        elif tag == "checksum":
+            record.checksums.update(_checksums(child))
+        elif tag == "licenseConcluded":
+            record.license_concluded = (
+                _license_expression(child) or record.license_concluded
+            )
+        elif tag == "licenseDeclared":
+            record.license_declared = _license_expression(child)
+        elif tag == info_tag:
+            license_info = _license_expression(child)
+            if license_info:
+                record.license_info.append(license_info)
+    return record
+
+
+def parse_spdx_rdf(xml_file) -> Iterator[Union[SpdxFile, SpdxPackage]]:
+    """Parse a SPDX RDF/XML report (ReportFormat.SPDX2)
+
+    The document is parsed incrementally, each file and package element is released as
+    soon as the corresponding record has been yielded. Files nested in a package are
+    yielded before the package.
+
+    :param xml_file: the report opened in binary mode
+    :type xml_file: file object
+    :return: the files and packages described in the report
+    :rtype: iterator of SpdxFile and SpdxPackage
+    """
+    record_tags = (f"{SPDX_NS}File", f"{SPDX_NS}Package")
+    stack = list()
+    for event, element in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            continue
+        stack.pop()
+        if not stack:
+            continue
+        parent = stack[-1]
+        if element.tag in record_tags:
+            yield _rdf_record(element)
+        elif len(stack) > 1 and not (
+            parent.tag in record_tags and element.tag not in RDF_PROPERTIES
+        ):
+            continue
+        # Release the elements which have been processed or are not needed
+        parent.remove(element)
+
+
+def parse_spdx_report(report, report_format: ReportFormat = None) -> Iterator:
+    """Parse a SPDX report downloaded from Fossology
+
+    :Example:
+
+    >>> from fossology.spdx import parse_spdx_report, SpdxFile
+    >>> report_name, _, _ = foss.fetch_report(upload, ReportFormat.SPDX2, "reports/")
+    >>> for record in parse_spdx_report(f"reports/{report_name}"):
+    >>>     if isinstance(record, SpdxFile):
+    >>>         print(record.path, record.license_concluded)
+
+    :param report: the path of the report or the report file opened in binary mode
+    :param report_format: SPDX2 or SPDX2TV (default: guessed from the content)
+    :type report: string, Path or file object
+    :type report_format: ReportFormat
+    :return: the files and packages described in the report
+    :rtype: iterator of SpdxFile and SpdxPackage
+    :raises ValueError: if the report format is not a SPDX format
+    """
+    if report_format and report_format not in (
+        ReportFormat.SPDX2,
+        ReportFormat.SPDX2TV,
+    ):
+        raise ValueError(f"Unable to parse {report_format.value} reports")
+
+    if hasattr(report, "read"):
+        yield from _parse_spdx_file(report, report_format)
+    else:
+        with open(report, "rb") as report_file:
+            yield from _parse_spdx_file(report_file, report_format)
+
+
+def _parse_spdx_file(report_file, report_format: ReportFormat) -> Iterator:
+    # A wrapper closes the stream it wraps when it is garbage collected, the wrappers
+    # are detached even if the iteration is stopped early to keep the stream open
+    wrappers = list()
+    try:
+        if not report_format:
+            if not hasattr(report_file, "peek"):
+                report_file = io.BufferedReader(report_file)
+                wrappers.append(report_file)
+            start = report_file.peek(1024).lstrip()
+            if re.match(rb"(\xef\xbb\xbf)?\s*<", start):
+                report_format = ReportFormat.SPDX2
+            else:
+                report_format = ReportFormat.SPDX2TV
+        if report_format == ReportFormat.SPDX2:
+            yield from parse_spdx_rdf(report_file)
+        else:
+            text_file = io.TextIOWrapper(
+                report_file, encoding="utf-8", errors="replace"
+            )
+            wrappers.append(text_file)
+            yield from parse_spdx_tv(text_file)
+    finally:
+        for wrapper in reversed(wrappers):
+            wrapper.detach()
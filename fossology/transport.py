@@ -0,0 +1,682 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import abc
+import copy
+import time
+import inspect
+import logging
+import functools
+import threading
+from string import Formatter
+from typing import Callable, Tuple
+
+import requests
+
+from fossology.exceptions import ServerUnavailableError
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Errors raised by a transport when the server can't be reached
+TRANSPORT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+HOOK_EVENTS = ("before_request", "after_response", "on_retry", "on_sleep")
+
+
+class Transport(abc.ABC):
+
+    """Send HTTP requests to the Fossology server
+
+    A transport sends one request and returns the response without interpreting it,
+    retries, circuit breakers and error handling are implemented by the client.
+    Alternative transports (another HTTP client, an in-process fake server) implement
+    :meth:`send` and return objects with the interface of :class:`requests.Response`,
+    they raise one of ``TRANSPORT_ERRORS`` if the server can't be reached.
+    """
+
+    @abc.abstractmethod
+    def send(self, method: str, url: str, **kwargs):
+        """Send a request
+
+        :param method: the HTTP method
+        :param url: the URL of the request
+        :param kwargs: the arguments of :meth:`requests.Session.request`
+        :type method: string
+        :type url: string
+        :return: the response of the server
+        :rtype: requests.Response
+        """
+
+    def close(self):
+        """Release the resources used by the transport"""
+        pass
+
+
+class SessionTransport(Transport):
+
+    """Transport based on a :class:`requests.Session`
+
+    :param session: the session used to send the requests
+    :type session: requests.Session
+    """
+
+    def __init__(self, session: requests.Session):
+        self.session = session
+
+    def send(self, method: str, url: str, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class RetryPolicy:
+
+    """Retry requests which failed because of a transient error
+
+    A request is retried if the server can't be reached or if it answers with one of
+    the given ``statuses``. Only idempotent requests are retried, the wait time between
+    two attempts doubles after each attempt, or is given by the Retry-After header.
+
+    "503 Service Unavailable" is the answer of the server while a resource is not ready
+    yet (e.g. an upload being unpacked, a report being generated) or while it is
+    overloaded. These answers are retried up to ``unavailable_attempts`` times, waiting
+    for the Retry-After interval, even if other errors are not retried. A request
+    still failing after all its attempts raises
+    :class:`~fossology.exceptions.ServerUnavailableError`.
+
+    :Example:
+
+    >>> from fossology.transport import RetryPolicy
+    >>> foss = Fossology(FOSS_URL, FOSS_TOKEN, username, retry_policy=RetryPolicy(3))
+
+    :param attempts: the maximum number of attempts (default: 1, no retry)
+    :param backoff: the wait time after the first attempt in seconds (default: 1)
+    :param max_backoff: the maximum wait time in seconds (default: 30)
+    :param statuses: the status codes of the responses to retry (default: 502, 503, 504)
+    :param methods: the methods of the requests to retry (default: GET, PUT, DELETE)
+    :param unavailable_attempts: the maximum number of attempts of requests answered
+        with 503 (default: 10)
+    :param retry_after: the wait time after a 503 answer in seconds, instead of its
+        Retry-After header (default: None)
+    :type attempts: int
+    :type backoff: float
+    :type max_backoff: float
+    :type statuses: tuple of int
+    :type methods: tuple of string
+    :type unavailable_attempts: int
+    :type retry_after: float
+    """
+
+    def __init__(
+        self,
+        attempts: int = 1,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        statuses: Tuple[int, ...] = (502, 503, 504),
+        methods: Tuple[str, ...] = ("GET", "PUT", "DELETE"),
+        unavailable_attempts: int = 10,
+        retry_after: float = None,
+    ):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.methods = methods
+        self.unavailable_attempts = unavailable_attempts
+        self.retry_after = retry_after
+
+    def replace(self, **changes) -> "RetryPolicy":
+        """Get a copy of the policy with some parameters changed
+
+        >>> polling = foss.retry_policy.replace(unavailable_attempts=1)
+
+        :rtype: RetryPolicy
+        """
+        policy = copy.copy(self)
+        for name, value in changes.items():
+            if not hasattr(policy, name):
+                raise TypeError(f"Unknown retry policy parameter {name}")
+            setattr(policy, name, value)
+        return policy
+
+    def max_attempts(self, response=None) -> int:
+        """Get the maximum number of attempts of a request
+
+        :param response: the response of the server - or None if it couldn't be reached
+        :type response: requests.Response
+        :rtype: int
+        """
+        if response is not None and response.status_code == 503:
+            return self.unavailable_attempts
+        return self.attempts
+
+    def retry(self, method: str, attempt: int, response=None) -> float:
+        """Get the time to wait before the next attempt
+
+        :param method: the HTTP method of the request
+        :param attempt: the number of attempts already made
+        :param response: the response of the server - or None if it couldn't be reached
+        :type method: string
+        :type attempt: int
+        :type response: requests.Response
+        :return: the wait time in seconds - or None if the request must not be retried
+        :rtype: float
+        """
+        if attempt >= self.max_attempts(response) or method not in self.methods:
+            return None
+        if response is not None:
+            if response.status_code not in self.statuses:
+                return None
+            if response.status_code == 503 and self.retry_after is not None:
+                return self.retry_after
+            retry_after = get_retry_after(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+
+class CircuitBreaker:
+
+    """Fail fast while an endpoint of the server is down
+
+    The circuit of an endpoint opens after ``failure_threshold`` consecutive failures:
+    the server couldn't be reached or answered with one of the ``failure_statuses``.
+    While the circuit is open, requests to the endpoint raise
+    :class:`~fossology.exceptions.ServerUnavailableError` without being sent. After
+    ``reset_timeout`` seconds requests are sent again, the circuit closes at the first
+    success.
+
+    "503 Service Unavailable" is not counted as a failure by default: the server
+    answers it while a resource isn't ready yet (e.g. an upload being unpacked), which
+    must not block the requests for the other resources of the endpoint. These answers
+    are retried by the :class:`RetryPolicy`.
+
+    :Example:
+
+    >>> from fossology.transport import CircuitBreaker
+    >>> foss = Fossology(FOSS_URL, FOSS_TOKEN, username, circuit_breaker=CircuitBreaker())
+
+    :param failure_threshold: the number of consecutive failures opening the circuit (default: 5)
+    :param reset_timeout: the time the circuit stays open in seconds (default: 30)
+    :param failure_statuses: the status codes counted as failures (default: 502, 504)
+    :type failure_threshold: int
+    :type reset_timeout: float
+    :type failure_statuses: tuple of int
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        failure_statuses: Tuple[int, ...] = (502, 504),
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_statuses = failure_statuses
+        self.failures = dict()
+        self.opened = dict()
+        self.lock = threading.Lock()
+
+    def allow(self, endpoint: str) -> bool:
+        """Check if a request may be sent to an endpoint
+
+        :param endpoint: the endpoint, e.g. "GET /uploads/{id}"
+        :type endpoint: string
+        :rtype: bool
+        """
+        with self.lock:
+            opened = self.opened.get(endpoint)
+            return opened is None or time.monotonic() - opened >= self.reset_timeout
+
+    def record(self, endpoint: str, response=None):
+        """Record the result of a request sent to an endpoint
+
+        :param endpoint: the endpoint, e.g. "GET /uploads/{id}"
+        :param response: the response of the server - or None if it couldn't be reached
+        :type endpoint: string
+        :type response: requests.Response
+        """
+        failed = response is None or response.status_code in self.failure_statuses
+        with self.lock:
+            if not failed:
+                self.failures.pop(endpoint, None)
+                self.opened.pop(endpoint, None)
+                return
+            self.failures[endpoint] = self.failures.get(endpoint, 0) + 1
+            if self.failures[endpoint] >= self.failure_threshold:
+                if endpoint not in self.opened:
+                    logger.warning(f"Circuit opened for {endpoint}")
+                self.opened[endpoint] = time.monotonic()
+
+
+class RequestEvent:
+
+    """Information given to the hooks of a client
+
+    The same event is given to the "before_request" and "after_response" hooks of a
+    request, hooks can store their own state (e.g. a tracing span) in ``data``.
+
+    :param endpoint: the endpoint, e.g. "GET /uploads/{id}"
+    :param operation: the public method of the client called by the application, e.g.
+        "upload_file" for the "GET /uploads/{id}" requests sent by detail_upload()
+    :param method: the HTTP method
+    :param url: the URL of the request
+    :param attempt: the number of the attempt, starting at 1
+    :type endpoint: string
+    :type operation: string
+    :type method: string
+    :type url: string
+    :type attempt: int
+    """
+
+    __slots__ = (
+        "endpoint",
+        "operation",
+        "method",
+        "url",
+        "attempt",
+        "start",
+        "elapsed",
+        "response",
+        "error",
+        "seconds",
+        "data",
+    )
+
+    def __init__(self, endpoint, operation, method=None, url=None, attempt=1):
+        self.endpoint = endpoint
+        self.operation = operation
+        self.method = method
+        self.url = url
+        self.attempt = attempt
+        self.start = time.monotonic()
+        # Set for "after_response": the duration and the response or the error
+        self.elapsed = None
+        self.response = None
+        self.error = None
+        # Set for "on_retry" and "on_sleep": the time to wait in seconds
+        self.seconds = None
+        self.data = dict()
+
+
+def operation(method: Callable) -> Callable:
+    """Record a public method of the client as the operation of the requests it sends
+
+    The operation is stored per thread in ``self.hook_local`` and given to the hooks in
+    :attr:`RequestEvent.operation`. Only the outermost method is recorded, e.g.
+    "upload_file" for the requests sent by the detail_upload() call of upload_file().
+    The operation of a generator method is recorded while each item is produced.
+    """
+    name = method.__name__
+
+    if inspect.isgeneratorfunction(method):
+
+        @functools.wraps(method)
+        def generator(self, *args, **kwargs):
+            iterator = method(self, *args, **kwargs)
+            local = self.hook_local
+            try:
+                while True:
+                    outer = getattr(local, "operation", None)
+                    local.operation = outer or name
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        local.operation = outer
+                    yield item
+            finally:
+                iterator.close()
+
+        return generator
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        local = self.hook_local
+        outer = getattr(local, "operation", None)
+        local.operation = outer or name
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            local.operation = outer
+
+    return wrapper
+
+
+def _release_on_close(response, limiter, endpoint: str, latency: float):
+    """Keep the limiter slot of a streamed response until the response is closed
+
+    The content of a streamed response is read after the request returned, the slot is
+    only released by ``response.close()`` (or leaving ``with response:``).
+    """
+    close = response.close
+    once = threading.Lock()
+
+    def release_and_close():
+        try:
+            close()
+        finally:
+            if once.acquire(blocking=False):
+                limiter.release(endpoint, latency, response)
+
+    response.close = release_and_close
+
+
+def get_retry_after(response) -> float:
+    """Get the interval of the Retry-After header of a response
+
+    Only the delay in seconds is used: a header holding an HTTP date (or any other
+    value) is ignored and the caller falls back on its own back-off delay.
+
+    :param response: the response of the server
+    :type response: requests.Response
+    :return: the interval in seconds - or None if there is no usable Retry-After header
+    :rtype: float
+    """
+    retry_after = response.headers.get("Retry-After", "").strip()
+    if retry_after.isdigit():
+        return float(retry_after)
+    return None
+
+
+def endpoint_url(endpoint: str, args) -> str:
+    """Fill the fields of an endpoint path with positional arguments
+
+    >>> endpoint_url("/uploads/{id}", (3,))
+    '/uploads/3'
+    """
+    fields = [field for _, field, _, _ in Formatter().parse(endpoint) if field]
+    return endpoint.format(**dict(zip(fields, args)))
+
+
+class Dispatcher:
+    """Class dedicated to sending the requests of all endpoints
+
+    Every request goes through :meth:`_request`, which adds the default headers
+    ``self.headers``, applies the retry policy ``self.retry_policy``, the circuit
+    breaker ``self.circuit_breaker`` and the limits ``self.limiter`` before handing
+    the request to the transport ``self.transport``. The responses of read endpoints
+    are cached in ``self.http_cache`` if set. The requests and the waits are
+    recorded in ``self.metrics`` if set, and given to the hooks registered with
+    :meth:`add_hook`. JSON bodies are decoded and encoded with ``self.codec``.
+    """
+
+    def add_hook(self, event: str, callback: Callable):
+        """Call a function at each step of the requests
+
+        The events are "before_request", "after_response", "on_retry" and "on_sleep",
+        the callback receives a :class:`RequestEvent`. Exceptions raised by a callback
+        are logged and ignored.
+
+        :Example:
+
+        >>> def trace(event):
+        >>>     print(event.operation, event.endpoint, event.elapsed)
+        >>> foss.add_hook("after_response", trace)
+
+        :param event: the name of the event
+        :param callback: the function called with the event
+        :type event: string
+        :type callback: function taking a RequestEvent
+        :raises ValueError: if the event is unknown
+        """
+        if event not in HOOK_EVENTS:
+            raise ValueError(
+                f"Unknown hook event {event}, expected one of {HOOK_EVENTS}"
+            )
+        self.hooks.setdefault(event, list()).append(callback)
+
+    def remove_hook(self, event: str, callback: Callable):
+        """Stop calling a function registered with :meth:`add_hook`
+
+        :param event: the name of the event
+        :param callback: the function
+        :type event: string
+        :type callback: function taking a RequestEvent
+        """
+        callbacks = self.hooks.get(event, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self.hooks.pop(event, None)
+
+    def _call_hooks(self, name: str, event: RequestEvent):
+        for callback in self.hooks.get(name, ()):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception(f"Hook {name} failed for {event.endpoint}")
+
+    def _request(
+        self,
+        method: str,
+        endpoint: str,
+        *args,
+        retry_policy: RetryPolicy = None,
+        **kwargs,
+    ):
+        """Send a request to an endpoint of the API
+
+        :Example:
+
+        >>> response = self._request("GET", "/uploads/{id}", upload_id, headers=headers)
+
+        :param method: the HTTP method
+        :param endpoint: the path of the endpoint, e.g. "/uploads/{id}"
+        :param args: the values of the fields of the path
+        :param retry_policy: the retry policy of this request (default: the retry
+            policy of the client)
+        :param kwargs: the arguments of :meth:`requests.Session.request`
+        :type method: string
+        :type endpoint: string
+        :type retry_policy: RetryPolicy
+        :return: the response of the server
+        :rtype: requests.Response
+        :raises ServerUnavailableError: if the circuit of the endpoint is open or the
+            request failed after all the attempts of the retry policy
+        """
+        url = f"{self.api}{endpoint_url(endpoint, args)}"
+        key = f"{method} {endpoint}"
+        kwargs["headers"] = dict(self.headers, **(kwargs.get("headers") or {}))
+        policy = retry_policy or self.retry_policy
+        cache = self.http_cache
+        if cache is not None and method == "GET" and endpoint in cache.endpoints:
+            return self._request_cached(cache, endpoint, key, url, kwargs, policy)
+        return self._request_attempts(method, key, url, kwargs, policy)
+
+    def _request_cached(self, cache, endpoint, key, url, kwargs, policy):
+        """Send a request to a read endpoint through the HTTP cache
+
+        :return: the response of the server - or the stored response
+        :rtype: requests.Response
+        """
+        cache_key = cache.key(url, kwargs)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            if time.monotonic() < entry.expires:
+                cache.count("hits")
+                return entry.response
+            kwargs["headers"].update(entry.validators())
+        response = self._request_attempts("GET", key, url, kwargs, policy)
+        if response.status_code == 304 and entry is not None:
+            cache.count("revalidated")
+            entry.expires = time.monotonic() + cache.endpoints[endpoint]
+            return entry.response
+        cache.count("misses")
+        if response.status_code == 200:
+            cache.store(cache_key, endpoint, response)
+        return response
+
+    def _request_attempts(self, method, key, url, kwargs, policy):
+        """Send a request until it succeeds or the retry policy gives up
+
+        :return: the response of the server
+        :rtype: requests.Response
+        :raises ServerUnavailableError: if the request was retried and still failed
+        """
+        operation = getattr(self.hook_local, "operation", None) if self.hooks else None
+        attempt = 0
+        while True:
+            attempt += 1
+            response = self._send(method, key, url, attempt, operation, kwargs, policy)
+            wait_time = policy.retry(method, attempt, response)
+            if wait_time is None:
+                if attempt > 1 and response.status_code in policy.statuses:
+                    with response:
+                        description = f"{key} failed after {attempt} attempts"
+                        raise ServerUnavailableError(description, response)
+                return response
+            if response is not None:
+                response.close()
+            logger.debug("Retry %s after %s seconds", key, wait_time)
+            if self.metrics:
+                self.metrics.record_retry(key)
+            if self.hooks:
+                event = RequestEvent(key, operation, method, url, attempt)
+                event.response = response
+                event.seconds = wait_time
+                self._call_hooks("on_retry", event)
+            self._wait(wait_time)
+
+    def _send(self, method, key, url, attempt, operation, kwargs, policy):
+        """Send one attempt of a request through the circuit breaker
+
+        :return: the response of the server - or None if it couldn't be reached and the
+            request may be retried
+        :rtype: requests.Response
+        """
+        breaker = self.circuit_breaker
+        if breaker and not breaker.allow(key):
+            description = f"{key} failed repeatedly, retry in {breaker.reset_timeout}s"
+            raise ServerUnavailableError(description)
+        try:
+            response = self._transmit(method, key, url, attempt, operation, kwargs)
+        except TRANSPORT_ERRORS:
+            if breaker:
+                breaker.record(key)
+            if policy.retry(method, attempt) is None:
+                raise
+            return None
+        if breaker:
+            breaker.record(key, response)
+        return response
+
+    def _transmit(self, method, key, url, attempt, operation, kwargs):
+        """Hand a request to the transport within the limits of the client
+
+        :return: the response of the server
+        :rtype: requests.Response
+        """
+        limiter = self.limiter
+        metrics = self.metrics
+        if limiter is None and metrics is None and not self.hooks:
+            return self.transport.send(method, url, **kwargs)
+        if limiter:
+            limiter.acquire(key, lambda seconds: self._wait(seconds, key))
+        event = None
+        if self.hooks:
+            event = RequestEvent(key, operation, method, url, attempt)
+            self.hook_local.endpoint = key
+            self._call_hooks("before_request", event)
+        start = time.monotonic()
+        response = None
+        try:
+            response = self.transport.send(method, url, **kwargs)
+            return response
+        except Exception as error:
+            if event:
+                event.error = error
+            raise
+        finally:
+            latency = time.monotonic() - start
+            if limiter and response is not None and kwargs.get("stream"):
+                _release_on_close(response, limiter, key, latency)
+            elif limiter:
+                limiter.release(key, latency, response)
+            if metrics:
+                metrics.record(key, latency, response, kwargs.get("stream", False))
+            if event:
+                event.elapsed = latency
+                event.response = response
+                self._call_hooks("after_response", event)
+
+    def _submit(self, executor, function: Callable, *args, **kwargs):
+        """Submit a task to a thread pool, keeping the operation of the calling thread
+
+        The requests sent by the task are reported to the hooks with the operation of
+        the public method which submitted it, e.g. "search_uploads".
+
+        :return: the future of the task
+        :rtype: concurrent.futures.Future
+        """
+        outer = getattr(self.hook_local, "operation", None)
+        return executor.submit(self._run_operation, outer, function, *args, **kwargs)
+
+    def _run_operation(self, name: str, function: Callable, *args, **kwargs):
+        local = self.hook_local
+        local.operation = name
+        try:
+            return function(*args, **kwargs)
+        finally:
+            local.operation = None
+
+    def _decode(self, response, build: Callable):
+        """Build the result of a response, recording the time spent in the metrics
+
+        The result of a response stored in the HTTP cache is only built once, see
+        :class:`~fossology.httpcache.HttpCache`.
+
+        :param response: the response of the server
+        :param build: the function building the result from the response
+        :type response: requests.Response
+        :type build: function taking a response
+        :return: the result of build()
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            build = functools.partial(self._timed_build, build, metrics)
+        if self.http_cache is None:
+            return build(response)
+        return self.http_cache.decode(response, build)
+
+    @staticmethod
+    def _timed_build(build: Callable, metrics, response):
+        start = time.monotonic()
+        try:
+            return build(response)
+        finally:
+            metrics.record_decode(time.monotonic() - start)
+
+    def _json(self, response):
+        """Decode the JSON body of a response with the codec of the client
+
+        :param response: the response of the server
+        :type response: requests.Response
+        :return: the decoded body
+        :raises ValueError: if the body isn't valid JSON
+        """
+        return self.codec.loads(response.content)
+
+    def _wait(self, seconds: float, endpoint: str = None):
+        """Wait before sending the next request
+
+        All waits of the client (retries, Retry-After of the server, rate limits) go
+        through this function.
+
+        :param seconds: the time to wait in seconds
+        :param endpoint: the endpoint waiting (default: the last endpoint requested by
+            the thread)
+        :type seconds: float
+        :type endpoint: string
+        """
+        if self.metrics:
+            self.metrics.record_sleep(seconds, endpoint)
+        if self.hooks:
+            endpoint = endpoint or getattr(self.hook_local, "endpoint", None)
+            event = RequestEvent(endpoint, getattr(self.hook_local, "operation", None))
+            event.seconds = seconds
+            self._call_hooks("on_sleep", event)
+        time.sleep(seconds)
@@ -1,13 +1,15 @@
 # Copyright 2019-2021 Siemens AG
 # SPDX-License-Identifier: MIT
 
-import json
-import time
 import logging
 
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, TryAgain
 from fossology.obj import Upload, Summary, Licenses, get_options
-from fossology.exceptions import AuthorizationError, FossologyApiError
+from fossology.exceptions import (
+    AuthorizationError,
+    FossologyApiError,
+    ServerUnavailableError,
+)
+from fossology.transport import operation
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -16,8 +18,7 @@ logger.setLevel(logging.DEBUG)
 class Uploads:
     """Class dedicated to all "uploads" related endpoints"""
 
-    # Retry until the unpack agent is finished
-    @retry(retry=retry_if_exception_type(TryAgain), stop=stop_after_attempt(10))
+    @operation
     def detail_upload(
         self, upload_id: int, group: str = None, wait_time: int = 0
     ) -> Upload:
@@ -30,7 +31,8 @@ class Uploads:
 
         If ``wait_time`` is 0, the time interval specified by the ``Retry-After`` header is used.
 
-        The function stops trying after **10 attempts**.
+        The function stops trying after the ``unavailable_attempts`` of the retry policy of the client (**10 attempts** by
+        default).
 
         :Examples:
 
@@ -50,33 +52,35 @@ class Uploads:
         :rtype: Upload
         :raises FossologyApiError: if the REST call failed
         :raises AuthorizationError: if the user can't access the group
+        :raises ServerUnavailableError: if the upload is still not ready after all attempts
         """
         headers = {}
         if group:
             headers["groupName"] = group
-        response = self.session.get(f"{self.api}/uploads/{upload_id}", headers=headers)
+        retry_policy = self.retry_policy
+        if wait_time:
+            retry_policy = retry_policy.replace(retry_after=wait_time)
+        response = self._request(
+            "GET",
+            "/uploads/{id}",
+            upload_id,
+            headers=headers,
+            retry_policy=retry_policy,
+        )
 
         if response.status_code == 200:
-            logger.debug(f"Got details for upload {upload_id}")
-            return Upload.from_json(response.json())
+            logger.debug("Got details for upload %s", upload_id)
+            return self._decode(response, lambda r: Upload.from_json(self._json(r)))
 
         elif response.status_code == 403:
             description = f"Getting details for upload {upload_id} {get_options(group)}not authorized"
             raise AuthorizationError(description, response)
 
-        elif response.status_code == 503:
-            if not wait_time:
-                wait_time = response.headers["Retry-After"]
-            logger.debug(
-                f"Retry GET upload {upload_id} after {wait_time} seconds: {response.json()['message']}"
-            )
-            time.sleep(int(wait_time))
-            raise TryAgain
-
         else:
             description = f"Error while getting details for upload {upload_id}"
             raise FossologyApiError(description, response)
 
+    @operation
     def upload_file(  # noqa: C901
         self,
         folder,
@@ -178,20 +182,18 @@ class Uploads:
             headers["uploadType"] = "server"
             with open(file, "rb") as fp:
                 files = {"fileInput": fp}
-                response = self.session.post(
-                    f"{self.api}/uploads", files=files, headers=headers
+                response = self._request(
+                    "POST", "/uploads", files=files, headers=headers
                 )
         elif vcs or url:
             if vcs:
                 headers["uploadType"] = "vcs"
-                data = json.dumps(vcs)
+                data = self.codec.dumps(vcs)
             else:
                 headers["uploadType"] = "url"
-                data = json.dumps(url)
+                data = self.codec.dumps(url)
             headers["Content-Type"] = "application/json"
-            response = self.session.post(
-                f"{self.api}/uploads", data=data, headers=headers
-            )
+            response = self._request("POST", "/uploads", data=data, headers=headers)
         else:
             logger.info(
                 "Neither VCS, or Url or filename option given, not uploading anything"
@@ -207,13 +209,15 @@ class Uploads:
 
         if response.status_code == 201:
             try:
-                upload = self.detail_upload(response.json()["message"], wait_time)
+                upload = self.detail_upload(
+                    self._json(response)["message"], group, wait_time
+                )
                 logger.info(
                     f"Upload {upload.uploadname} ({upload.hash.size}) "
                     f"has been uploaded on {upload.uploaddate}"
                 )
                 return upload
-            except TryAgain:
+            except ServerUnavailableError:
                 description = f"Upload of {source} failed"
                 raise FossologyApiError(description, response)
 
@@ -227,7 +231,7 @@ class Uploads:
             description = f"Upload {description} could not be performed"
             raise FossologyApiError(description, response)
 
-    @retry(retry=retry_if_exception_type(TryAgain), stop=stop_after_attempt(3))
+    @operation
     def upload_summary(self, upload, group=None):
         """Get clearing information about an upload
 
@@ -241,32 +245,27 @@ class Uploads:
         :rtype: Summary
         :raises FossologyApiError: if the REST call failed
         :raises AuthorizationError: if the user can't access the group
+        :raises ServerUnavailableError: if the upload is still not unpacked after all attempts
         """
         headers = {}
         if group:
             headers["groupName"] = group
-        response = self.session.get(
-            f"{self.api}/uploads/{upload.id}/summary", headers=headers
+        response = self._request(
+            "GET", "/uploads/{id}/summary", upload.id, headers=headers
         )
 
         if response.status_code == 200:
-            return Summary.from_json(response.json())
+            return Summary.from_json(self._json(response))
 
         elif response.status_code == 403:
             description = f"Getting summary of upload {upload.id} {get_options(group)}not authorized"
             raise AuthorizationError(description, response)
 
-        elif response.status_code == 503:
-            logger.debug(
-                f"Unpack agent for {upload.uploadname} (id={upload.id}) didn't start yet"
-            )
-            time.sleep(3)
-            raise TryAgain
         else:
             description = f"No summary for upload {upload.uploadname} (id={upload.id})"
             raise FossologyApiError(description, response)
 
-    @retry(retry=retry_if_exception_type(TryAgain), stop=stop_after_attempt(3))
+    @operation
     def upload_licenses(self, upload, group: str = None, agent=None, containers=False):
         """Get clearing information about an upload
 
@@ -286,6 +285,7 @@ class Uploads:
         :rtype: list of Licenses
         :raises FossologyApiError: if the REST call failed
         :raises AuthorizationError: if the user can't access the group
+        :raises ServerUnavailableError: if the upload is still not unpacked after all attempts
         """
         headers = {}
         params = {}
@@ -301,13 +301,13 @@ class Uploads:
         if group:
             headers["groupName"] = group
 
-        response = self.session.get(
-            f"{self.api}/uploads/{upload.id}/licenses", params=params, headers=headers
+        response = self._request(
+            "GET", "/uploads/{id}/licenses", upload.id, params=params, headers=headers
         )
 
         if response.status_code == 200:
             all_licenses = []
-            scanned_files = response.json()
+            scanned_files = self._json(response)
             for file_with_findings in scanned_files:
                 file_licenses = Licenses.from_json(file_with_findings)
                 all_licenses.append(file_licenses)
@@ -321,17 +321,11 @@ class Uploads:
             description = f"Unable to get licenses from {agent} for {upload.uploadname} (id={upload.id})"
             raise FossologyApiError(description, response)
 
-        elif response.status_code == 503:
-            logger.debug(
-                f"Unpack agent for {upload.uploadname} (id={upload.id}) didn't start yet"
-            )
-            time.sleep(3)
-            raise TryAgain
-
         else:
             description = f"No licenses for upload {upload.uploadname} (id={upload.id})"
             raise FossologyApiError(description, response)
 
+    @operation
     def delete_upload(self, upload, group=None):
         """Delete an upload
 
@@ -347,9 +341,7 @@ class Uploads:
         headers = {}
         if group:
             headers["groupName"] = group
-        response = self.session.delete(
-            f"{self.api}/uploads/{upload.id}", headers=headers
-        )
+        response = self._request("DELETE", "/uploads/{id}", upload.id, headers=headers)
 
         if response.status_code == 202:
             logger.info(f"Upload {upload.id} has been scheduled for deletion")
@@ -364,6 +356,7 @@ class Uploads:
             description = f"Unable to delete upload {upload.id}"
             raise FossologyApiError(description, response)
 
+    @operation
     def list_uploads(
         self, folder=None, group=None, recursive=True, page_size=20, page=1
     ):
@@ -395,13 +388,11 @@ class Uploads:
         if not recursive:
             params["recursive"] = "false"
 
-        response = self.session.get(
-            f"{self.api}/uploads", headers=headers, params=params
-        )
+        response = self._request("GET", "/uploads", headers=headers, params=params)
 
         if response.status_code == 200:
             uploads_list = list()
-            for upload in response.json():
+            for upload in self._json(response):
                 uploads_list.append(Upload.from_json(upload))
             logger.info(
                 f"Retrieved page {page} of uploads, {response.headers.get('X-TOTAL-PAGES', 'Unknown')} pages are in total available"
@@ -418,6 +409,29 @@ class Uploads:
             description = "Unable to retrieve the list of uploads"
             raise FossologyApiError(description, response)
 
+    @operation
+    def iter_uploads(self, folder=None, group=None, recursive=True, page_size=100):
+        """Get all uploads available to the registered user, page by page
+
+        API Endpoint: GET /uploads
+
+        The next page is only requested once all uploads of the current page have been
+        consumed. The parameters are the same as for :func:`list_uploads`.
+
+        :return: the uploads
+        :rtype: iterator of Upload
+        :raises FossologyApiError: if the REST call failed
+        :raises AuthorizationError: if the user can't access the group
+        """
+        page = 1
+        while True:
+            uploads = self.list_uploads(folder, group, recursive, page_size, page)
+            yield from uploads
+            if len(uploads) < page_size:
+                return
+            page += 1
+
+    @operation
     def move_upload(self, upload, folder, group=None):
         """Move an upload to another folder
 
@@ -435,9 +449,7 @@ class Uploads:
         headers = {"folderId": str(folder.id)}
         if group:
             headers["groupName"] = group
-        response = self.session.patch(
-            f"{self.api}/uploads/{upload.id}", headers=headers
-        )
+        response = self._request("PATCH", "/uploads/{id}", upload.id, headers=headers)
 
         if response.status_code == 202:
             logger.info(f"Upload {upload.uploadname} has been moved to {folder.name}")
@@ -452,6 +464,7 @@ class Uploads:
             description = f"Unable to move upload {upload.uploadname} to {folder.name}"
             raise FossologyApiError(description, response)
 
+    @operation
     def copy_upload(self, upload, folder):
         """Copy an upload in another folder
 
@@ -464,7 +477,7 @@ class Uploads:
         :raises FossologyApiError: if the REST call failed
         """
         headers = {"folderId": str(folder.id)}
-        response = self.session.put(f"{self.api}/uploads/{upload.id}", headers=headers)
+        response = self._request("PUT", "/uploads/{id}", upload.id, headers=headers)
 
         if response.status_code == 202:
             logger.info(f"Upload {upload.uploadname} has been copied to {folder.name}")
@@ -0,0 +1,121 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import time
+import logging
+from typing import Iterator
+
+from fossology.obj import User
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+class UserDirectory:
+
+    """Index of the users of the Fossology instance
+
+    Users are indexed by id, by name and by email (case insensitive), looking up a user
+    doesn't depend on the number of users.
+
+    :Example:
+
+    >>> foss.user_directory.get(3)
+    >>> foss.user_directory.find("fossy")
+    >>> foss.user_directory.find_email("fossy@example.com")
+
+    :param users: the initial users (default: empty)
+    :type users: iterable of User
+    """
+
+    def __init__(self, users=()):
+        self.by_id = dict()
+        self.by_name = dict()
+        self.by_email = dict()
+        self.listed = None
+        for user in users:
+            self.add(user)
+
+    def __iter__(self) -> Iterator[User]:
+        return iter(list(self.by_id.values()))
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, user) -> bool:
+        return getattr(user, "id", user) in self.by_id
+
+    def add(self, user: User):
+        """Add a user to the directory or replace the user with the same id
+
+        :param user: the user
+        :type user: User
+        """
+        self.remove(user.id)
+        self.by_id[user.id] = user
+        self.by_name[user.name] = user
+        if user.email:
+            self.by_email[user.email.lower()] = user
+
+    def remove(self, user_id: int):
+        """Remove a user from the directory
+
+        :param user_id: the id of the user
+        :type user_id: int
+        """
+        user = self.by_id.pop(user_id, None)
+        if user is None:
+            return
+        if self.by_name.get(user.name) is user:
+            del self.by_name[user.name]
+        if user.email and self.by_email.get(user.email.lower()) is user:
+            del self.by_email[user.email.lower()]
+
+    def replace(self, users):
+        """Replace all the users of the directory with a complete list of users
+
+        :param users: the users
+        :type users: iterable of User
+        """
+        self.by_id = dict()
+        self.by_name = dict()
+        self.by_email = dict()
+        for user in users:
+            self.add(user)
+        self.listed = time.monotonic()
+
+    def is_fresh(self, max_age: float) -> bool:
+        """Check if the list of users was received from the server less than
+        ``max_age`` seconds ago
+
+        :param max_age: the maximum age in seconds, 0 means never fresh
+        :type max_age: float
+        :rtype: bool
+        """
+        if not max_age or self.listed is None:
+            return False
+        return time.monotonic() - self.listed < max_age
+
+    def get(self, user_id: int) -> User:
+        """Get a user by id
+
+        :return: the user - or None
+        :rtype: User
+        """
+        return self.by_id.get(user_id)
+
+    def find(self, name: str) -> User:
+        """Get a user by name
+
+        :return: the user - or None
+        :rtype: User
+        """
+        return self.by_name.get(name)
+
+    def find_email(self, email: str) -> User:
+        """Get a user by email
+
+        :return: the user - or None
+        :rtype: User
+        """
+        return self.by_email.get(email.lower())
@@ -19,6 +19,15 @@ console.setFormatter(formatter)
 logger.addHandler(console)
 
 
+def folder_json(folder: Folder) -> dict:
+    return {
+        "id": folder.id,
+        "name": folder.name,
+        "description": folder.description,
+        "parent": folder.parent,
+    }
+
+
 @pytest.fixture(scope="session")
 def foss_server() -> str:
     return "http://fossology/repo"
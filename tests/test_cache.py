@@ -0,0 +1,187 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import io
+import os
+import json
+import stat
+import sqlite3
+import hashlib
+import responses
+
+from pathlib import Path
+from fossology import Fossology
+from fossology.cache import FindingsCache, ReportCache, atomic_write, file_mode
+from fossology.obj import ReportFormat, Upload
+
+
+def summary(upload_id: int, files_cleared: int) -> dict:
+    return {
+        "id": upload_id,
+        "uploadName": "upload",
+        "mainLicense": "MIT",
+        "uniqueLicenses": 1,
+        "totalLicenses": 10,
+        "uniqueConcludedLicenses": 1,
+        "totalConcludedLicenses": files_cleared,
+        "filesToBeCleared": 10 - files_cleared,
+        "filesCleared": files_cleared,
+        "clearingStatus": "InProgress",
+        "copyrightCount": 3,
+    }
+
+
+def add_report_responses(foss_server: str, upload_id: int, content: bytes):
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report",
+        status=201,
+        json={"message": f"{foss_server}/api/v1/report/{upload_id}"},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/{upload_id}",
+        body=content,
+        headers={"Content-Disposition": f'attachment; filename="report-{upload_id}"'},
+    )
+
+
+@responses.activate
+def test_report_cache(foss_server: str, foss: Fossology, tmp_path: Path):
+    hash = {"sha1": "ABC", "md5": "", "sha256": "", "size": 10}
+    upload = Upload(1, "Folder", 5, "", "upload", "2021-01-01", hash)
+    cache = ReportCache(tmp_path / "cache")
+    summary_url = f"{foss_server}/api/v1/uploads/{upload.id}/summary"
+    responses.add(responses.GET, summary_url, json=summary(upload.id, 5))
+    add_report_responses(foss_server, upload.id, b"first report")
+
+    report_name, size, digest = cache.fetch_report(
+        foss, upload, ReportFormat.SPDX2, tmp_path
+    )
+    assert report_name == f"report-{upload.id}"
+    assert (tmp_path / report_name).read_bytes() == b"first report"
+    assert digest == hashlib.sha256(b"first report").hexdigest()
+    assert len(responses.calls) == 3
+
+    # Unchanged clearing state: the report comes from the cache
+    report_file = io.BytesIO()
+    assert cache.fetch_report(foss, upload, ReportFormat.SPDX2, report_file) == (
+        report_name,
+        size,
+        digest,
+    )
+    assert report_file.getvalue() == b"first report"
+    assert len(responses.calls) == 4
+
+    # Changed clearing state: the report is generated again
+    responses.replace(responses.GET, summary_url, json=summary(upload.id, 6))
+    responses.replace(
+        responses.GET,
+        f"{foss_server}/api/v1/report/{upload.id}",
+        body=b"second report",
+        headers={"Content-Disposition": f'attachment; filename="report-{upload.id}"'},
+    )
+    report_file = io.BytesIO()
+    cache.fetch_report(foss, upload, ReportFormat.SPDX2, report_file)
+    assert report_file.getvalue() == b"second report"
+    assert len(responses.calls) == 7
+
+
+def test_report_cache_eviction(tmp_path: Path):
+    cache = ReportCache(tmp_path, max_size=20)
+    for index in range(3):
+        content = f"report number {index}".encode()
+        report_path = tmp_path / f"report-{index}"
+        report_path.write_bytes(content)
+        cache.put(
+            f"key{index}", report_path, "report", hashlib.sha256(content).hexdigest()
+        )
+    assert not cache.get("key0")
+    assert not cache.get("key1")
+    cached_path, entry = cache.get("key2")
+    assert cached_path.read_bytes() == b"report number 2"
+    assert len(list(cache.objects.iterdir())) == 1
+
+
+def test_atomic_write_mode(tmp_path: Path):
+    umask = os.umask(0o027)
+    try:
+        assert file_mode() == 0o640
+        atomic_write(tmp_path / "file", b"content")
+    finally:
+        os.umask(umask)
+    assert (tmp_path / "file").read_bytes() == b"content"
+    assert stat.S_IMODE((tmp_path / "file").stat().st_mode) == 0o640
+
+
+def test_findings_cache_keeps_tables(tmp_path: Path):
+    connection = sqlite3.connect(str(tmp_path / "cache.db"))
+    with connection:
+        connection.execute("CREATE TABLE findings (name TEXT)")
+        connection.execute("INSERT INTO findings VALUES ('kept')")
+    connection.close()
+
+    FindingsCache(tmp_path / "cache.db")
+    connection = sqlite3.connect(str(tmp_path / "cache.db"))
+    assert connection.execute("SELECT name FROM findings").fetchall() == [("kept",)]
+    connection.close()
+
+
+def test_findings_cache(tmp_path: Path):
+    cache = FindingsCache(tmp_path / "findings.db", ttl=60, negative_ttl=0)
+    hash = {"sha1": "ABC", "md5": "DEF", "sha256": None, "size": 1}
+    result = {"hash": hash, "findings": {"scanner": ["MIT"], "conclusion": []}}
+    server = "http://fossology/repo"
+    cache.store([({"sha1": "abc"}, result), ({"sha1": "unknown"}, None)], server)
+
+    filelist = [{"md5": "def"}, {"sha1": "unknown"}, {"sha256": "123"}]
+    hits, misses = cache.lookup(filelist, server)
+    assert hits == [("def", result)]
+    # Negative entries expire immediately
+    assert misses == filelist[1:]
+
+    # The cache is shared with other connections
+    other_cache = FindingsCache(tmp_path / "findings.db")
+    hits, _ = other_cache.lookup([{"sha1": "ABC"}], server)
+    assert hits == [("ABC", result)]
+
+    # The findings of a group or of a server are not used for another one
+    hits, misses = cache.lookup([{"sha1": "ABC"}], server, group="other")
+    assert not hits
+    hits, misses = cache.lookup([{"sha1": "ABC"}], "http://other/repo")
+    assert not hits
+
+
+@responses.activate
+def test_filesearch_bulk_cache(foss_server: str, foss: Fossology, tmp_path: Path):
+    def filesearch_callback(request):
+        results = list()
+        for item in json.loads(request.body):
+            if item["sha1"] == "KNOWN":
+                hash = {"sha1": "KNOWN", "md5": "", "sha256": "", "size": 1}
+                findings = {"scanner": ["MIT"], "conclusion": ["MIT"]}
+                results.append({"hash": hash, "findings": findings})
+            else:
+                results.append({"hash": item, "message": "Not found"})
+        return (200, {}, json.dumps(results))
+
+    responses.add_callback(
+        responses.POST, f"{foss_server}/api/v1/filesearch", callback=filesearch_callback
+    )
+    cache = FindingsCache(tmp_path / "findings.db")
+    filelist = [{"sha1": "KNOWN"}, {"sha1": "UNKNOWN"}]
+    results = dict(foss.filesearch_bulk(filelist, cache=cache))
+    assert results["KNOWN"].findings.conclusion == ["MIT"]
+    assert results["UNKNOWN"] is None
+    assert len(responses.calls) == 1
+
+    filelist.append({"sha1": "NEW"})
+    results = dict(foss.filesearch_bulk(filelist, cache=cache))
+    assert results["KNOWN"].findings.conclusion == ["MIT"]
+    assert results["UNKNOWN"] is None
+    assert results["NEW"] is None
+    assert len(responses.calls) == 2
+    assert json.loads(responses.calls[1].request.body) == [{"sha1": "NEW"}]
+
+    results = dict(foss.filesearch_bulk(filelist[:1], group="other", cache=cache))
+    assert len(responses.calls) == 3
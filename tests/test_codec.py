@@ -0,0 +1,70 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import json
+import pytest
+import responses
+
+from fossology import Fossology
+from fossology.codec import JsonCodec, OrjsonCodec, default_codec
+
+
+class CountingCodec(JsonCodec):
+    def __init__(self):
+        self.decoded = 0
+        self.encoded = 0
+
+    def loads(self, data):
+        self.decoded += 1
+        return super().loads(data)
+
+    def dumps(self, obj):
+        self.encoded += 1
+        return super().dumps(obj)
+
+
+def test_default_codec():
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        assert not isinstance(default_codec(), OrjsonCodec)
+    else:
+        assert isinstance(default_codec(), OrjsonCodec)
+
+
+@pytest.mark.parametrize("codec", [JsonCodec(), default_codec()])
+def test_codec_round_trip(codec: JsonCodec):
+    obj = [{"sha1": "ABC", "size": 1, "name": "café"}, None]
+    assert codec.loads(codec.dumps(obj)) == obj
+    assert codec.loads(json.dumps(obj).encode()) == obj
+    with pytest.raises(ValueError):
+        codec.loads(b"<html>Bad gateway</html>")
+
+
+@pytest.mark.parametrize("codec", [JsonCodec(), default_codec()])
+def test_codec_non_str_keys(codec: JsonCodec):
+    assert json.loads(codec.dumps({1: "a", None: "b"})) == {"1": "a", "null": "b"}
+
+
+@responses.activate
+def test_client_codec(foss_server: str, foss: Fossology):
+    codec = CountingCodec()
+    foss.codec = codec
+
+    def filesearch_callback(request):
+        assert request.headers["Content-Type"] == "application/json"
+        hash = dict(json.loads(request.body)[0], md5="", sha256="", size=1)
+        findings = {"scanner": ["MIT"], "conclusion": []}
+        return (200, {}, json.dumps([{"hash": hash, "findings": findings}]))
+
+    responses.add_callback(
+        responses.POST, f"{foss_server}/api/v1/filesearch", callback=filesearch_callback
+    )
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/version", json={"version": "1.0.16"}
+    )
+    files = foss.filesearch(filelist=[{"sha1": "ABC"}])
+    assert files[0].hash.sha1 == "ABC"
+    assert foss.get_version() == "1.0.16"
+    assert codec.encoded == 1
+    assert codec.decoded == 2
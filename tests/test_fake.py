@@ -0,0 +1,246 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import time
+
+import pytest
+import requests
+
+from fossology import Fossology
+from fossology.exceptions import AuthorizationError, FossologyApiError
+from fossology.fake import FakeFossology, VirtualClock
+from fossology.obj import ReportFormat, SearchTypes
+from fossology.transport import RetryPolicy
+
+
+@pytest.fixture
+def fake_server() -> FakeFossology:
+    server = FakeFossology()
+    server.add_users(3)
+    server.add_folders(2)
+    server.add_uploads(25, files=30)
+    return server
+
+
+@pytest.fixture
+def fake_foss(fake_server: FakeFossology) -> Fossology:
+    return Fossology(fake_server.url, fake_server.token, "fossy", transport=fake_server)
+
+
+def test_fake_startup(fake_server: FakeFossology, fake_foss: Fossology):
+    assert fake_foss.version == "1.2.0"
+    assert fake_foss.user.name == "fossy"
+    assert fake_foss.rootFolder.name == "Software Repository"
+    assert len(fake_foss.folders) == 3
+    assert fake_server.requests == 4
+
+
+def test_fake_uploads(fake_server: FakeFossology, fake_foss: Fossology, tmp_path):
+    assert len(list(fake_foss.iter_uploads(page_size=10))) == 25
+    assert len(fake_foss.list_uploads(page_size=10, page=3)) == 5
+
+    package = tmp_path / "package.zip"
+    package.write_bytes(b"content")
+    upload = fake_foss.upload_file(fake_foss.rootFolder, file=str(package))
+    assert upload.uploadname == "package.zip"
+    assert upload.foldername == "Software Repository"
+
+    licenses = fake_foss.upload_licenses(fake_foss.detail_upload(upload.id - 1))
+    assert len(licenses) == 30
+    assert licenses[0].findings.scanner
+
+
+def test_fake_filesearch(fake_server: FakeFossology, fake_foss: Fossology):
+    known = fake_server.add_files(3)
+    filelist = [{"sha1": sha1} for sha1 in known + ["UNKNOWN"]]
+    results = dict(fake_foss.filesearch_bulk(filelist, batch_size=2))
+    assert results["UNKNOWN"] is None
+    assert all(results[sha1].hash.sha1 == sha1 for sha1 in known)
+
+
+def test_fake_report_and_jobs(
+    fake_server: FakeFossology, fake_foss: Fossology, tmp_path
+):
+    upload = fake_foss.detail_upload(fake_server.add_upload("report.zip")["id"])
+    name, size, _ = fake_foss.fetch_report(upload, ReportFormat.DEP5, tmp_path)
+    assert (tmp_path / name).stat().st_size == size == fake_server.report_size
+
+    job = fake_server.add_job(upload.id, polls=1)
+    assert fake_foss.detail_job(job["id"]).status == "Processing"
+    assert fake_foss.detail_job(job["id"]).status == "Completed"
+    job = fake_foss.schedule_jobs(fake_foss.rootFolder, upload, {"analysis": {}})
+    assert job.uploadId == upload.id
+    assert len(fake_foss.list_jobs(upload=upload)) == 2
+
+
+@pytest.fixture
+def clock(monkeypatch) -> VirtualClock:
+    clock = VirtualClock()
+    monkeypatch.setattr(time, "sleep", clock.sleep)
+    return clock
+
+
+def test_fake_unpacking(clock: VirtualClock, tmp_path):
+    server = FakeFossology(clock=clock)
+    server.unpack_time = 25
+    foss = Fossology(server.url, server.token, "fossy", transport=server)
+    package = tmp_path / "package.zip"
+    package.write_bytes(b"content")
+    upload = foss.upload_file(foss.rootFolder, file=str(package))
+    assert upload.hash.size == len(package.read_bytes())
+    assert server.calls["GET /uploads/{id}"] == 2
+    assert clock() == 25
+
+    upload_json = server.add_upload("late.zip", unpack_time=10)
+    response = server.send(
+        "GET",
+        f"{server.api}/uploads/{upload_json['id']}/summary",
+        headers={"Authorization": f"Bearer {server.token}"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "10"
+    assert foss.upload_summary(foss.detail_upload(upload_json["id"])).filesCleared
+
+
+def test_fake_job_progression(clock: VirtualClock):
+    server = FakeFossology(clock=clock)
+    server.job_queue_time = 5
+    server.job_time = 20
+    foss = Fossology(server.url, server.token, "fossy", transport=server)
+    upload = foss.detail_upload(server.add_upload("jobs.zip")["id"])
+    job = foss.schedule_jobs(foss.rootFolder, upload, {"analysis": {}})
+    assert job.status == "Queued"
+    clock.sleep(10)
+    job = foss.detail_job(job.id)
+    assert (job.status, job.eta) == ("Processing", 15)
+    assert foss.detail_job(job.id, wait=True, timeout=15).status == "Completed"
+
+
+def test_fake_report_delay(clock: VirtualClock, tmp_path):
+    server = FakeFossology(clock=clock)
+    server.report_time = 12
+    foss = Fossology(server.url, server.token, "fossy", transport=server)
+    upload = foss.detail_upload(server.add_upload("report.zip")["id"])
+    name, size, _ = foss.fetch_report(upload, ReportFormat.SPDX2, tmp_path)
+    assert size == server.report_size
+    assert clock() >= 12
+    assert server.calls["GET /report/{id}"] >= 2
+
+
+def test_fake_failure_injection(clock: VirtualClock):
+    server = FakeFossology(clock=clock)
+    policy = RetryPolicy(attempts=3, statuses=(503,))
+    foss = Fossology(
+        server.url, server.token, "fossy", transport=server, retry_policy=policy
+    )
+    server.fail(2, status=503, endpoint="GET /version", retry_after=4)
+    assert foss.get_version() == "1.2.0"
+    assert clock() == 8
+
+    server.fail(1, status=502)
+    with pytest.raises(FossologyApiError):
+        foss.get_version()
+
+    server.fail(2, status=None, endpoint="GET /version")
+    assert foss.get_version() == "1.2.0"
+    assert server.calls["GET /version"] == 8
+
+    server.failure_rate = 1
+    server.failure_status = None
+    with pytest.raises(requests.exceptions.ConnectionError):
+        foss.get_version()
+    with pytest.raises(ValueError):
+        server.fail(0)
+
+
+def test_fake_latency(fake_server: FakeFossology, fake_foss: Fossology):
+    fake_server.latency = (0.01, 0.02)
+    filelist = [{"sha1": sha1} for sha1 in fake_server.add_files(40)]
+    results = dict(fake_foss.filesearch_bulk(filelist, batch_size=5, workers=4))
+    assert len(results) == 40
+    assert fake_server.max_in_flight > 1
+
+
+def test_fake_folders(fake_server: FakeFossology, fake_foss: Fossology):
+    parent = fake_foss.create_folder(fake_foss.rootFolder, "parent")
+    child = fake_foss.create_folder(parent, "child")
+    assert fake_foss.create_folder(parent, "child").id == child.id
+    fake_server.add_uploads(3, folder=child.id)
+    assert len(list(fake_foss.iter_uploads(folder=parent))) == 3
+    assert not list(fake_foss.iter_uploads(folder=parent, recursive=False))
+
+    assert fake_foss.update_folder(child, name="renamed").name == "renamed"
+    with pytest.raises(FossologyApiError):
+        fake_foss.move_folder(parent, child)
+    fake_foss.copy_folder(parent, fake_foss.rootFolder)
+    names = [folder["name"] for folder in fake_server.folders.values()]
+    assert names.count("parent") == names.count("renamed") == 2
+
+    fake_foss.delete_folder(parent)
+    assert parent.id not in fake_server.folders
+    assert child.id not in fake_server.folders
+    assert len(fake_server.uploads) == 25
+
+
+def test_fake_search(fake_server: FakeFossology, fake_foss: Fossology):
+    upload = fake_foss.detail_upload(fake_server.add_upload("s.zip", files=200)["id"])
+    results = fake_foss.search(upload=upload, filename="file-1%.c")
+    assert len(results) == 111
+    results = fake_foss.search(upload=upload, filesizemin=50000)
+    assert all(
+        fake_server.tree(upload.id)[r["uploadTreeId"] % 10 ** 7 - 1]["size"] >= 50000
+        for r in results
+    )
+    results = fake_foss.search(SearchTypes.DIRECTORIES, upload=upload)
+    assert [r["filename"] for r in results] == ["dir-0", "dir-1"]
+    assert len(fake_foss.search(SearchTypes.CONTAINERS)) == 26
+    assert fake_foss.search(upload=upload, tag="any") == []
+
+
+def test_fake_users_and_tokens(fake_server: FakeFossology, fake_foss: Fossology):
+    user = fake_foss.detail_user(fake_server.add_user("alice", "secret")["id"])
+    response = fake_server.send(
+        "POST",
+        f"{fake_server.api}/tokens",
+        data={"username": "alice", "password": "secret", "token_name": "test"},
+    )
+    assert response.status_code == 201
+    token = response.json()["Authorization"].replace("Bearer ", "")
+    alice = Fossology(fake_server.url, token, "alice", transport=fake_server)
+    assert alice.user.name == "alice"
+
+    fake_foss.delete_user(user)
+    assert user.id not in fake_server.users
+    with pytest.raises(FossologyApiError) as excinfo:
+        alice.get_version()
+    assert "(403)" in excinfo.value.message
+    response = fake_server.send(
+        "POST",
+        f"{fake_server.api}/tokens",
+        data={"username": "alice", "password": "secret", "token_name": "test"},
+    )
+    assert response.status_code == 404
+
+    with pytest.raises(AuthorizationError):
+        fake_foss.detail_upload(1, group="unknown")
+    with pytest.raises(FossologyApiError) as excinfo:
+        Fossology(fake_server.url, "invalid", "fossy", transport=fake_server)
+    assert "Invalid token (403)" in excinfo.value.message
+
+
+def test_benchmark_suite():
+    from benchmarks.suite import BENCHMARKS, compare, run_suite
+
+    results = run_suite(scale=0.0001, repeat=1)
+    assert set(results["benchmarks"]) == set(BENCHMARKS)
+    assert results["benchmarks"]["pagination"]["items"] == 10
+    assert compare(results, results) == []
+
+    # Runs with another dataset or in another environment can't be compared
+    other = dict(results, environment=dict(results["environment"], codec="other"))
+    with pytest.raises(ValueError, match="codec"):
+        compare(results, other)
+    with pytest.raises(ValueError, match="datasets"):
+        compare(results, dict(results, dataset={}))
+    with pytest.raises(ValueError):
+        run_suite(scale=0.0001, repeat=0)
@@ -1,14 +1,18 @@
 # Copyright 2019-2021 Siemens AG
 # SPDX-License-Identifier: MIT
 
+import json
 import time
 import pytest
 import secrets
+import threading
 import responses
 
 from fossology import Fossology
+from fossology.folders import FolderTree
 from fossology.obj import Folder
 from fossology.exceptions import AuthorizationError, FossologyApiError
+from tests.conftest import folder_json
 
 
 @responses.activate
@@ -145,3 +149,269 @@ def test_delete_folder_error(foss_server: str, foss: Fossology):
     with pytest.raises(FossologyApiError) as excinfo:
         foss.delete_folder(folder)
     assert f"Unable to delete folder {folder.id}" in str(excinfo.value)
+
+
+def test_folder_tree():
+    root = Folder(1, "Software Repository", "", None)
+    products = Folder(2, "Products", "", 1)
+    foo = Folder(3, "Foo", "", 2)
+    other_foo = Folder(4, "Foo", "", 1)
+    tree = FolderTree([root, products, foo, other_foo])
+    assert len(tree) == 4
+    assert tree.find(2, "Foo") is foo
+    assert tree.find(1, "Foo") is other_foo
+    assert tree.find_path("Products/Foo", 1) is foo
+    assert tree.find_path("Products/Bar", 1) is None
+    assert tree.path(foo) == "Software Repository/Products/Foo"
+    assert tree.subfolders(1) == [products, other_foo]
+
+    # Renaming or moving a folder updates the indexes
+    tree.add(Folder(3, "Bar", "", 1))
+    assert tree.find(2, "Foo") is None
+    assert tree.find(1, "Bar").id == 3
+
+    removed = tree.remove(2)
+    assert [folder.id for folder in removed] == [2]
+    assert 2 not in tree
+    assert tree.find(1, "Products") is None
+
+    # The list API is kept for reading, remove() also accepts a folder
+    assert tree[0] is root
+    assert tree.remove(other_foo) == [other_foo]
+
+
+def test_folder_tree_threads():
+    tree = FolderTree([Folder(1, "Software Repository", "", None)])
+
+    def add_folders(parent):
+        for index in range(200):
+            folder = Folder(parent * 1000 + index, f"Folder {index}", "", parent)
+            tree.add(folder)
+            tree.remove(folder.id - 1)
+
+    threads = [threading.Thread(target=add_folders, args=(i,)) for i in range(2, 6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(tree) == 5
+    assert sum(len(tree.subfolders(parent)) for parent in range(2, 6)) == 4
+
+
+@responses.activate
+def test_create_existing_folder(foss_server: str, foss: Fossology):
+    parent = Folder(secrets.randbelow(1000) + 1000, "Parent", "", foss.rootFolder.id)
+    same_name = Folder(parent.id + 1, "Existing", "", foss.rootFolder.id)
+    existing = Folder(parent.id + 2, "Existing", "", parent.id)
+    for folder in (parent, same_name, existing):
+        foss.folders.add(folder)
+    responses.add(
+        responses.POST,
+        f"{foss_server}/api/v1/folders",
+        status=200,
+        json={"message": "Folder already exists"},
+    )
+    assert foss.create_folder(parent, "Existing") is existing
+    for folder in (parent, same_name, existing):
+        foss.folders.remove(folder.id)
+
+
+@responses.activate
+def test_resolve_folder(foss_server: str, foss: Fossology):
+    products = Folder(
+        secrets.randbelow(1000) + 1000, "Products", "", foss.rootFolder.id
+    )
+    foss.folders.add(products)
+    new_ids = iter([products.id + 1, products.id + 2])
+    server_folders = list(foss.folders)
+
+    def create(request):
+        folder = Folder(
+            next(new_ids),
+            request.headers["folderName"],
+            "",
+            int(request.headers["parentFolder"]),
+        )
+        server_folders.append(folder)
+        return (201, {}, json.dumps({"message": folder.id}))
+
+    def folder_list(request):
+        return (200, {}, json.dumps([folder_json(folder) for folder in server_folders]))
+
+    responses.add_callback(
+        responses.POST, f"{foss_server}/api/v1/folders", callback=create
+    )
+    responses.add_callback(
+        responses.GET, f"{foss_server}/api/v1/folders", callback=folder_list
+    )
+
+    assert foss.resolve_folder("Products") is products
+    assert foss.resolve_folder("Products/Foo/2024", create=False) is None
+    assert not responses.calls
+
+    folder = foss.resolve_folder("/Products/Foo/2024/")
+    assert folder.id == products.id + 2
+    assert folder.parent == products.id + 1
+    assert foss.folders.path(folder).endswith("Products/Foo/2024")
+    # Only the missing folders are created, without receiving the folder list again
+    assert [call.request.method for call in responses.calls] == ["POST", "POST"]
+    assert foss.folders.get(products.id + 1).name == "Foo"
+    foss.folders.remove(products.id)
+
+
+@responses.activate
+def test_folder_cache(foss_server: str, foss: Fossology):
+    parent = Folder(secrets.randbelow(1000) + 1000, "Parent", "", foss.rootFolder.id)
+    folder = Folder(parent.id + 1, "Cached", "", parent.id)
+    server_folders = list(foss.folders) + [parent, folder]
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/folders",
+        json=[folder_json(f) for f in server_folders],
+    )
+    for method in (responses.PATCH, responses.PUT):
+        responses.add(method, f"{foss_server}/api/v1/folders/{folder.id}", status=202)
+    responses.replace(
+        responses.PATCH, f"{foss_server}/api/v1/folders/{folder.id}", status=200
+    )
+    foss.folder_cache_ttl = 60
+    stats = dict(foss.folder_cache_stats)
+    try:
+        foss.list_folders(max_age=0)
+        foss.list_folders()
+        assert foss.detail_folder(folder.id).name == "Cached"
+        assert len(responses.calls) == 1
+
+        # Mutations update the cached folder without fetching its details again
+        updated = foss.update_folder(folder, name="Renamed")
+        assert updated.name == "Renamed"
+        assert foss.folders.find(parent.id, "Renamed") is updated
+        moved = foss.move_folder(updated, foss.rootFolder)
+        assert moved.parent == foss.rootFolder.id
+        assert foss.folders.find(foss.rootFolder.id, "Renamed") is moved
+        assert len(responses.calls) == 3
+
+        # A copy adds an unknown folder, the list is fetched again
+        foss.copy_folder(moved, parent)
+        foss.list_folders()
+        assert len(responses.calls) == 5
+        assert foss.folder_cache_stats["hits"] - stats["hits"] == 5
+        # The forced refresh of the first list isn't counted
+        assert foss.folder_cache_stats["misses"] - stats["misses"] == 1
+
+        # Without cache, no hit or miss is counted
+        foss.folder_cache_ttl = 0
+        stats = dict(foss.folder_cache_stats)
+        foss.list_folders()
+        assert foss.folder_cache_stats == stats
+    finally:
+        foss.folder_cache_ttl = 0
+        foss.folders.remove(parent.id)
+        foss.folders.remove(folder.id)
+
+
+def mock_subtree(foss_server: str, foss: Fossology):
+    top = Folder(secrets.randbelow(1000) + 1000, "Product", "", foss.rootFolder.id)
+    branch = Folder(top.id + 1, "Branch", "", top.id)
+    other = Folder(top.id + 2, "Other", "", top.id)
+    leaf = Folder(top.id + 3, "Leaf", "", branch.id)
+    server_folders = list(foss.folders) + [top, branch, other, leaf]
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/folders",
+        json=[folder_json(f) for f in server_folders],
+    )
+    return top, branch, other, leaf
+
+
+@responses.activate
+def test_delete_folder_tree(foss_server: str, foss: Fossology):
+    top, branch, other, leaf = mock_subtree(foss_server, foss)
+    assert [f.id for f in foss.walk_folder(top)] == [
+        top.id,
+        branch.id,
+        other.id,
+        leaf.id,
+    ]
+    for folder in (top, branch, leaf):
+        responses.add(
+            responses.DELETE, f"{foss_server}/api/v1/folders/{folder.id}", status=202
+        )
+    responses.add(
+        responses.DELETE, f"{foss_server}/api/v1/folders/{other.id}", status=500
+    )
+    errors = dict()
+    deleted = foss.delete_folder_tree(top, workers=2, errors=errors)
+    assert {f.id for f in deleted} == {branch.id, leaf.id}
+    assert list(errors) == [other.id]
+    # The parent of a folder which couldn't be deleted is kept
+    assert top in foss.folders
+    deletions = [
+        call.request.url.rsplit("/", 1)[1]
+        for call in responses.calls
+        if call.request.method == "DELETE"
+    ]
+    assert str(top.id) not in deletions
+    assert deletions.index(str(leaf.id)) < deletions.index(str(branch.id))
+
+    with pytest.raises(FossologyApiError):
+        foss.delete_folder_tree(top)
+    foss.folders.remove(top.id)
+
+
+@responses.activate
+def test_folder_tree_uploads(foss_server: str, foss: Fossology):
+    top, branch, other, leaf = mock_subtree(foss_server, foss)
+    uploads = [
+        {
+            "folderid": folder.id,
+            "foldername": folder.name,
+            "id": upload_id,
+            "description": "",
+            "uploadname": f"upload-{upload_id}.zip",
+            "uploaddate": "2021-01-01",
+            "hash": {"sha1": "", "md5": "", "sha256": "", "size": 1000},
+        }
+        for upload_id, folder in enumerate((top, leaf, leaf), start=1)
+    ]
+    responses.add(responses.GET, f"{foss_server}/api/v1/uploads", json=uploads)
+    stats = foss.folder_tree_stats(top)
+    assert (stats["folders"], stats["uploads"], stats["size"]) == (4, 3, 3000)
+    assert stats["by_folder"][leaf.id] == {"uploads": 2, "size": 2000}
+    assert stats["by_folder"][other.id] == {"uploads": 0, "size": 0}
+
+    for upload_id in (1, 2, 3):
+        responses.add(
+            responses.PATCH, f"{foss_server}/api/v1/uploads/{upload_id}", status=202
+        )
+    new_ids = iter(range(top.id + 10, top.id + 20))
+    responses.add_callback(
+        responses.POST,
+        f"{foss_server}/api/v1/folders",
+        callback=lambda request: (201, {}, json.dumps({"message": next(new_ids)})),
+    )
+    destination = Folder(top.id + 5, "Archive", "", foss.rootFolder.id)
+    moved = foss.move_folder_uploads(top, destination, workers=2)
+    assert [upload.id for upload in moved] == [1, 2, 3]
+    # The uploads of the leaf folder are moved to Archive/Branch/Leaf
+    archived_branch = foss.folders.find(destination.id, "Branch")
+    archived_leaf = foss.folders.find(archived_branch.id, "Leaf")
+    assert archived_leaf.id == top.id + 11
+    targets = {
+        call.request.url.rsplit("/", 1)[1]: call.request.headers["folderId"]
+        for call in responses.calls
+        if call.request.method == "PATCH"
+    }
+    assert targets == {
+        "1": str(destination.id),
+        "2": str(archived_leaf.id),
+        "3": str(archived_leaf.id),
+    }
+
+    responses.calls.reset()
+    foss.move_folder_uploads(top, destination, workers=2, flatten=True)
+    assert {call.request.headers["folderId"] for call in responses.calls[1:]} == {
+        str(destination.id)
+    }
+    foss.folders.remove(top.id)
+    foss.folders.remove(archived_branch.id)
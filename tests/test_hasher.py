@@ -0,0 +1,111 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import json
+import pytest
+import hashlib
+import tarfile
+import zipfile
+
+from pathlib import Path
+from fossology import hasher
+from fossology.hasher import filesearch_list, hash_file, hash_tree
+
+
+def test_hash_file(tmp_path: Path):
+    content = b"fossology" * 1024 * 1024
+    (tmp_path / "large").write_bytes(content)
+    (tmp_path / "empty").write_bytes(b"")
+    hashes = hash_file(tmp_path / "large")
+    assert hashes["sha1"] == hashlib.sha1(content).hexdigest().upper()
+    assert hashes["md5"] == hashlib.md5(content).hexdigest().upper()
+    assert hashes["sha256"] == hashlib.sha256(content).hexdigest().upper()
+    assert hashes["size"] == len(content)
+    assert hash_file(tmp_path / "empty")["size"] == 0
+
+
+def test_hash_tree_manifest(tmp_path: Path):
+    tree = tmp_path / "tree"
+    (tree / "sub").mkdir(parents=True)
+    (tree / "a.txt").write_text("a")
+    (tree / "sub" / "b.txt").write_text("b")
+    (tree / "sub" / "copy.txt").write_text("b")
+    manifest = tmp_path / "manifest.json"
+
+    hashes = hash_tree(tree, manifest=manifest, workers=2)
+    assert set(hashes) == {"a.txt", "sub/b.txt", "sub/copy.txt"}
+    assert hashes["a.txt"]["sha1"] == hashlib.sha1(b"a").hexdigest().upper()
+    assert len(filesearch_list(hashes)) == 2
+
+    # Unchanged files are taken from the manifest
+    previous = json.loads(manifest.read_text())
+    previous["a.txt"]["sha1"] = "FROM-MANIFEST"
+    manifest.write_text(json.dumps(previous))
+    (tree / "sub" / "b.txt").write_text("changed")
+    hashes = hash_tree(tree, manifest=manifest)
+    assert hashes["a.txt"]["sha1"] == "FROM-MANIFEST"
+    assert hashes["sub/b.txt"]["sha1"] == hashlib.sha1(b"changed").hexdigest().upper()
+
+
+def test_hash_archive():
+    hashes = hash_tree("tests/files/base-files_11.tar.xz")
+    assert hashes
+    assert all(len(file_hashes["sha1"]) == 40 for file_hashes in hashes.values())
+
+
+def test_hash_archive_errors(tmp_path: Path):
+    archive_path = tmp_path / "archive.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        for index in range(5):
+            archive.writestr(f"good-{index}.txt", f"good {index}")
+        archive.writestr("bad.txt", "unreadable content")
+    # Corrupt the content of one file, its CRC doesn't match anymore
+    content = archive_path.read_bytes()
+    archive_path.write_bytes(content.replace(b"unreadable", b"UNREADABLE"))
+
+    errors = dict()
+    hashes = hash_tree(archive_path, workers=2, errors=errors)
+    assert set(hashes) == {f"good-{index}.txt" for index in range(5)}
+    assert hashes["good-0.txt"]["sha1"] == hashlib.sha1(b"good 0").hexdigest().upper()
+    assert list(errors) == ["bad.txt"]
+    assert isinstance(errors["bad.txt"], zipfile.BadZipFile)
+
+    with pytest.raises(zipfile.BadZipFile):
+        hash_tree(archive_path, workers=2)
+    with pytest.raises(ValueError):
+        hash_tree(__file__)
+
+
+def test_hash_tar_batches(tmp_path: Path, monkeypatch):
+    contents = {f"file-{index}.txt": b"x" * index * 10 for index in range(8)}
+    contents["large.bin"] = b"large" * 100
+    archive_path = tmp_path / "archive.tar.gz"
+    with tarfile.open(archive_path, "w:gz") as archive:
+        for name, content in contents.items():
+            (tmp_path / name).write_bytes(content)
+            archive.add(tmp_path / name, arcname=name)
+    # Small batches, the large file is hashed while reading the archive
+    monkeypatch.setattr(hasher, "ARCHIVE_BATCH_SIZE", 100)
+
+    hashes = hash_tree(archive_path, workers=2)
+    assert set(hashes) == set(contents)
+    for name in contents:
+        assert hashes[name] == hash_file(tmp_path / name)
+
+
+def test_hash_tree_errors(tmp_path: Path):
+    (tmp_path / "a.txt").write_text("a")
+    entries = [
+        ("a.txt", str(tmp_path / "a.txt"), 1),
+        ("gone.txt", str(tmp_path / "gone.txt"), 1),
+    ]
+    hashes, errors = hasher._hash_files(entries)
+    assert list(hashes) == ["a.txt"]
+    assert hashes["a.txt"]["mtime"] == 1
+    assert isinstance(errors["gone.txt"], FileNotFoundError)
+
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text("{}")
+    with pytest.raises(FileNotFoundError):
+        hash_tree(tmp_path / "missing", manifest=manifest)
+    assert manifest.read_text() == "{}"
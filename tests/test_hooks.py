@@ -0,0 +1,127 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import pytest
+import responses
+
+from fossology import Fossology
+from fossology.obj import Upload
+from fossology.transport import HOOK_EVENTS, RetryPolicy
+
+
+@responses.activate
+def test_hooks(foss_server: str, foss: Fossology):
+    upload = {
+        "folderid": 1,
+        "foldername": "Software Repository",
+        "id": 7,
+        "description": "",
+        "uploadname": "hooks.zip",
+        "uploaddate": "2021-01-01",
+        "hash": {"sha1": "", "md5": "", "sha256": "", "size": 0},
+    }
+    responses.add(
+        responses.POST, f"{foss_server}/api/v1/uploads", status=201, json={"message": 7}
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/uploads/7",
+        status=503,
+        headers={"Retry-After": "0"},
+        json={"message": "Ununpack job not started"},
+    )
+    responses.add(responses.GET, f"{foss_server}/api/v1/uploads/7", json=upload)
+    responses.add(responses.GET, f"{foss_server}/api/v1/version", status=502)
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/version", json={"version": "1.0.16"}
+    )
+
+    events = list()
+
+    def record(name):
+        def hook(event):
+            events.append((name, event))
+            if name == "before_request":
+                event.data["span"] = event.endpoint
+
+        return hook
+
+    hooks = {name: record(name) for name in HOOK_EVENTS}
+    for name, hook in hooks.items():
+        foss.add_hook(name, hook)
+    foss.add_hook("after_response", lambda event: 1 / 0)
+    foss.retry_policy = RetryPolicy(attempts=2, backoff=0)
+    try:
+        foss.upload_file(foss.rootFolder, file=__file__)
+        foss.get_version()
+    finally:
+        foss.retry_policy = RetryPolicy()
+        foss.hooks.clear()
+
+    requests = [event for name, event in events if name == "after_response"]
+    assert [(event.operation, event.endpoint) for event in requests] == [
+        ("upload_file", "POST /uploads"),
+        ("upload_file", "GET /uploads/{id}"),
+        ("upload_file", "GET /uploads/{id}"),
+        ("get_version", "GET /version"),
+        ("get_version", "GET /version"),
+    ]
+    assert all(event.data["span"] == event.endpoint for event in requests)
+    assert all(event.elapsed >= 0 for event in requests)
+    sleeps = [event for name, event in events if name == "on_sleep"]
+    assert [(event.operation, event.endpoint) for event in sleeps] == [
+        ("upload_file", "GET /uploads/{id}"),
+        ("get_version", "GET /version"),
+    ]
+    retries = [event for name, event in events if name == "on_retry"]
+    assert [(event.endpoint, event.attempt) for event in retries] == [
+        ("GET /uploads/{id}", 1),
+        ("GET /version", 1),
+    ]
+
+    with pytest.raises(ValueError):
+        foss.add_hook("on_error", print)
+
+
+@responses.activate
+def test_hooks_operation_threads(foss_server: str, foss: Fossology):
+    search_result = {
+        "uploadId": 1,
+        "uploadTreeId": 1,
+        "filename": "file.c",
+        "upload": {
+            "folderid": 1,
+            "foldername": "Software Repository",
+            "id": 1,
+            "description": "",
+            "uploadname": "upload.zip",
+            "uploaddate": "2021-01-01",
+            "hash": {"sha1": "", "md5": "", "sha256": "", "size": 0},
+        },
+    }
+    responses.add(responses.GET, f"{foss_server}/api/v1/search", json=[search_result])
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": ""}
+    uploads = [
+        Upload(1, "Folder", upload_id, "", f"upload-{upload_id}", "2021-01-01", hash)
+        for upload_id in range(1, 5)
+    ]
+    operations = list()
+    hook = lambda event: operations.append(event.operation)  # noqa: E731
+    foss.add_hook("before_request", hook)
+    try:
+        # The requests sent by worker threads keep the operation of the caller
+        assert len(list(foss.search_uploads(uploads, workers=2))) == 4
+        assert operations == ["search_uploads"] * 4
+        # The operation of a generator is only set while it produces the items
+        operations.clear()
+        for _ in foss.iter_search(filename="file%", page_size=10):
+            assert getattr(foss.hook_local, "operation", None) is None
+        assert operations == ["iter_search"]
+    finally:
+        foss.remove_hook("before_request", hook)
+
+
+def test_remove_hook(foss: Fossology):
+    foss.add_hook("on_sleep", print)
+    foss.remove_hook("on_sleep", print)
+    assert not foss.hooks
@@ -0,0 +1,98 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import responses
+
+from unittest import mock
+
+from fossology import Fossology
+from fossology.httpcache import HttpCache
+from fossology.obj import Folder, Upload
+
+
+@responses.activate
+def test_http_cache(foss_server: str, foss: Fossology):
+    upload = {
+        "folderid": 1,
+        "foldername": "Software Repository",
+        "id": 5,
+        "description": "",
+        "uploadname": "cached.zip",
+        "uploaddate": "2021-01-01",
+        "hash": {"sha1": "", "md5": "", "sha256": "", "size": 0},
+    }
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/version", json={"version": "1.0.16"}
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/uploads/5",
+        json=upload,
+        headers={"ETag": '"v1"'},
+    )
+    responses.add(responses.GET, f"{foss_server}/api/v1/uploads/5", status=304)
+    job = {
+        "id": 9,
+        "name": "job",
+        "queueDate": "",
+        "uploadId": 5,
+        "userId": 2,
+        "groupId": 2,
+        "eta": 0,
+        "status": "Processing",
+    }
+    responses.add(responses.GET, f"{foss_server}/api/v1/jobs/9", json=job)
+
+    cache = HttpCache()
+    foss.http_cache = cache
+    try:
+        # Responses without validators are reused during the TTL of the endpoint
+        assert foss.get_version() == foss.get_version() == "1.0.16"
+        assert len(responses.calls) == 1
+
+        # Responses with validators are revalidated, the stored result is reused
+        first = foss.detail_upload(5)
+        with mock.patch.object(
+            Upload, "from_json", side_effect=AssertionError("decoded")
+        ):
+            second = foss.detail_upload(5)
+        assert second is first
+        assert second.uploadname == "cached.zip"
+        assert responses.calls[2].request.headers["If-None-Match"] == '"v1"'
+
+        # Responses which can't be reused are not stored
+        foss.detail_job(9)
+        foss.detail_job(9)
+        assert len(responses.calls) == 5
+        assert cache.stats == {"hits": 1, "revalidated": 1, "misses": 4}
+    finally:
+        foss.http_cache = None
+
+
+@responses.activate
+def test_http_cache_lists(foss_server: str, foss: Fossology):
+    folders = [
+        {"id": 1, "name": "Software Repository", "description": "", "parent": None},
+        {"id": 2, "name": "cached", "description": "", "parent": 1},
+    ]
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/folders",
+        json=folders,
+        headers={"ETag": '"v1"'},
+    )
+    responses.add(responses.GET, f"{foss_server}/api/v1/folders", status=304)
+
+    foss.http_cache = HttpCache()
+    try:
+        first = foss.list_folders(max_age=0)
+        first.append(Folder(3, "added", "", 1))
+        with mock.patch.object(
+            Folder, "from_json", side_effect=AssertionError("decoded")
+        ):
+            second = foss.list_folders(max_age=0)
+        # The folders are shared, the list is new for each call
+        assert [folder.id for folder in second] == [1, 2]
+        assert second[1] is first[1]
+    finally:
+        foss.http_cache = None
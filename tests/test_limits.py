@@ -0,0 +1,152 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import pytest
+import requests
+import responses
+from concurrent.futures import ThreadPoolExecutor
+
+from fossology import Fossology
+from fossology.exceptions import FossologyApiError
+from fossology.fake import FakeFossology
+from fossology.limits import AdaptiveConcurrency, ClientLimiter, endpoint_family
+from fossology.transport import RetryPolicy
+
+
+def test_endpoint_family():
+    assert endpoint_family("GET /uploads/{id}/licenses") == "uploads"
+    assert endpoint_family("/search") == "search"
+
+
+def test_adaptive_concurrency():
+    concurrency = AdaptiveConcurrency(initial=4)
+    for _ in range(4):
+        concurrency.acquire()
+    # Additive increase, only while the limit is reached
+    concurrency.release(0.1)
+    assert concurrency.limit == 4.25
+    concurrency.release(0.1)
+    assert concurrency.limit == 4.25
+    # Multiplicative decrease, once per window of requests
+    concurrency.release(0.1, overloaded=True)
+    assert concurrency.limit == 4.25
+    concurrency.release(0.1, overloaded=True)
+    assert int(concurrency.limit) == 2
+    assert concurrency.in_flight == 0
+
+    slow = AdaptiveConcurrency(initial=8, latency_target=1.0, window=10)
+    for _ in range(10):
+        slow.acquire()
+        slow.release(0.5)
+    limit = slow.limit
+    for _ in range(10):
+        slow.acquire()
+        slow.release(2.0)
+    assert slow.limit < limit
+
+
+def test_adaptive_concurrency_requests():
+    server = FakeFossology()
+    server.latency = 0.002
+    foss = Fossology(server.url, server.token, "fossy", transport=server)
+    concurrency = AdaptiveConcurrency(initial=2, maximum=6)
+    foss.limiter = ClientLimiter(concurrency=concurrency)
+
+    # Sequential requests never reach the limit, it doesn't grow
+    for _ in range(20):
+        foss.get_version()
+    assert concurrency.limit == 2
+
+    # Concurrent requests reach the limit, it grows up to the maximum
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: foss.get_version(), range(100)))
+    assert concurrency.limit == 6
+    assert server.max_in_flight <= 6
+    assert concurrency.in_flight == 0
+
+
+def test_client_limiter_retry_after(monkeypatch):
+    server = FakeFossology()
+    foss = Fossology(server.url, server.token, "fossy", transport=server)
+    foss.limiter = ClientLimiter()
+    foss.retry_policy = RetryPolicy(unavailable_attempts=1)
+    sleeps = list()
+    monkeypatch.setattr("time.sleep", sleeps.append)
+
+    server.fail(status=503, endpoint="GET /version", retry_after=2)
+    with pytest.raises(FossologyApiError):
+        foss.get_version()
+    assert not sleeps
+    # All the requests of the endpoint family wait for the end of the Retry-After
+    foss.get_version()
+    assert len(sleeps) == 1 and 1.5 < sleeps[0] <= 2
+    foss.list_folders(max_age=0)
+    assert len(sleeps) == 1
+
+
+def test_client_limiter_readiness():
+    limiter = ClientLimiter(concurrency=AdaptiveConcurrency(initial=4))
+    not_ready = requests.Response()
+    not_ready.status_code = 503
+    not_ready.headers["Retry-After"] = "10"
+    # An upload which isn't unpacked yet doesn't hold the other uploads
+    limiter.concurrency.acquire()
+    limiter.release("GET /uploads/{id}", 0.1, not_ready)
+    assert not limiter.paused
+    assert not limiter.overloaded("GET /report/{id}", not_ready)
+
+    too_many = requests.Response()
+    too_many.status_code = 429
+    too_many.headers["Retry-After"] = "10"
+    assert limiter.overloaded("GET /uploads/{id}", too_many)
+    assert limiter.overloaded("GET /version", not_ready)
+    limiter.concurrency.acquire()
+    limiter.release("GET /uploads/{id}", 0.1, too_many)
+    assert set(limiter.paused) == {"uploads"}
+
+
+@responses.activate
+def test_client_limiter(foss_server: str, foss: Fossology):
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/version",
+        status=503,
+        json={"message": "Overloaded"},
+    )
+    limiter = ClientLimiter(
+        rates={"version": 1000}, concurrency=AdaptiveConcurrency(initial=4)
+    )
+    foss.limiter = limiter
+    foss.retry_policy = RetryPolicy(unavailable_attempts=1)
+    try:
+        for _ in range(4):
+            with pytest.raises(FossologyApiError):
+                foss.get_version()
+    finally:
+        foss.limiter = None
+        foss.retry_policy = RetryPolicy()
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.concurrency.limit == 2
+
+
+@responses.activate
+def test_client_limiter_stream(foss_server: str, foss: Fossology):
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/version", json={"version": "1.0.16"}
+    )
+    limiter = ClientLimiter(concurrency=AdaptiveConcurrency(initial=4))
+    foss.limiter = limiter
+    try:
+        # The slot of a streamed response is held until its content is consumed
+        response = foss._request("GET", "/version", stream=True)
+        assert limiter.concurrency.in_flight == 1
+        with response:
+            response.content
+        assert limiter.concurrency.in_flight == 0
+        response.close()
+        assert limiter.concurrency.in_flight == 0
+
+        foss._request("GET", "/version")
+        assert limiter.concurrency.in_flight == 0
+    finally:
+        foss.limiter = None
@@ -0,0 +1,85 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import responses
+
+from fossology import Fossology
+from fossology.limits import ClientLimiter
+from fossology.metrics import Metrics
+from fossology.transport import RetryPolicy
+
+
+@responses.activate
+def test_metrics(foss_server: str, foss: Fossology):
+    responses.add(responses.GET, f"{foss_server}/api/v1/version", status=502)
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/version", json={"version": "1.0.16"}
+    )
+    responses.add(
+        responses.POST,
+        f"{foss_server}/api/v1/folders",
+        status=201,
+        json={"message": 42},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/folders/42",
+        json={"id": 42, "name": "Metrics", "description": "", "parent": 1},
+    )
+    metrics = Metrics(buckets=(1, 10))
+    foss.metrics = metrics
+    foss.retry_policy = RetryPolicy(attempts=2, backoff=0)
+    try:
+        assert foss.get_version() == "1.0.16"
+        foss.create_folder(foss.rootFolder, "Metrics")
+        foss._wait(0)
+    finally:
+        foss.metrics = None
+        foss.retry_policy = RetryPolicy()
+        foss.folders.remove(42)
+
+    snapshot = metrics.snapshot()
+    version = snapshot["GET /version"]
+    assert version["requests"] == 2
+    assert version["statuses"] == {502: 1, 200: 1}
+    assert version["retries"] == 1
+    assert version["sleeps"] == 1
+    assert version["bytes_in"] == len(b'{"version": "1.0.16"}')
+    assert version["latency"]["buckets"][1] == 2
+    assert version["latency"]["buckets"][float("inf")] == 2
+    assert version["decodes"] == 1
+    assert snapshot["POST /folders"]["statuses"] == {201: 1}
+    # The explicit wait is attributed to the last endpoint requested
+    assert snapshot["GET /folders/{id}"]["sleeps"] == 1
+
+    text = metrics.prometheus()
+    assert "# TYPE fossology_requests_total counter" in text
+    assert 'fossology_requests_total{endpoint="GET /version",status="502"} 1' in text
+    assert (
+        'fossology_request_duration_seconds_bucket{endpoint="GET /version",le="+Inf"} 2'
+        in text
+    )
+    assert 'fossology_decode_seconds_total{endpoint="GET /version"}' in text
+
+
+@responses.activate
+def test_metrics_rate_limit(foss_server: str, foss: Fossology, monkeypatch):
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/version", json={"version": "1.0.16"}
+    )
+    sleeps = list()
+    monkeypatch.setattr("time.sleep", sleeps.append)
+    metrics = Metrics()
+    foss.metrics = metrics
+    foss.limiter = ClientLimiter(rates={"version": 1})
+    try:
+        foss.get_version()
+        foss.get_version()
+    finally:
+        foss.metrics = None
+        foss.limiter = None
+
+    # The wait for a token of the rate limiter is recorded
+    version = metrics.snapshot()["GET /version"]
+    assert version["sleeps"] == 1
+    assert version["sleep_seconds"] == sleeps[0] > 0.9
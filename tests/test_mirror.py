@@ -0,0 +1,151 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import json
+import secrets
+import responses
+
+from fossology import Fossology
+from fossology.mirror import mirror_directory
+from fossology.obj import Folder
+from tests.conftest import folder_json
+
+
+@responses.activate
+def test_mirror_directory(foss_server: str, foss: Fossology, tmp_path):
+    releases = tmp_path / "releases"
+    (releases / "foo" / "1.0").mkdir(parents=True)
+    (releases / "foo" / "1.0" / "foo-1.0.tar.gz").write_bytes(b"foo 1.0")
+    (releases / "foo" / "1.0" / "foo-1.0-src.zip").write_bytes(b"foo 1.0 sources")
+    (releases / "README").write_text("Release artifacts")
+    manifest = tmp_path / "mirror.json"
+
+    mirror = Folder(secrets.randbelow(1000) + 1000, "Mirror", "", foss.rootFolder.id)
+    foss.folders.add(mirror)
+    server_folders = list(foss.folders)
+    new_ids = iter(range(mirror.id + 1, mirror.id + 10))
+    upload_ids = iter(range(1, 10))
+
+    def create_folder(request):
+        folder = Folder(
+            next(new_ids),
+            request.headers["folderName"],
+            "",
+            int(request.headers["parentFolder"]),
+        )
+        server_folders.append(folder)
+        return (201, {}, json.dumps({"message": folder.id}))
+
+    def create_upload(request):
+        return (201, {}, json.dumps({"message": next(upload_ids)}))
+
+    def detail_upload(request):
+        upload_id = int(request.url.rsplit("/", 1)[1])
+        upload = {
+            "folderid": mirror.id,
+            "foldername": "Mirror",
+            "id": upload_id,
+            "description": "",
+            "uploadname": "",
+            "uploaddate": "2021-01-01",
+            "hash": {"sha1": "", "md5": "", "sha256": "", "size": 0},
+        }
+        return (200, {}, json.dumps(upload))
+
+    responses.add_callback(
+        responses.GET,
+        f"{foss_server}/api/v1/folders",
+        callback=lambda request: (
+            200,
+            {},
+            json.dumps([folder_json(folder) for folder in server_folders]),
+        ),
+    )
+    responses.add_callback(
+        responses.POST, f"{foss_server}/api/v1/folders", callback=create_folder
+    )
+    responses.add_callback(
+        responses.POST, f"{foss_server}/api/v1/uploads", callback=create_upload
+    )
+    for upload_id in range(1, 10):
+        responses.add_callback(
+            responses.GET,
+            f"{foss_server}/api/v1/uploads/{upload_id}",
+            callback=detail_upload,
+        )
+
+    result = mirror_directory(foss, releases, manifest, folder=mirror, workers=2)
+    assert set(result["uploaded"]) == {
+        "README",
+        "foo/1.0/foo-1.0.tar.gz",
+        "foo/1.0/foo-1.0-src.zip",
+    }
+    assert foss.folders.find_path("foo/1.0", mirror.id) is not None
+    entries = json.loads(manifest.read_text())
+    assert {entry["upload"] for entry in entries.values()} == {1, 2, 3}
+    # The hash sums are kept in a separate manifest
+    assert set(json.loads((tmp_path / "mirror-hashes.json").read_text())) == set(
+        entries
+    )
+    # The folders created are added to the index without listing all the folders
+    assert not [
+        call
+        for call in responses.calls
+        if call.request.url.endswith("/folders") and call.request.method == "GET"
+    ]
+
+    # Only the new or changed files are uploaded again
+    (releases / "foo" / "1.0" / "foo-1.0.tar.gz").write_bytes(b"foo 1.0 fixed")
+    (releases / "foo" / "1.1").mkdir()
+    (releases / "foo" / "1.1" / "foo-1.1.tar.gz").write_bytes(b"foo 1.1")
+    result = mirror_directory(foss, releases, manifest, folder=mirror, workers=2)
+    assert set(result["uploaded"]) == {
+        "foo/1.0/foo-1.0.tar.gz",
+        "foo/1.1/foo-1.1.tar.gz",
+    }
+    assert set(result["unchanged"]) == {"README", "foo/1.0/foo-1.0-src.zip"}
+    uploads = [
+        call for call in responses.calls if call.request.url.endswith("/uploads")
+    ]
+    assert len(uploads) == 5
+    foss.folders.remove(mirror.id)
+
+
+@responses.activate
+def test_mirror_directory_errors(
+    foss_server: str, foss: Fossology, tmp_path, monkeypatch
+):
+    releases = tmp_path / "releases"
+    (releases / "bad").mkdir(parents=True)
+    (releases / "bad" / "bad.zip").write_bytes(b"bad")
+    (releases / "README").write_text("Release artifacts")
+    responses.add(
+        responses.POST, f"{foss_server}/api/v1/uploads", status=201, json={"message": 7}
+    )
+    upload = {
+        "folderid": foss.rootFolder.id,
+        "foldername": "Software Repository",
+        "id": 7,
+        "description": "",
+        "uploadname": "README",
+        "uploaddate": "2021-01-01",
+        "hash": {"sha1": "", "md5": "", "sha256": "", "size": 0},
+    }
+    responses.add(responses.GET, f"{foss_server}/api/v1/uploads/7", json=upload)
+    # The folder exists on the server but isn't in the folder list
+    monkeypatch.setattr(foss, "resolve_folder", lambda *args, **kwargs: None)
+    operations = list()
+    hook = lambda event: operations.append(event.operation)  # noqa: E731
+    foss.add_hook("before_request", hook)
+    try:
+        errors = dict()
+        result = mirror_directory(
+            foss, releases, tmp_path / "mirror.json", errors=errors
+        )
+    finally:
+        foss.remove_hook("before_request", hook)
+    assert set(result["uploaded"]) == {"README"}
+    assert list(errors) == ["bad/bad.zip"]
+    assert "Folder bad could not be resolved" in errors["bad/bad.zip"].message
+    # The uploads sent by the worker threads keep the operation of the caller
+    assert operations and set(operations) == {"mirror_directory"}
@@ -0,0 +1,118 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import pickle
+import pytest
+
+from fossology.obj import (
+    Agents,
+    File,
+    Findings,
+    Folder,
+    Hash,
+    Job,
+    Licenses,
+    SearchResult,
+    Summary,
+    Upload,
+    User,
+)
+
+
+def upload_json(upload_id: int) -> dict:
+    return {
+        "folderid": 1,
+        "foldername": "Software " + "Repository",
+        "id": upload_id,
+        "description": "",
+        "uploadname": f"upload-{upload_id}.zip",
+        "uploaddate": "2021-01-01",
+        "hash": {"sha1": "ABC", "md5": "DEF", "sha256": "GHI", "size": upload_id},
+    }
+
+
+def test_slotted_models():
+    objects = [
+        Upload.from_json(upload_json(1)),
+        Job(1, "job", "", 1, 2, 2, 0, "Completed"),
+        Licenses.from_json(
+            {"filePath": "a/b.c", "findings": {"scanner": [], "conclusion": []}}
+        ),
+        Findings(["MIT"], []),
+        Hash("ABC", "DEF", "GHI", 1),
+        Folder(1, "Software Repository", "", None),
+        User(1, "fossy", "", "fossy@example.com", "admin", 1, False),
+        SearchResult.from_json(
+            {"upload": upload_json(1), "uploadTreeId": 2, "filename": "b.c"}
+        ),
+        Summary(1, "upload", "MIT", 1, 2, 1, 2, 0, 5, "Closed", 3),
+        File.from_json(
+            {
+                "hash": {"sha1": "ABC", "md5": "DEF", "sha256": "GHI", "size": 1},
+                "findings": {"scanner": ["MIT"], "conclusion": []},
+            }
+        ),
+        Agents(True, True, False, False, True, True, True, False, False),
+    ]
+    for obj in objects:
+        assert not hasattr(obj, "__dict__")
+        with pytest.raises(AttributeError):
+            obj.unknown = True
+        assert str(obj)
+
+
+def test_upload_lazy_hash():
+    upload = Upload.from_json(upload_json(5))
+    assert isinstance(upload._hash, dict)
+    assert upload.hash.size == 5
+    assert upload.hash is upload.hash
+    upload.hash = Hash("", "", "", 0)
+    assert upload.hash.size == 0
+    assert "(5, 0B, )" in str(upload)
+
+
+def test_search_result_lazy_upload():
+    result = SearchResult.from_json(
+        {"upload": upload_json(4), "uploadTreeId": 2, "filename": "b.c"}
+    )
+    assert isinstance(result._upload, dict)
+    assert result.upload.uploadname == "upload-4.zip"
+    assert result.upload is result.upload
+    assert "in upload upload-4.zip (4)" in str(result)
+
+
+def test_licenses_lazy_findings():
+    licenses = Licenses.from_json(
+        {
+            "filePath": "a/b.c",
+            "findings": {"scanner": ["MIT", "Apache-" + "2.0"], "conclusion": None},
+            "clearing_status": "OPEN",
+        }
+    )
+    assert licenses.filepath == "a/b.c"
+    assert licenses.additional_info == {"clearing_status": "OPEN"}
+    assert licenses.findings.scanner == ["MIT", "Apache-2.0"]
+    assert licenses.findings.conclusion is None
+    other = Findings(["Apache-" + "2.0"], [])
+    assert other.scanner[0] is licenses.findings.scanner[1]
+
+
+def test_interned_names():
+    first = Upload.from_json(upload_json(1))
+    second = Upload.from_json(upload_json(2))
+    assert first.foldername is second.foldername
+
+
+def test_additional_info():
+    folder = Folder(1, "folder", "", None)
+    assert folder._additional_info is None
+    assert folder.additional_info == {}
+    folder.additional_info["extra"] = True
+    assert folder.additional_info == {"extra": True}
+    assert Folder.from_json(dict(id=2, name="", description="", parent=1, new=1))
+
+
+def test_pickle_models():
+    upload = pickle.loads(pickle.dumps(Upload.from_json(upload_json(3))))
+    assert upload.id == 3
+    assert upload.hash.sha1 == "ABC"
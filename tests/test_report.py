@@ -1,8 +1,12 @@
 # Copyright 2019-2021 Siemens AG
 # SPDX-License-Identifier: MIT
 
+import io
 import os
+import stat
+import time
 import pytest
+import hashlib
 import secrets
 import mimetypes
 import responses
@@ -10,9 +14,19 @@ import responses
 from pathlib import Path
 from fossology import Fossology
 from fossology.exceptions import AuthorizationError, FossologyApiError
+from fossology.fake import VirtualClock
+from fossology.limits import AdaptiveConcurrency, ClientLimiter
 from fossology.obj import Upload, ReportFormat
 
 
+@pytest.fixture
+def clock(monkeypatch) -> VirtualClock:
+    clock = VirtualClock()
+    monkeypatch.setattr(time, "sleep", clock.sleep)
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
 def test_report_nogroup(foss: Fossology, upload: Upload):
     with pytest.raises(AuthorizationError) as excinfo:
         foss.generate_report(upload, report_format=ReportFormat.SPDX2, group="test")
@@ -73,3 +87,295 @@ def test_download_report_error(foss_server: str, foss: Fossology):
     with pytest.raises(FossologyApiError) as excinfo:
         foss.download_report(report_id)
     assert f"Download of report {report_id} failed" in str(excinfo.value)
+
+
+def test_download_report_file(foss: Fossology, upload: Upload, tmp_path: Path):
+    report_id = foss.generate_report(upload, report_format=ReportFormat.SPDX2TV)
+    report_name, size, digest = foss.download_report_file(report_id, tmp_path)
+    report_content = (tmp_path / report_name).read_bytes()
+    assert size == len(report_content) > 0
+    assert digest == hashlib.sha256(report_content).hexdigest()
+
+
+@responses.activate
+def test_download_report_file_binary(foss_server: str, foss: Fossology):
+    report_id = secrets.randbelow(1000)
+    content = bytes(range(256)) * 1024
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/{report_id}",
+        status=503,
+        headers={"Retry-After": "1"},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/{report_id}",
+        body=content,
+        headers={"Content-Disposition": 'attachment; filename="report.zip"'},
+    )
+    report_file = io.BytesIO()
+    report_name, size, digest = foss.download_report_file(
+        report_id, report_file, chunk_size=1000
+    )
+    assert report_name == "report.zip"
+    assert report_file.getvalue() == content
+    assert size == len(content)
+    assert digest == hashlib.sha256(content).hexdigest()
+
+
+@responses.activate
+def test_download_report_file_mode(foss_server: str, foss: Fossology, tmp_path: Path):
+    report_id = secrets.randbelow(1000)
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/{report_id}",
+        body=b"report",
+        headers={"Content-Disposition": 'attachment; filename="report.txt"'},
+    )
+    umask = os.umask(0o022)
+    try:
+        foss.download_report_file(report_id, tmp_path)
+    finally:
+        os.umask(umask)
+    # Same permissions as a file created with open()
+    assert stat.S_IMODE((tmp_path / "report.txt").stat().st_mode) == 0o644
+
+
+@responses.activate
+def test_download_report_file_no_name(
+    foss_server: str, foss: Fossology, tmp_path: Path
+):
+    report_id = secrets.randbelow(1000)
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/report/{report_id}", body=b"report"
+    )
+    limiter = ClientLimiter(concurrency=AdaptiveConcurrency(initial=4))
+    foss.limiter = limiter
+    try:
+        with pytest.raises(KeyError):
+            foss.download_report_file(report_id, tmp_path)
+        # The streamed response was closed, its slot is given back
+        assert limiter.concurrency.in_flight == 0
+    finally:
+        foss.limiter = None
+    assert not list(tmp_path.iterdir())
+
+
+@responses.activate
+def test_download_report_file_error(foss_server: str, foss: Fossology, tmp_path: Path):
+    report_id = secrets.randbelow(1000)
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/report/{report_id}", status=500,
+    )
+    with pytest.raises(FossologyApiError) as excinfo:
+        foss.download_report_file(report_id, tmp_path / "report.rdf")
+    assert f"Download of report {report_id} failed" in str(excinfo.value)
+    assert not list(tmp_path.iterdir())
+
+
+@responses.activate
+def test_generate_reports(
+    foss_server: str, foss: Fossology, tmp_path: Path, clock: VirtualClock
+):
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": ""}
+    uploads = [
+        Upload(1, "Folder", upload_id, "", f"upload-{upload_id}", "2021-01-01", hash)
+        for upload_id in (10, 11, 12)
+    ]
+
+    def report_callback(request):
+        upload_id = int(request.headers["uploadId"])
+        if upload_id == 12:
+            return (404, {}, '{"message": "Upload not found"}')
+        return (201, {}, f'{{"message": "{foss_server}/api/v1/report/{upload_id}"}}')
+
+    responses.add_callback(
+        responses.GET, f"{foss_server}/api/v1/report", callback=report_callback
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/10",
+        body=b"report 10",
+        headers={"Content-Disposition": 'attachment; filename="report-10.txt"'},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/11",
+        status=503,
+        headers={"Retry-After": "1"},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/11",
+        body=b"report 11",
+        headers={"Content-Disposition": 'attachment; filename="report-11.txt"'},
+    )
+
+    manifest = foss.generate_reports(uploads, directory=tmp_path, wait_time=0)
+    assert [item["status"] for item in manifest] == ["downloaded"] * 2 + ["failed"]
+    assert (tmp_path / "10_report-10.txt").read_bytes() == b"report 10"
+    assert (tmp_path / "11_report-11.txt").read_bytes() == b"report 11"
+    assert manifest[1]["report_name"] == "11_report-11.txt"
+    assert manifest[1]["size"] == 9
+    assert "Report generation for upload upload-12 failed" in manifest[2]["error"]
+    assert clock() == 1
+
+
+@responses.activate
+def test_generate_reports_unexpected_headers(
+    foss_server: str, foss: Fossology, tmp_path: Path, clock: VirtualClock
+):
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": ""}
+    uploads = [
+        Upload(1, "Folder", upload_id, "", f"upload-{upload_id}", "2021-01-01", hash)
+        for upload_id in (10, 11)
+    ]
+
+    def report_callback(request):
+        upload_id = int(request.headers["uploadId"])
+        return (201, {}, f'{{"message": "{foss_server}/api/v1/report/{upload_id}"}}')
+
+    responses.add_callback(
+        responses.GET, f"{foss_server}/api/v1/report", callback=report_callback
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/10",
+        status=503,
+        headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/10",
+        body=b"report 10",
+        headers={"Content-Disposition": 'attachment; filename="report-10.txt"'},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/11",
+        body=b"report 11",
+        headers={"Content-Disposition": "inline"},
+    )
+
+    manifest = foss.generate_reports(uploads, directory=tmp_path, wait_time=2)
+    assert [item["status"] for item in manifest] == ["downloaded", "failed"]
+    assert (tmp_path / "10_report-10.txt").read_bytes() == b"report 10"
+    assert manifest[1]["error"] == "Report 11 has no valid file name"
+    # The Retry-After date is ignored, the polling delay is used instead
+    assert clock() == 2
+
+
+@responses.activate
+def test_generate_reports_same_name(foss_server: str, foss: Fossology, tmp_path: Path):
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": ""}
+    uploads = [
+        Upload(1, "Folder", upload_id, "", f"upload-{upload_id}", "2021-01-01", hash)
+        for upload_id in (10, 11)
+    ]
+
+    def report_callback(request):
+        upload_id = int(request.headers["uploadId"])
+        return (201, {}, f'{{"message": "{foss_server}/api/v1/report/{upload_id}"}}')
+
+    responses.add_callback(
+        responses.GET, f"{foss_server}/api/v1/report", callback=report_callback
+    )
+    for upload_id in (10, 11):
+        responses.add(
+            responses.GET,
+            f"{foss_server}/api/v1/report/{upload_id}",
+            body=f"report {upload_id}",
+            headers={"Content-Disposition": 'attachment; filename="report.txt"'},
+        )
+
+    formats = [ReportFormat.READMEOSS, ReportFormat.READMEOSS]
+    manifest = foss.generate_reports(uploads, formats, directory=tmp_path)
+    assert (tmp_path / "10_report.txt").read_bytes() == b"report 10"
+    assert (tmp_path / "11_report.txt").read_bytes() == b"report 11"
+    for upload_id in (10, 11):
+        items = [item for item in manifest if item["upload"] == upload_id]
+        assert sorted(item["status"] for item in items) == ["downloaded", "failed"]
+        failed = [item for item in items if item["status"] == "failed"]
+        assert f"{upload_id}_report.txt was already written" in failed[0]["error"]
+
+
+@responses.activate
+def test_fetch_report(
+    foss_server: str, foss: Fossology, tmp_path: Path, clock: VirtualClock
+):
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": ""}
+    upload = Upload(1, "Folder", 42, "", "upload-42", "2021-01-01", hash)
+    responses.add(responses.GET, f"{foss_server}/api/v1/report", status=503)
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report",
+        status=201,
+        json={"message": f"{foss_server}/api/v1/report/7"},
+    )
+    for _ in range(4):
+        responses.add(responses.GET, f"{foss_server}/api/v1/report/7", status=503)
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/7",
+        body=b"report content",
+        headers={"Content-Disposition": 'attachment; filename="report-42.txt"'},
+    )
+
+    metrics = dict()
+    report_name, size, _ = foss.fetch_report(
+        upload, ReportFormat.DEP5, tmp_path, wait_time=0, metrics=metrics
+    )
+    assert (tmp_path / report_name).read_bytes() == b"report content"
+    assert size == 14
+    assert metrics["requests"] == 7
+    assert set(metrics) == {"requests", "generate", "wait", "transfer"}
+    # With a wait time of 0, the delays start at the minimum poll interval
+    assert clock() == 0.5 + 0.5 + 1 + 2 + 4
+
+
+@responses.activate
+def test_fetch_report_timeout(foss_server: str, foss: Fossology, clock: VirtualClock):
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": ""}
+    upload = Upload(1, "Folder", 42, "", "upload-42", "2021-01-01", hash)
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report",
+        status=503,
+        headers={"Retry-After": "1"},
+    )
+    with pytest.raises(FossologyApiError) as excinfo:
+        foss.fetch_report(upload, report_file=io.BytesIO(), timeout=2)
+    assert f"Report generation for upload {upload.uploadname} timed out" in str(
+        excinfo.value
+    )
+    assert clock() == 2
+
+
+@responses.activate
+def test_fetch_report_retry_after_date(
+    foss_server: str, foss: Fossology, tmp_path: Path, clock: VirtualClock
+):
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": ""}
+    upload = Upload(1, "Folder", 42, "", "upload-42", "2021-01-01", hash)
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report",
+        status=503,
+        headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report",
+        status=201,
+        json={"message": f"{foss_server}/api/v1/report/7"},
+    )
+    responses.add(
+        responses.GET,
+        f"{foss_server}/api/v1/report/7",
+        body=b"report content",
+        headers={"Content-Disposition": 'attachment; filename="report-42.txt"'},
+    )
+    report_name, _, _ = foss.fetch_report(upload, report_file=tmp_path, wait_time=3)
+    assert (tmp_path / report_name).read_bytes() == b"report content"
+    # The date is ignored, the back-off delay is used instead
+    assert clock() == 3
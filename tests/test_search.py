@@ -1,11 +1,13 @@
 # Copyright 2019-2021 Siemens AG
 # SPDX-License-Identifier: MIT
 
+import json
 import secrets
 import pytest
 import responses
 
-from fossology import Fossology
+from fossology import Fossology, search_headers
+from fossology.limits import RateLimiter
 from fossology.obj import SearchTypes, Upload
 from fossology.exceptions import AuthorizationError, FossologyApiError
 
@@ -34,6 +36,12 @@ def test_search_nothing_found(foss: Fossology, upload):
     assert search_result == []
 
 
+def test_search_headers_file_size():
+    headers = search_headers(SearchTypes.ALLFILES, filesizemin=1, filesizemax=1024)
+    assert headers["filesizemin"] == "1"
+    assert headers["filesizemax"] == "1024"
+
+
 def test_search_directory(foss: Fossology, upload):
     search_result = foss.search(searchType=SearchTypes.DIRECTORIES, filename="share",)
     assert search_result
@@ -103,3 +111,162 @@ def test_filesearch_error(foss_server: str, foss: Fossology):
     assert "Unable to get a result with the given filesearch criteria" in str(
         excinfo.value
     )
+
+
+@responses.activate
+def test_filesearch_bulk(foss_server: str, foss: Fossology):
+    def filesearch_callback(request):
+        results = list()
+        for item in json.loads(request.body):
+            if item["sha1"].startswith("KNOWN"):
+                hash = {"sha1": item["sha1"], "md5": "", "sha256": "", "size": 1}
+                findings = {"scanner": ["MIT"], "conclusion": []}
+                results.append({"hash": hash, "findings": findings})
+            else:
+                results.append({"hash": item, "message": "Not found"})
+        return (200, {}, json.dumps(results))
+
+    responses.add_callback(
+        responses.POST, f"{foss_server}/api/v1/filesearch", callback=filesearch_callback
+    )
+    filelist = [{"sha1": f"KNOWN{index}"} for index in range(25)]
+    filelist += [{"sha1": f"UNKNOWN{index}"} for index in range(20)]
+    results = dict(foss.filesearch_bulk(filelist, batch_size=10, workers=3))
+    assert len(responses.calls) == 5
+    assert len(results) == 45
+    assert results["KNOWN3"].findings.scanner == ["MIT"]
+    assert results["UNKNOWN3"] is None
+
+
+@responses.activate
+def test_filesearch_bulk_errors(foss_server: str, foss: Fossology):
+    def filesearch_callback(request):
+        items = json.loads(request.body)
+        if items[0]["sha1"] == "HASH10":
+            return (500, {}, json.dumps({"message": "Internal error"}))
+        hash = {"md5": "", "sha256": "", "size": 1}
+        findings = {"scanner": ["MIT"], "conclusion": []}
+        results = [
+            {"hash": dict(hash, sha1=item["sha1"]), "findings": findings}
+            for item in items
+        ]
+        return (200, {}, json.dumps(results))
+
+    responses.add_callback(
+        responses.POST, f"{foss_server}/api/v1/filesearch", callback=filesearch_callback
+    )
+    filelist = [{"sha1": f"HASH{index}"} for index in range(30)]
+    errors = dict()
+    # A failed batch doesn't stop the search of the other batches
+    results = dict(
+        foss.filesearch_bulk(filelist, batch_size=10, workers=1, errors=errors)
+    )
+    assert len(responses.calls) == 3
+    assert set(results) == {f"HASH{index}" for index in range(30) if index // 10 != 1}
+    assert set(errors) == {f"HASH{index}" for index in range(10, 20)}
+    assert "Internal error" in errors["HASH15"].message
+
+    with pytest.raises(FossologyApiError):
+        dict(foss.filesearch_bulk(filelist, batch_size=10, workers=1))
+
+
+def search_result(upload_id: int, index: int) -> dict:
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": 1}
+    return {
+        "upload": {
+            "folderid": 1,
+            "foldername": "Software Repository",
+            "id": upload_id,
+            "description": "",
+            "uploadname": f"upload-{upload_id}",
+            "uploaddate": "2021-01-01",
+            "hash": hash,
+        },
+        "uploadTreeId": index,
+        "filename": f"file-{index}",
+    }
+
+
+@responses.activate
+def test_iter_search(foss_server: str, foss: Fossology):
+    def search_callback(request):
+        page = int(request.headers["page"])
+        limit = int(request.headers["limit"])
+        start = (page - 1) * limit
+        results = [
+            search_result(1, index) for index in range(start, min(start + limit, 25))
+        ]
+        return (200, {"X-Total-Pages": "3"}, json.dumps(results))
+
+    responses.add_callback(
+        responses.GET, f"{foss_server}/api/v1/search", callback=search_callback
+    )
+    results = list(foss.iter_search(filename="file%", page_size=10))
+    assert len(results) == 25
+    assert len(responses.calls) == 3
+    assert results[24].filename == "file-24"
+    assert results[0].upload.uploadname == "upload-1"
+
+    responses.calls.reset()
+    results = list(foss.iter_search(filename="file%", page_size=10, max_results=10))
+    assert len(results) == 10
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_iter_search_without_pagination(foss_server: str, foss: Fossology):
+    # Servers ignoring page and limit send the same results for every page
+    results = [search_result(1, index) for index in range(10)]
+    responses.add(responses.GET, f"{foss_server}/api/v1/search", json=results)
+    assert len(list(foss.iter_search(filename="file%", page_size=10))) == 10
+    assert len(responses.calls) == 2
+
+    responses.calls.reset()
+    assert len(list(foss.iter_search(filename="file%", page_size=4))) == 10
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_search_uploads(foss_server: str, foss: Fossology):
+    def search_callback(request):
+        upload_id = int(request.headers["uploadId"])
+        if upload_id == 3:
+            return (500, {}, '{"message": "Internal error"}')
+        results = [search_result(upload_id, index) for index in range(2)]
+        return (200, {}, json.dumps(results))
+
+    responses.add_callback(
+        responses.GET, f"{foss_server}/api/v1/search", callback=search_callback
+    )
+    hash = {"sha1": "", "md5": "", "sha256": "", "size": ""}
+    uploads = [
+        Upload(1, "Folder", upload_id, "", f"upload-{upload_id}", "2021-01-01", hash)
+        for upload_id in range(1, 6)
+    ]
+    errors = dict()
+    results = list(
+        foss.search_uploads(
+            uploads,
+            filename="file%",
+            workers=2,
+            rate_limiter=RateLimiter(rate=100, burst=5),
+            errors=errors,
+        )
+    )
+    assert len(results) == 8
+    assert {upload_id for upload_id, _ in results} == {1, 2, 4, 5}
+    assert all(result.upload.id == upload_id for upload_id, result in results)
+    assert list(errors) == [3]
+    assert "Unable to get a result with the given search criteria" in str(
+        errors[3].message
+    )
+
+    with pytest.raises(FossologyApiError):
+        list(foss.search_uploads(uploads, filename="file%"))
+
+    responses.calls.reset()
+    results = list(
+        foss.search_uploads(uploads[:1] * 50, workers=1, stop=lambda *_: True)
+    )
+    assert len(results) == 1
+    assert len(responses.calls) < 50
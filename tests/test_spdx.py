@@ -0,0 +1,131 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import gc
+import io
+
+from fossology.obj import ReportFormat
+from fossology.spdx import SpdxFile, SpdxPackage, parse_spdx_report
+
+SPDX_TV = """SPDXVersion: SPDX-2.1
+DataLicense: CC0-1.0
+SPDXID: SPDXRef-DOCUMENT
+
+## Package Information
+PackageName: base-files_11.tar.xz
+SPDXID: SPDXRef-upload3
+PackageFileName: base-files_11.tar.xz
+PackageChecksum: SHA1: d4d663fc2877084362fb2297337be05684869b00
+PackageLicenseConcluded: NOASSERTION
+PackageLicenseInfoFromFiles: GPL-2.0-or-later
+PackageLicenseInfoFromFiles: MIT
+PackageLicenseDeclared: NOASSERTION
+PackageCopyrightText: <text>Copyright (c) 2021 Siemens AG</text>
+
+## File Information
+FileName: base-files/debian/copyright
+SPDXID: SPDXRef-item5
+FileChecksum: SHA1: 2b1e4a5d5c3c5b3b6a6bf6e24f8a8f8a07f3c33f
+FileChecksum: MD5: 5d3b1c0ed3b6e8b2e0f3c1c5e9c1e9a1
+LicenseConcluded: GPL-2.0-or-later
+LicenseInfoInFile: GPL-2.0-or-later
+LicenseInfoInFile: MIT
+FileCopyrightText: <text>Copyright (C) 1995-2011 Santiago Vila
+Copyright (C) 2012-2021 Debian</text>
+
+FileName: base-files/etc/issue
+SPDXID: SPDXRef-item6
+LicenseConcluded: NOASSERTION
+FileCopyrightText: NONE
+
+LicenseID: LicenseRef-Fossology-Unknown
+ExtractedText: <text>Unknown license</text>
+"""
+
+
+def test_parse_spdx_tv():
+    records = list(parse_spdx_report(io.BytesIO(SPDX_TV.encode())))
+    package, copyright_file, issue_file = records
+    assert isinstance(package, SpdxPackage)
+    assert package.name == package.file_name == "base-files_11.tar.xz"
+    assert package.checksums == {"SHA1": "d4d663fc2877084362fb2297337be05684869b00"}
+    assert package.license_info == ["GPL-2.0-or-later", "MIT"]
+    assert package.license_declared == "NOASSERTION"
+    assert package.copyright_text == "Copyright (c) 2021 Siemens AG"
+
+    assert isinstance(copyright_file, SpdxFile)
+    assert copyright_file.path == "base-files/debian/copyright"
+    assert copyright_file.spdx_id == "SPDXRef-item5"
+    assert set(copyright_file.checksums) == {"SHA1", "MD5"}
+    assert copyright_file.license_concluded == "GPL-2.0-or-later"
+    assert copyright_file.copyright_text.splitlines()[1] == (
+        "Copyright (C) 2012-2021 Debian"
+    )
+    assert issue_file.path == "base-files/etc/issue"
+    assert issue_file.license_info == []
+
+
+def test_parse_spdx_stream_kept_open(tmp_path):
+    report = tmp_path / "report.spdx"
+    report.write_text(SPDX_TV)
+    with open(report, "rb", buffering=0) as report_file:
+        # Stop the iteration early, the wrappers of the stream are collected
+        records = parse_spdx_report(report_file)
+        next(records)
+        del records
+        gc.collect()
+        assert not report_file.closed
+
+        report_file.seek(0)
+        assert len(list(parse_spdx_report(report_file, ReportFormat.SPDX2TV))) > 1
+        assert not report_file.closed
+
+
+def test_parse_spdx_rdf():
+    report = "tests/files/base-files_10.3-debian10-combined.tar.bz2.spdx-report.rdf"
+    (package,) = list(parse_spdx_report(report, ReportFormat.SPDX2))
+    assert package.name == "base-files_10.3-debian10-combined.tar.bz2"
+    assert package.spdx_id == "SPDXRef-upload4"
+    assert package.checksums == {
+        "SHA1": "7a36310ab05cd8401a1cc16b934d998ed491eb12",
+        "MD5": "9c378f3e4e3db1f5c49d6485efbca10e",
+    }
+    assert package.license_concluded == "NOASSERTION"
+    assert package.license_declared == "NOASSERTION"
+    assert package.copyright_text == "NOASSERTION"
+
+
+def test_parse_spdx_rdf_files():
+    report = b"""<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+    xmlns:spdx="http://spdx.org/rdf/terms#">
+  <spdx:Package rdf:about="http://server/report.rdf#SPDXRef-upload1">
+    <spdx:name>package.tar.gz</spdx:name>
+    <spdx:hasFile>
+      <spdx:File rdf:about="http://server/report.rdf#SPDXRef-item2">
+        <spdx:fileName>package/LICENSE</spdx:fileName>
+        <spdx:licenseConcluded>
+          <spdx:DisjunctiveLicenseSet>
+            <spdx:member rdf:resource="http://spdx.org/licenses/MIT" />
+            <spdx:member>
+              <spdx:ExtractedLicensingInfo rdf:about="http://server/report.rdf#LicenseRef-Other">
+                <spdx:licenseId>LicenseRef-Other</spdx:licenseId>
+              </spdx:ExtractedLicensingInfo>
+            </spdx:member>
+          </spdx:DisjunctiveLicenseSet>
+        </spdx:licenseConcluded>
+        <spdx:licenseInfoInFile rdf:resource="http://spdx.org/licenses/MIT" />
+        <spdx:copyrightText>Copyright 2021 Example</spdx:copyrightText>
+      </spdx:File>
+    </spdx:hasFile>
+    <spdx:licenseDeclared rdf:resource="http://spdx.org/licenses/MIT" />
+  </spdx:Package>
+</rdf:RDF>"""
+    file, package = list(parse_spdx_report(io.BytesIO(report)))
+    assert file.path == "package/LICENSE"
+    assert file.spdx_id == "SPDXRef-item2"
+    assert file.license_concluded == "(MIT OR LicenseRef-Other)"
+    assert file.license_info == ["MIT"]
+    assert file.copyright_text == "Copyright 2021 Example"
+    assert package.name == "package.tar.gz"
+    assert package.license_declared == "MIT"
+    assert package.license_info == []
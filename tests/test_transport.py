@@ -0,0 +1,110 @@
+# Copyright 2019-2021 Siemens AG
+# SPDX-License-Identifier: MIT
+
+import json
+import time
+import pytest
+import requests
+import responses
+
+from fossology import Fossology
+from fossology.exceptions import FossologyApiError, ServerUnavailableError
+from fossology.fake import FakeFossology, VirtualClock
+from fossology.transport import CircuitBreaker, RetryPolicy, Transport
+
+
+@responses.activate
+def test_retry_policy(foss_server: str, foss: Fossology):
+    responses.add(responses.GET, f"{foss_server}/api/v1/version", status=502)
+    responses.add(
+        responses.GET, f"{foss_server}/api/v1/version", json={"version": "1.0.16"}
+    )
+    foss.retry_policy = RetryPolicy(attempts=3, backoff=0)
+    try:
+        assert foss.get_version() == "1.0.16"
+        assert len(responses.calls) == 2
+        # Requests which are not idempotent are not retried
+        responses.add(responses.POST, f"{foss_server}/api/v1/folders", status=502)
+        with pytest.raises(FossologyApiError):
+            foss.create_folder(foss.rootFolder, "Not retried")
+        assert len(responses.calls) == 3
+    finally:
+        foss.retry_policy = RetryPolicy()
+
+
+@responses.activate
+def test_circuit_breaker(foss_server: str, foss: Fossology):
+    responses.add(responses.GET, f"{foss_server}/api/v1/jobs", status=502)
+    foss.circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    try:
+        for _ in range(2):
+            with pytest.raises(FossologyApiError):
+                foss.list_jobs()
+        with pytest.raises(ServerUnavailableError) as excinfo:
+            foss.list_jobs()
+        assert "GET /jobs failed repeatedly" in str(excinfo.value)
+        assert len(responses.calls) == 2
+
+        # Other endpoints are not affected
+        responses.add(
+            responses.GET, f"{foss_server}/api/v1/version", json={"version": "1.0.16"}
+        )
+        assert foss.get_version() == "1.0.16"
+    finally:
+        foss.circuit_breaker = None
+
+
+def test_retry_unavailable(monkeypatch):
+    clock = VirtualClock()
+    monkeypatch.setattr(time, "sleep", clock.sleep)
+    server = FakeFossology(clock=clock)
+    foss = Fossology(server.url, server.token, "fossy", transport=server)
+    upload = foss.detail_upload(server.add_upload("upload.zip")["id"])
+
+    # 503 answers are retried once per attempt after Retry-After, even without retries
+    # of the other errors
+    server.fail(2, status=503, endpoint="GET /uploads/{id}/summary", retry_after=3)
+    assert foss.upload_summary(upload).id == upload.id
+    assert server.calls["GET /uploads/{id}/summary"] == 3
+    assert clock() == 6
+
+    server.fail(10, status=503, endpoint="GET /uploads/{id}/licenses", retry_after=1)
+    with pytest.raises(ServerUnavailableError) as excinfo:
+        foss.upload_licenses(upload)
+    assert excinfo.value.response.status_code == 503
+    assert "failed after 10 attempts" in excinfo.value.message
+    assert server.calls["GET /uploads/{id}/licenses"] == 10
+
+    # A fixed wait time replaces Retry-After
+    server.fail(1, status=503, endpoint="GET /uploads/{id}", retry_after=30)
+    foss.detail_upload(upload.id, wait_time=2)
+    assert clock() == 17
+
+
+def test_transport_is_abstract():
+    with pytest.raises(TypeError):
+        Transport()
+
+
+class StaticTransport(Transport):
+    def __init__(self):
+        self.requests = list()
+
+    def send(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs["headers"]))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"version": "42.0"}).encode()
+        return response
+
+
+def test_custom_transport(foss_server: str, foss: Fossology):
+    transport = foss.transport
+    foss.transport = StaticTransport()
+    try:
+        assert foss.get_version() == "42.0"
+        method, url, headers = foss.transport.requests[0]
+        assert (method, url) == ("GET", f"{foss_server}/api/v1/version")
+        assert headers["Authorization"].startswith("Bearer ")
+    finally:
+        foss.transport = transport
@@ -150,3 +150,30 @@ def test_noversion(foss_server: str, foss: Fossology):
     with pytest.raises(FossologyApiError) as excinfo:
         foss.get_version()
     assert "Error while getting API version" in str(excinfo.value)
+
+
+@responses.activate
+def test_user_directory(foss_server: str, foss: Fossology, foss_user: dict):
+    users = [
+        dict(foss_user, id=1, name="Default User"),
+        dict(foss_user, id=2, name="admin", email="Admin@Example.com"),
+        dict(foss_user, id=3, name="builder", email=""),
+    ]
+    responses.add(responses.GET, f"{foss_server}/api/v1/users", json=users)
+    foss.user_cache_ttl = 60
+    try:
+        # Users without email are indexed but not listed
+        assert [user.name for user in foss.list_users(max_age=0)] == ["admin"]
+        resolved = foss.resolve_users([2, 3, 42, 2])
+        assert resolved[2].name == "admin"
+        assert resolved[3].name == "builder"
+        assert resolved[42] is None
+        assert foss.find_user(email="admin@example.com").id == 2
+        assert foss.find_user(name="builder").id == 3
+        assert 1 not in foss.user_directory
+        assert len(responses.calls) == 1
+
+        foss.list_users(max_age=0)
+        assert len(responses.calls) == 2
+    finally:
+        foss.user_cache_ttl = 0